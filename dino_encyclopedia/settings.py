@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import importlib.util
 from pathlib import Path
 
+from decouple import Choices, config
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +46,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'encyclopedia.staticfiles.StaticFilesMiddleware',
+    'encyclopedia.instrumentation.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -50,13 +56,52 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-view SQL query budgets, keyed by URL name for GET/HEAD requests or by
+# '<METHOD> <url name>' for other methods. Requests over budget are logged
+# as warnings and fail QueryBudgetMixin assertions in tests.
+#
+# Each budget is the count with cold caches. Two of the queries are shared by
+# every logged-in request: the session (a db read or a cached_db cache miss)
+# and the user joined to its profile. The comments name the rest. Catalog data and
+# per-user pages are cached, so warm requests run fewer.
+QUERY_BUDGETS = {
+    'home': 3,  # catalog size
+    'home_alt': 3,  # catalog size
+    'map': 3,  # map aggregate over periods
+    # Page of dinosaurs, search snippets, periods; the first search of a
+    # process also introspects the tables once (search.is_available)
+    'gallery': 5,
+    'gallery_suggest': 4,  # full-text match, names of the matches
+    'dinosaur_detail': 3,  # the dinosaur with its period
+    'album': 6,  # user's album, album catalog, periods, catalog size
+    'library': 3,  # periods
+    'profile': 6,  # recent scores, personal bests, catalog size, game totals
+    # All-time and daily leaderboards, the player's best score and rank
+    # (a COUNT, only once they have a best score), their high scores
+    'puzzleaurus': 7,
+    'memodyn': 7,
+    # Paginator COUNT, unfiltered COUNT, page of profiles with users, catalog size
+    'encyclopedia_userprofile_changelist': 6,
+    'api_dinosaurs': 3,  # page of dinosaurs
+    'api_dinosaur_detail': 3,  # the dinosaur
+    'api_periods': 3,  # periods
+    'api_album': 3,  # album items
+    'api_progress': 3,  # catalog size
+    'api_scores': 4,  # personal bests, recent scores
+}
+
+# A SQL shape repeated this many times in one request is logged as a likely N+1
+QUERY_DUPLICATE_THRESHOLD = 3
+
+# Expose per-request DB timing to browser dev tools
+SERVER_TIMING_HEADER = DEBUG
+
 ROOT_URLCONF = 'dino_encyclopedia.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -64,6 +109,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process; runserver's autoreloader
+            # resets the cache when a template file changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -74,17 +127,151 @@ WSGI_APPLICATION = 'dino_encyclopedia.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
+# Environment-driven (see .env.example). DB_ENGINE selects the backend:
+#   sqlite      single-node file database (default); SQLITE_TUNED enables
+#               WAL, synchronous=NORMAL and IMMEDIATE write transactions
+#   postgresql  DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/DB_PORT; set
+#               DB_POOLER=pgbouncer when DB_HOST is a PgBouncer running
+#               in transaction pooling mode
+# Connections are kept open for DB_CONN_MAX_AGE seconds (0 closes them
+# after every request) and health-checked before reuse.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='dino_encyclopedia'),
+            'USER': config('DB_USER', default='dino'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default=5432, cast=int),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # The pooler hands each transaction to any server connection,
+            # so named (server-side) cursors cannot outlive one.
+            'DISABLE_SERVER_SIDE_CURSORS': config('DB_POOLER', default='') == 'pgbouncer',
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    SQLITE_TUNED = config('SQLITE_TUNED', default=True, cast=bool)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Seconds to wait for a lock (SQLite's busy_timeout)
+                'timeout': config('SQLITE_BUSY_TIMEOUT', default=10, cast=int),
+            },
+            # File-backed test database so concurrency tests can use real
+            # per-thread connections (in-memory SQLite uses table locks).
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+    if SQLITE_TUNED:
+        DATABASES['default']['ENGINE'] = 'encyclopedia.db_backends.sqlite3'
+        DATABASES['default']['OPTIONS'].update({
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        })
+else:
+    raise ImproperlyConfigured(f"Unknown DB_ENGINE {DB_ENGINE!r}; use 'sqlite' or 'postgresql'")
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Environment-driven (see .env.example). CACHE_BACKEND selects the backend:
+#   locmem     private to each process (default; fine for a single process)
+#   redis      CACHE_LOCATION=redis://host:6379/0 (requires redis)
+#   memcached  CACHE_LOCATION=host:11211 (requires pymemcache)
+#   db         a database table (run createcachetable once)
+# Catalog and user data versions live in the cache (see catalog.py), so
+# edits from another process (admin, seed, import_catalog, ...) only reach
+# the web workers' cached pages when every process shares one cache.
+CACHE_BACKEND = config(
+    'CACHE_BACKEND', default='locmem', cast=Choices(['locmem', 'redis', 'memcached', 'db'])
+)
+_CACHE_BACKENDS = {
+    # backend class, required module, default location
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', None, ''),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis', 'redis://localhost:6379/0'),
+    'memcached': ('django.core.cache.backends.memcached.PyMemcacheCache', 'pymemcache', 'localhost:11211'),
+    'db': ('django.core.cache.backends.db.DatabaseCache', None, 'encyclopedia_cache'),
+}
+_cache_class, _cache_module, _cache_location = _CACHE_BACKENDS[CACHE_BACKEND]
+if _cache_module and importlib.util.find_spec(_cache_module) is None:
+    raise ImproperlyConfigured(f'CACHE_BACKEND={CACHE_BACKEND} requires {_cache_module}: pip install {_cache_module}')
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': _cache_class,
+        'LOCATION': config('CACHE_LOCATION', default=_cache_location),
     }
 }
-
+CACHE_SHARED = CACHE_BACKEND != 'locmem'
+# Seconds entries keyed on a catalog or user data version are kept. A shared
+# cache sees every version bump, so they can stay a day; a per-process cache
+# misses other processes' bumps, so they must expire soon.
+VERSIONED_CACHE_TIMEOUT = config(
+    'VERSIONED_CACHE_TIMEOUT', default=60 * 60 * 24 if CACHE_SHARED else 60, cast=int
+)
+
+
+# Password hashing (encyclopedia/hashers.py): scrypt, argon2 (needs
+# argon2-cffi) or pbkdf2 for new passwords. Hashes made with the others
+# still verify and are rehashed on the next login, as are hashes made
+# with different cost settings.
+PASSWORD_HASHER = config(
+    'PASSWORD_HASHER', default='scrypt', cast=Choices(['scrypt', 'argon2', 'pbkdf2'])
+)
+_PASSWORD_HASHER_CLASSES = {
+    'scrypt': 'encyclopedia.hashers.ScryptPasswordHasher',
+    'argon2': 'encyclopedia.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'encyclopedia.hashers.PBKDF2PasswordHasher',
+}
+if PASSWORD_HASHER == 'argon2' and importlib.util.find_spec('argon2') is None:
+    raise ImproperlyConfigured('PASSWORD_HASHER=argon2 requires argon2-cffi: pip install argon2-cffi')
+PASSWORD_HASHERS = [_PASSWORD_HASHER_CLASSES.pop(PASSWORD_HASHER), *_PASSWORD_HASHER_CLASSES.values()]
+# scrypt: memory use is 128 * work factor * 8 bytes (16 MiB; ~70 ms a hash)
+PASSWORD_SCRYPT_WORK_FACTOR = config('PASSWORD_SCRYPT_WORK_FACTOR', default=2**14, cast=int)
+# argon2id: passes, memory in KiB, lanes
+PASSWORD_ARGON2_TIME_COST = config('PASSWORD_ARGON2_TIME_COST', default=2, cast=int)
+PASSWORD_ARGON2_MEMORY_COST = config('PASSWORD_ARGON2_MEMORY_COST', default=19456, cast=int)
+PASSWORD_ARGON2_PARALLELISM = config('PASSWORD_ARGON2_PARALLELISM', default=1, cast=int)
+PASSWORD_PBKDF2_ITERATIONS = config('PASSWORD_PBKDF2_ITERATIONS', default=720000, cast=int)
+# Threads hashing passwords: at most this many logins hash at once, the
+# rest wait for a thread (0 = hash in the request thread)
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)
+
+# Throttling (encyclopedia/throttling.py): attempts allowed per window of
+# seconds. Logins count failures only, so a class logging in together from
+# one address is not refused; a correct password clears its username's count.
+# The counters live in CACHES, so they are per process unless CACHE_SHARED.
+THROTTLE_RATES = {
+    'login_ip': (50, 300),
+    'login_username': (5, 300),
+    'register_ip': (50, 3600),
+    'guest_ip': (50, 3600),
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
+# ProfileModelBackend joins UserProfile into the per-request user lookup.
+# ModelBackend stays listed so sessions created before it still resolve.
+AUTHENTICATION_BACKENDS = [
+    'encyclopedia.backends.ProfileModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -120,15 +307,78 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Outside DEBUG, collectstatic writes content-hashed names plus .gz/.br
+# copies, served with far-future caching by StaticFilesMiddleware.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'encyclopedia.staticfiles.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 # Media files (user-uploaded content)
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Threads building WebP/AVIF thumbnails after uploads (0 = build inline)
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# Game scores: append to a local journal and apply them in batches
+# (see encyclopedia/ingestion.py) instead of writing them in the request
+SCORE_WRITE_BEHIND = config('SCORE_WRITE_BEHIND', default=False, cast=bool)
+SCORE_JOURNAL_PATH = config('SCORE_JOURNAL_PATH', default=str(BASE_DIR / 'score_journal.sqlite3'))
+# Seconds between flushes (0 = apply after each request commits)
+SCORE_FLUSH_INTERVAL = config('SCORE_FLUSH_INTERVAL', default=1.0, cast=float)
+SCORE_FLUSH_BATCH_SIZE = 500
+
+# Raw GameScore rows older than this are pruned by compact_scores; their
+# daily/weekly rollups (GameScoreRollup) are kept
+GAME_SCORE_RETENTION_DAYS = config('GAME_SCORE_RETENTION_DAYS', default=365, cast=int)
+
+# Sessions: cached_db (the session table behind the cache), db, cache, or
+# signed_cookies (no server-side storage; the data lives in the cookie).
+# cached_db is only the default with a shared cache: with a per-process one,
+# a logout or cycle_key() would evict the session from one worker only.
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + config(
+    'SESSION_ENGINE', default='cached_db' if CACHE_SHARED else 'db',
+    cast=Choices(['cached_db', 'db', 'cache', 'signed_cookies']),
+)
+
+# Guests get an account of their own, deleted by reap_guests after this long
+GUEST_ACCOUNT_TTL_HOURS = config('GUEST_ACCOUNT_TTL_HOURS', default=24, cast=int)
+
 # Login URL
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Logging
+# Per-request query summaries go to the 'encyclopedia.queries' logger:
+# DEBUG for every request, WARNING when over budget or a likely N+1.
+# Lower the level to DEBUG to log every request.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'encyclopedia.queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
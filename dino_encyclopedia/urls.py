@@ -24,7 +24,8 @@ urlpatterns = [
     path('', include('encyclopedia.urls')),
 ]
 
-# Serve media files in development
+# Serve media files in development. Static files are served by runserver
+# in development and by encyclopedia.staticfiles.StaticFilesMiddleware
+# after collectstatic.
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,5 +1,8 @@
-from django.contrib import admin
-from .models import Period, Dinosaur, UserProfile, AlbumItem, GameScore
+from django.contrib import admin, messages
+from .models import (
+    Period, Dinosaur, UserProfile, AlbumItem, GameScore, GameScoreRollup, TokenTransaction, BestScore
+)
+from . import services
 
 
 @admin.register(Period)
@@ -20,8 +23,15 @@ class DinosaurAdmin(admin.ModelAdmin):
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'tokens', 'progress_percentage', 'created_at']
+    list_select_related = ['user']
     search_fields = ['user__username', 'user__email']
     readonly_fields = ['created_at', 'updated_at', 'progress_percentage']
+    actions = ['fill_albums']
+
+    @admin.action(description='Collect every dinosaur for the selected users')
+    def fill_albums(self, request, queryset):
+        collected = services.fill_albums(queryset.values_list('user_id', flat=True))
+        self.message_user(request, f'{collected} album items collected.', messages.SUCCESS)
 
 
 @admin.register(AlbumItem)
@@ -33,7 +43,55 @@ class AlbumItemAdmin(admin.ModelAdmin):
 
 @admin.register(GameScore)
 class GameScoreAdmin(admin.ModelAdmin):
+    # No date_hierarchy: it scans every raw score for distinct dates.
+    # Trends over time are charted from the rollups (GameScoreRollupAdmin).
     list_display = ['user', 'game_type', 'score', 'completed_at']
     list_filter = ['game_type', 'completed_at']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+    show_full_result_count = False
+
+
+@admin.register(GameScoreRollup)
+class GameScoreRollupAdmin(admin.ModelAdmin):
+    list_display = ['user', 'game_type', 'granularity', 'period_start', 'count', 'average_score', 'best_score']
+    list_filter = ['granularity', 'game_type']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+    date_hierarchy = 'period_start'
+    readonly_fields = ['user', 'game_type', 'granularity', 'period_start', 'count', 'best_score', 'total_score']
+    activity_days = 30
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        activity = services.get_score_activity(self.activity_days, request.GET.get('game_type__exact'))
+        peak = max((day['games'] for day in activity), default=0)
+        for day in activity:
+            day['percent'] = round(100 * day['games'] / peak) if peak else 0
+        extra_context = {**(extra_context or {}), 'activity': activity, 'activity_days': self.activity_days}
+        return super().changelist_view(request, extra_context)
+
+
+@admin.register(BestScore)
+class BestScoreAdmin(admin.ModelAdmin):
+    list_display = ['user', 'game_type', 'scope', 'period_start', 'best_score', 'achieved_at']
+    list_filter = ['game_type', 'scope']
+    list_select_related = ['user']
     search_fields = ['user__username']
-    date_hierarchy = 'completed_at'
+
+
+@admin.register(TokenTransaction)
+class TokenTransactionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'amount', 'balance_after', 'reason', 'created_at']
+    list_filter = ['reason']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'amount', 'balance_after', 'reason', 'created_at']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
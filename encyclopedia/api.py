@@ -0,0 +1,291 @@
+"""
+Read-only JSON API for the React frontend.
+
+Endpoints mirror the HTML views but return plain data. Every response
+carries a strong ETag derived from the catalog version and, for per-user
+data, the user's album or scores version (see services.get_user_data_version).
+The ETag is computed before the view runs, so a matching If-None-Match is
+answered with 304 Not Modified without querying or serializing the data.
+
+Dinosaur payloads support sparse fieldsets: ``?fields=id,name,diet`` only
+loads and returns those fields.
+
+The only write endpoint, album/collect/, takes a JSON body and uses the
+session's CSRF protection like any other POST.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST, require_safe
+
+from . import catalog, images, services
+from .models import GameScore
+
+MAX_PAGE_SIZE = 100
+MAX_COLLECT_IDS = 500
+
+# API field name -> (model columns to load, serializer)
+DINOSAUR_FIELDS = {
+    'id': (['id'], lambda d: d.id),
+    'name': (['name'], lambda d: d.name),
+    'scientific_name': (['scientific_name'], lambda d: d.scientific_name),
+    'period': (['period', 'period__name'], lambda d: d.period.name),
+    'diet': (['diet'], lambda d: d.diet),
+    'length_meters': (['length_meters'], lambda d: float(d.length_meters)),
+    'weight_kg': (['weight_kg'], lambda d: float(d.weight_kg)),
+    'description': (['description'], lambda d: d.description),
+    'fun_fact': (['fun_fact'], lambda d: d.fun_fact),
+    'discovered_year': (['discovered_year'], lambda d: d.discovered_year),
+    'image': (['image'], lambda d: d.image.url if d.image else None),
+    'image_srcset': (
+        ['image_derivatives'],
+        lambda d: {fmt: images.srcset(d.image_derivatives, fmt) for fmt in images.FORMATS},
+    ),
+}
+DEFAULT_DINOSAUR_FIELDS = ['id', 'name', 'scientific_name', 'period', 'diet', 'image']
+
+
+class BadRequest(ValueError):
+    """Raised for invalid query parameters; rendered as a JSON 400."""
+
+
+def _error(status, message):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def catalog_etag(request, *args, **kwargs):
+    """ETag for catalog data: changes with the catalog version and the query."""
+    return _etag('catalog', catalog.get_catalog_version(), request.path, request.GET.urlencode())
+
+
+def user_etag(kind):
+    """ETag factory for one kind of per-user data ('album' or 'scores')."""
+    def etag_func(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return None
+        user_id = request.user.pk
+        return _etag(
+            kind,
+            user_id,
+            services.get_user_data_version(user_id, kind),
+            catalog.get_catalog_version(),
+            request.path,
+            request.GET.urlencode(),
+        )
+    return etag_func
+
+
+def api_login_required(view):
+    """
+    Reject anonymous callers with a JSON 401 (rather than the login
+    redirect) and turn BadRequest into a JSON 400.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error(401, 'Authentication required')
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as exc:
+            return _error(400, str(exc))
+    return wrapper
+
+
+def api_view(etag_func, private=False):
+    """Wrap a read-only API view that answers conditional GETs via ``etag_func``."""
+    def decorator(view):
+        conditional = condition(etag_func=etag_func)(view)
+
+        @require_safe
+        @api_login_required
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # Clients may keep a copy but must revalidate it with the ETag;
+            # only catalog data may be kept by shared caches
+            if private:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, public=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def parse_fields(request):
+    """
+    Read the ``fields`` parameter.
+
+    Returns:
+        List of API field names
+
+    Raises:
+        BadRequest: if an unknown field is requested
+    """
+    raw = request.GET.get('fields')
+    if not raw:
+        return DEFAULT_DINOSAUR_FIELDS
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in DINOSAUR_FIELDS]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def dinosaur_columns(fields):
+    """Model columns needed to serialize ``fields``, for QuerySet.only()."""
+    columns = {'id', 'name'}  # Keyset pagination sorts on (name, id)
+    for name in fields:
+        columns.update(DINOSAUR_FIELDS[name][0])
+    return sorted(columns)
+
+
+def serialize_dinosaur(dinosaur, fields):
+    return {name: DINOSAUR_FIELDS[name][1](dinosaur) for name in fields}
+
+
+def _page_size(request):
+    raw = request.GET.get('limit')
+    if not raw:
+        return services.GALLERY_PAGE_SIZE
+    try:
+        size = int(raw)
+    except ValueError:
+        raise BadRequest('limit must be an integer')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _cursor(request, param):
+    cursor = request.GET.get(param)
+    if cursor and services.decode_cursor(cursor) is None:
+        raise BadRequest(f'{param} is not a valid page cursor')
+    return cursor
+
+
+@api_view(catalog_etag)
+def dinosaur_list(request):
+    """Paginated, filterable dinosaur list (?period=, ?diet=, ?search=, ?after=, ?before=)."""
+    fields = parse_fields(request)
+    dinosaurs = services.filter_dinosaurs(
+        period_name=request.GET.get('period'),
+        diet=request.GET.get('diet'),
+        query=request.GET.get('search'),
+    )
+    if 'period' not in fields:
+        dinosaurs = dinosaurs.select_related(None)
+    dinosaurs = dinosaurs.only(*dinosaur_columns(fields))
+    page = services.paginate_dinosaurs(
+        dinosaurs,
+        after=_cursor(request, 'after'),
+        before=_cursor(request, 'before'),
+        page_size=_page_size(request),
+    )
+    return JsonResponse({
+        'results': [serialize_dinosaur(dinosaur, fields) for dinosaur in page['items']],
+        'next': page['next_cursor'],
+        'previous': page['previous_cursor'],
+    })
+
+
+@api_view(catalog_etag)
+def dinosaur_detail(request, dinosaur_id):
+    """One dinosaur, all fields by default."""
+    dinosaur = catalog.get_dinosaur(dinosaur_id)
+    if dinosaur is None:
+        return _error(404, 'Dinosaur not found')
+    fields = parse_fields(request) if request.GET.get('fields') else list(DINOSAUR_FIELDS)
+    return JsonResponse(serialize_dinosaur(dinosaur, fields))
+
+
+@api_view(catalog_etag)
+def period_list(request):
+    """All geological periods, oldest first."""
+    return JsonResponse({
+        'results': [
+            {
+                'name': period.name,
+                'label': period.get_name_display(),
+                'era': period.era,
+                'start_mya': period.start_mya,
+                'end_mya': period.end_mya,
+                'description': period.description,
+            }
+            for period in catalog.get_periods()
+        ]
+    })
+
+
+@api_view(user_etag('album'), private=True)
+def album(request):
+    """The current user's collected dinosaurs, most recent first."""
+    fields = parse_fields(request)
+    items = services.get_collected_items(request.user)
+    return JsonResponse({
+        'results': [
+            {
+                'dinosaur': serialize_dinosaur(item.dinosaur, fields),
+                'collected_at': item.collected_at,
+            }
+            for item in items
+        ]
+    })
+
+
+@require_POST
+@api_login_required
+def collect(request):
+    """Collect many dinosaurs at once: POST {"dinosaur_ids": [1, 2, 3]}."""
+    try:
+        dinosaur_ids = json.loads(request.body)['dinosaur_ids']
+    except (ValueError, KeyError, TypeError):
+        raise BadRequest('Expected a JSON object with a dinosaur_ids list')
+    if not isinstance(dinosaur_ids, list) or not all(
+        isinstance(pk, int) and not isinstance(pk, bool) for pk in dinosaur_ids
+    ):
+        raise BadRequest('dinosaur_ids must be a list of integers')
+    if len(dinosaur_ids) > MAX_COLLECT_IDS:
+        raise BadRequest(f'At most {MAX_COLLECT_IDS} dinosaur_ids per request')
+
+    collected = services.collect_dinosaurs(request.user, dinosaur_ids)
+    # request.user.profile was loaded with the session user, before the update
+    profile = services.get_or_create_user_profile(request.user)
+    profile.refresh_from_db(fields=['tokens', 'collected_count'])
+    return JsonResponse({
+        'collected': collected,
+        'tokens': profile.tokens,
+        'progress': services.get_user_progress(request.user),
+    })
+
+
+@api_view(user_etag('album'), private=True)
+def progress(request):
+    """The current user's album completion."""
+    return JsonResponse(services.get_user_progress(request.user))
+
+
+@api_view(user_etag('scores'), private=True)
+def scores(request):
+    """The current user's high scores and personal bests (?game= to filter)."""
+    game_type = request.GET.get('game')
+    if game_type and game_type not in dict(GameScore.GAME_TYPES):
+        raise BadRequest(f'Unknown game {game_type!r}')
+    high_scores = services.get_user_high_scores(request.user, game_type)
+    personal_bests = services.get_personal_bests(request.user)
+    return JsonResponse({
+        'high_scores': [
+            {'game': score.game_type, 'score': score.score, 'completed_at': score.completed_at}
+            for score in high_scores
+        ],
+        'personal_bests': {
+            game: {'score': entry.best_score, 'achieved_at': entry.achieved_at}
+            for game, entry in personal_bests.items()
+            if not game_type or game == game_type
+        },
+    })
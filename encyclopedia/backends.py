@@ -0,0 +1,22 @@
+"""
+Authentication backend that loads the user's profile with the user.
+
+request.user is resolved once per request from the session. Joining the
+profile into that query means views and the nav bar (user.profile.tokens
+in base.html) read the profile without another round trip.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class ProfileModelBackend(ModelBackend):
+    """ModelBackend whose get_user() also selects the related UserProfile."""
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,214 @@
+"""
+Micro-benchmarks for the service layer.
+
+Each benchmark calls one function of services.py the way a view does.
+measure() runs it against the current database and records, for a cold
+cache (cleared before every run) and a warm one:
+
+- ``ms``: median wall time over the repeats;
+- ``queries``: most SQL queries issued by a single run;
+- ``alloc_kib``: peak memory allocated by one run (tracemalloc).
+
+compare() checks a set of results against a baseline: wall time and
+allocations may grow by a relative threshold, query counts may not grow
+at all. The bench_services command builds the data sets and stores the
+results as JSON.
+"""
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from . import services
+from .instrumentation import capture_queries
+from .models import Dinosaur
+
+BENCHMARKS = {}
+METRICS = ('ms', 'queries', 'alloc_kib')
+
+
+def benchmark(name):
+    """Register a benchmark: a callable taking a BenchmarkContext."""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+class BenchmarkContext:
+    """The user and catalog a benchmark works on."""
+
+    def __init__(self, user_id, seed=42):
+        self.user_id = user_id
+        self.rng = random.Random(seed)
+        self.dinosaur_ids = list(Dinosaur.objects.order_by('id').values_list('id', flat=True))
+        self.refresh()
+
+    @classmethod
+    def for_busiest_user(cls, users, seed=42):
+        """Benchmark as the user with the largest album, the worst case."""
+        user = (
+            users.annotate(collected=Count('album_items', filter=Q(album_items__is_collected=True)))
+            .order_by('-collected', 'id').first()
+        )
+        return cls(user.pk, seed)
+
+    def refresh(self):
+        # A fresh user per run, loaded like request.user (profile joined)
+        self.user = User.objects.select_related('profile').get(pk=self.user_id)
+
+
+@benchmark('get_user_progress')
+def bench_user_progress(context):
+    services.get_user_progress(context.user)
+
+
+@benchmark('get_map_data')
+def bench_map_data(context):
+    services.get_map_data(context.user)
+
+
+@benchmark('gallery_page')
+def bench_gallery_page(context):
+    services.paginate_dinosaurs(services.filter_dinosaurs(period_name='jurassic', diet='carnivore'))
+
+
+@benchmark('search_dinosaurs')
+def bench_search(context):
+    services.search_dinosaurs('sau')
+
+
+@benchmark('suggest_dinosaurs')
+def bench_suggest(context):
+    services.suggest_dinosaurs('tri')
+
+
+@benchmark('get_album')
+def bench_album(context):
+    services.get_album(context.user)
+
+
+@benchmark('collect_dinosaur')
+def bench_collect(context):
+    dinosaur = Dinosaur.objects.get(pk=context.rng.choice(context.dinosaur_ids))
+    services.collect_dinosaur(context.user, dinosaur)
+
+
+@benchmark('save_game_score')
+def bench_save_score(context):
+    services.save_game_score(context.user, 'puzzleaurus', context.rng.randint(10, 500))
+
+
+@benchmark('get_leaderboard')
+def bench_leaderboard(context):
+    services.get_leaderboard('puzzleaurus', 'week')
+
+
+@benchmark('get_user_rank')
+def bench_user_rank(context):
+    services.get_user_rank(context.user, 'puzzleaurus')
+
+
+@benchmark('get_personal_bests')
+def bench_personal_bests(context):
+    services.get_personal_bests(context.user)
+
+
+def _run(func, context, clear_cache):
+    context.refresh()
+    if clear_cache:
+        cache.clear()
+    with capture_queries() as stats:
+        start = time.perf_counter()
+        func(context)
+        elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, stats.count
+
+
+def _allocated_kib(func, context, clear_cache):
+    context.refresh()
+    if clear_cache:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        func(context)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def measure(func, context, repeat=10):
+    """
+    Run one benchmark cold and warm.
+
+    Returns:
+        Dictionary {'cold': metrics, 'warm': metrics}, metrics being a
+        dictionary of METRICS
+    """
+    results = {}
+    for mode, clear_cache in (('cold', True), ('warm', False)):
+        if not clear_cache:
+            _run(func, context, clear_cache=False)  # Fill the cache first
+        samples = [_run(func, context, clear_cache) for _ in range(repeat)]
+        results[mode] = {
+            'ms': round(statistics.median(ms for ms, _ in samples), 3),
+            'queries': max(queries for _, queries in samples),
+            'alloc_kib': _allocated_kib(func, context, clear_cache),
+        }
+    return results
+
+
+def run_benchmarks(context, names=None, repeat=10):
+    """
+    Run the registered benchmarks (all of them, or ``names``).
+
+    Returns:
+        Dictionary of benchmark name to measure() results
+    """
+    return {
+        name: measure(BENCHMARKS[name], context, repeat)
+        for name in (names or BENCHMARKS)
+    }
+
+
+def compare(results, baseline, threshold=0.25, min_ms=1.0):
+    """
+    Find regressions of ``results`` against ``baseline``.
+
+    Both are dictionaries {size: {benchmark: {mode: metrics}}}, as stored
+    by bench_services. Entries missing from either side are skipped.
+
+    Args:
+        results: New measurements
+        baseline: Reference measurements
+        threshold: Allowed relative growth of wall time and allocations
+        min_ms: Wall time growth below this many milliseconds is noise
+
+    Returns:
+        List of (size, benchmark, mode, metric, baseline value, new value)
+    """
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, modes in benchmarks.items():
+            for mode, metrics in modes.items():
+                reference = baseline.get(size, {}).get(name, {}).get(mode)
+                if reference is None:
+                    continue
+                for metric in METRICS:
+                    old, new = reference.get(metric), metrics.get(metric)
+                    if old is None or new is None:
+                        continue
+                    if metric == 'queries':
+                        regressed = new > old
+                    elif metric == 'ms':
+                        regressed = new > old * (1 + threshold) and new - old >= min_ms
+                    else:
+                        regressed = new > old * (1 + threshold)
+                    if regressed:
+                        regressions.append((size, name, mode, metric, old, new))
+    return regressions
@@ -0,0 +1,250 @@
+"""
+Cached reference data for the encyclopedia catalog (periods and dinosaurs).
+
+Catalog data only changes when an admin or a management command edits it,
+so reads go through two cache tiers before touching the database:
+
+1. a small process-local LRU dictionary,
+2. the Django cache (settings.CACHES).
+
+Every key embeds the catalog version, which signals.py bumps whenever a
+Period or Dinosaur row is saved or deleted. Stale entries are never read
+again and simply age out. A bump is only seen by the processes sharing
+the cache the counter lives in; with a per-process cache (CACHE_BACKEND
+locmem), entries expire after settings.VERSIONED_CACHE_TIMEOUT so other
+processes pick up the change within that time. Objects returned from here are shared between
+requests and must be treated as read-only. The ``a``-prefixed functions
+are the same reads for async views.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Dinosaur, Period
+
+CATALOG_VERSION_CACHE_KEY = 'encyclopedia:catalog_version'
+CATALOG_CACHE_KEY = 'encyclopedia:catalog:{version}:{name}'
+LOCAL_CACHE_MAX_ENTRIES = 1024
+
+_MISSING = object()
+_local = OrderedDict()
+_lock = threading.Lock()
+
+# Hit/miss counters for this process
+stats = Counter()
+
+
+def get_version(key):
+    """
+    Read a version counter from the shared cache, creating it if missing.
+
+    New counters start from the current time in milliseconds, so a counter
+    that was evicted never restarts at a value used before.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(key):
+    """get_version() for async code."""
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, int(time.time() * 1000), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(key):
+    """Increment a version counter in the shared cache."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(key)
+
+
+def get_catalog_version():
+    """
+    Get the current catalog version.
+
+    Cache keys built from this version go stale as soon as a Period or
+    Dinosaur row changes (see bump_catalog_version).
+
+    Returns:
+        Integer version number
+    """
+    return get_version(CATALOG_VERSION_CACHE_KEY)
+
+
+async def aget_catalog_version():
+    """get_catalog_version() for async code."""
+    return await aget_version(CATALOG_VERSION_CACHE_KEY)
+
+
+def bump_catalog_version():
+    """Invalidate every cache entry keyed on the catalog version."""
+    bump_version(CATALOG_VERSION_CACHE_KEY)
+    with _lock:
+        _local.clear()
+
+
+def _local_get(key):
+    with _lock:
+        expires, value = _local.get(key, (None, _MISSING))
+        if value is not _MISSING:
+            if expires <= time.monotonic():
+                del _local[key]
+                return _MISSING
+            _local.move_to_end(key)
+            stats['local_hits'] += 1
+    return value
+
+
+def _local_set(key, value):
+    with _lock:
+        _local[key] = (time.monotonic() + settings.VERSIONED_CACHE_TIMEOUT, value)
+        _local.move_to_end(key)
+        while len(_local) > LOCAL_CACHE_MAX_ENTRIES:
+            _local.popitem(last=False)
+
+
+def _read_through(name, loader):
+    """Return a catalog value from the local tier, the shared cache or the loader."""
+    key = CATALOG_CACHE_KEY.format(version=get_catalog_version(), name=name)
+    value = _local_get(key)
+    if value is not _MISSING:
+        return value
+
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        stats['misses'] += 1
+        value = loader()
+        cache.set(key, value, settings.VERSIONED_CACHE_TIMEOUT)
+    else:
+        stats['shared_hits'] += 1
+    _local_set(key, value)
+    return value
+
+
+async def _aread_through(name, loader):
+    """_read_through() for async code; ``loader`` is a coroutine function."""
+    key = CATALOG_CACHE_KEY.format(version=await aget_catalog_version(), name=name)
+    value = _local_get(key)
+    if value is not _MISSING:
+        return value
+
+    value = await cache.aget(key, _MISSING)
+    if value is _MISSING:
+        stats['misses'] += 1
+        value = await loader()
+        await cache.aset(key, value, settings.VERSIONED_CACHE_TIMEOUT)
+    else:
+        stats['shared_hits'] += 1
+    _local_set(key, value)
+    return value
+
+
+def get_cache_stats():
+    """
+    Get this process's catalog cache counters.
+
+    Returns:
+        Dictionary with local_hits, shared_hits, misses and hit_ratio
+    """
+    local_hits, shared_hits, misses = stats['local_hits'], stats['shared_hits'], stats['misses']
+    total = local_hits + shared_hits + misses
+    return {
+        'local_hits': local_hits,
+        'shared_hits': shared_hits,
+        'misses': misses,
+        'hit_ratio': round((local_hits + shared_hits) / total, 4) if total else 0,
+    }
+
+
+def reset_cache_stats():
+    """Zero the counters, e.g. between benchmark runs."""
+    stats.clear()
+
+
+def get_periods():
+    """
+    Get all geological periods.
+
+    Returns:
+        List of Period objects in default ordering (oldest first)
+    """
+    return list(_read_through('periods', lambda: list(Period.objects.all())))
+
+
+async def aget_periods():
+    """get_periods() for async code."""
+    async def load():
+        return [period async for period in Period.objects.all()]
+
+    return list(await _aread_through('periods', load))
+
+
+def get_catalog_size():
+    """
+    Get the number of dinosaurs in the catalog.
+
+    Returns:
+        Integer number of Dinosaur rows
+    """
+    return _read_through('size', Dinosaur.objects.count)
+
+
+async def aget_catalog_size():
+    """get_catalog_size() for async code."""
+    return await _aread_through('size', Dinosaur.objects.acount)
+
+
+def get_dinosaur(dinosaur_id):
+    """
+    Get one dinosaur with its period attached.
+
+    Args:
+        dinosaur_id: Dinosaur primary key
+
+    Returns:
+        Dinosaur object, or None if it does not exist
+    """
+    return _read_through(
+        f'dinosaur:{dinosaur_id}',
+        lambda: Dinosaur.objects.select_related('period').filter(pk=dinosaur_id).first()
+    )
+
+
+async def aget_dinosaur(dinosaur_id):
+    """get_dinosaur() for async code."""
+    return await _aread_through(
+        f'dinosaur:{dinosaur_id}',
+        Dinosaur.objects.select_related('period').filter(pk=dinosaur_id).afirst
+    )
+
+
+def get_album_catalog():
+    """
+    Get every period with its dinosaurs, the skeleton of a user's album.
+
+    Only the columns an album needs are loaded.
+
+    Returns:
+        List of (Period, [Dinosaur, ...]) tuples, periods oldest first and
+        dinosaurs by name
+    """
+    def load():
+        by_period = defaultdict(list)
+        dinosaurs = Dinosaur.objects.only(
+            'id', 'name', 'period_id', 'diet', 'image', 'image_derivatives'
+        )
+        for dinosaur in dinosaurs.order_by('name', 'id'):
+            by_period[dinosaur.period_id].append(dinosaur)
+        return [(period, by_period[period.pk]) for period in Period.objects.all()]
+
+    return _read_through('album', load)
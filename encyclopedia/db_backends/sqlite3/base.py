@@ -0,0 +1,47 @@
+"""
+SQLite backend tuned for concurrent writers on a single node.
+
+Backports two OPTIONS that Django 5.1 adds to its own SQLite backend:
+
+- ``init_command``: semicolon-separated statements run on every new
+  connection, e.g. ``PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL``.
+- ``transaction_mode``: ``DEFERRED``, ``IMMEDIATE`` or ``EXCLUSIVE``.
+  With IMMEDIATE a transaction takes the write lock when it starts and
+  waits up to ``timeout`` seconds for it, instead of failing with
+  "database is locked" when a read inside atomic() upgrades to a write.
+
+Once the project moves to Django 5.1 the ENGINE can go back to
+``django.db.backends.sqlite3`` with the same OPTIONS.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = (None, 'DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.init_commands = params.pop('init_command', '').split(';')
+        self.transaction_mode = params.pop('transaction_mode', None)
+        if self.transaction_mode is not None:
+            self.transaction_mode = self.transaction_mode.upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES['{self.alias}']['OPTIONS']['transaction_mode'] "
+                f"must be one of {', '.join(mode for mode in TRANSACTION_MODES if mode)}"
+            )
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for command in self.init_commands:
+            if command := command.strip():
+                conn.execute(command)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,90 @@
+"""
+Password hashers tuned from settings and run on a bounded thread pool.
+
+settings.PASSWORD_HASHER picks the algorithm for new passwords and the
+PASSWORD_SCRYPT_*, PASSWORD_ARGON2_* and PASSWORD_PBKDF2_* settings its
+cost. settings.PASSWORD_HASHERS lists the chosen hasher first and the
+others after it, so existing hashes still verify; Django rehashes them on
+the user's next successful login, also when only the cost changed.
+
+Hashing is deliberately slow CPU work (and releases the GIL). All of it
+runs on one pool of settings.PASSWORD_HASH_WORKERS threads, so a burst of
+logins uses at most that many cores: the logins queue for the pool while
+the other request threads keep serving pages.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def _mark_worker():
+    _local.in_pool = True
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix='password-hash',
+                initializer=_mark_worker,
+            )
+    return _pool
+
+
+def run_bounded(func, *args, **kwargs):
+    """
+    Run a hashing function on the pool and wait for its result.
+
+    Runs inline when settings.PASSWORD_HASH_WORKERS is 0, and when already
+    on the pool (verify() calls encode()), which would otherwise deadlock.
+    """
+    if not settings.PASSWORD_HASH_WORKERS or getattr(_local, 'in_pool', False):
+        return func(*args, **kwargs)
+    return _executor().submit(func, *args, **kwargs).result()
+
+
+class BoundedHasherMixin:
+    """Run encode() and verify() of a Django hasher on the pool."""
+
+    def encode(self, *args, **kwargs):
+        return run_bounded(super().encode, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return run_bounded(super().verify, password, encoded)
+
+
+class ScryptPasswordHasher(BoundedHasherMixin, hashers.ScryptPasswordHasher):
+    # hashlib.scrypt refuses to use more than 32 MiB unless allowed to
+    maxmem = 2**30
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+
+class Argon2PasswordHasher(BoundedHasherMixin, hashers.Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class PBKDF2PasswordHasher(BoundedHasherMixin, hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
@@ -0,0 +1,185 @@
+"""
+Responsive image derivatives for uploaded images.
+
+When a Dinosaur.image or UserProfile.avatar changes, resized WebP (and
+AVIF, where Pillow supports it) copies are written next to the media
+files under ``derivatives/``. Their names embed a hash of the source
+bytes, so they never change once written and can be cached forever.
+The generated files are recorded in the model's ``<field>_derivatives``
+JSON field, which the ``{% picture %}`` template tag turns into srcset
+attributes.
+
+Generation runs after the transaction commits, on a small thread pool
+(settings.IMAGE_DERIVATIVE_WORKERS; 0 runs it inline).
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from .catalog import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+# Field -> widths (px) to generate and whether to crop to a square
+DERIVATIVE_SPECS = {
+    'image': {'widths': [320, 640, 1024], 'square': False},
+    'avatar': {'widths': [96, 192, 320], 'square': True},
+}
+FORMATS = {
+    'avif': {'quality': 50},
+    'webp': {'quality': 80, 'method': 4},
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def available_formats():
+    """Derivative formats this Pillow build can encode, best first."""
+    return [name for name in FORMATS if features.check(name)]
+
+
+def content_hash(field_file):
+    """Short SHA-256 of a stored file's bytes."""
+    digest = hashlib.sha256()
+    with field_file.open('rb') as handle:
+        for chunk in iter(lambda: handle.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    image.save(buffer, format=fmt.upper(), **FORMATS[fmt])
+    return buffer.getvalue()
+
+
+def build_derivatives(field_file, field_name, force=False):
+    """
+    Write every derivative of one image to storage.
+
+    Files that already exist (same source bytes) are not re-encoded
+    unless ``force`` is set, e.g. after changing FORMATS.
+
+    Args:
+        field_file: FieldFile of the source image
+        field_name: Key of DERIVATIVE_SPECS
+        force: Re-encode and overwrite existing files
+
+    Returns:
+        Dictionary {'source': name, 'width': px, <format>: {<width>: name}}
+    """
+    spec = DERIVATIVE_SPECS[field_name]
+    source = PurePosixPath(field_file.name)
+    prefix = f'derivatives/{source.parent}/{source.stem}-{content_hash(field_file)}'
+
+    with field_file.open('rb') as handle:
+        original = ImageOps.exif_transpose(Image.open(handle))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+    if spec['square']:
+        side = min(original.size)
+        original = ImageOps.fit(original, (side, side))
+
+    # Never upscale: widths beyond the original collapse to the original width
+    widths = sorted({min(width, original.width) for width in spec['widths']})
+    derivatives = {'source': field_file.name, 'width': original.width}
+    for fmt in available_formats():
+        derivatives[fmt] = {}
+        for width in widths:
+            name = f'{prefix}-{width}.{fmt}'
+            if force and default_storage.exists(name):
+                # save() would pick a new name rather than overwrite
+                default_storage.delete(name)
+            if not default_storage.exists(name):
+                resized = original
+                if width < original.width:
+                    height = round(original.height * width / original.width)
+                    resized = original.resize((width, height), Image.LANCZOS)
+                name = default_storage.save(name, ContentFile(_encode(resized, fmt)))
+            derivatives[fmt][str(width)] = name
+    return derivatives
+
+
+def refresh_derivatives(model, pk, field_name, force=False):
+    """
+    Generate the derivatives for one row and store them on it.
+
+    Re-reads the row, so a job that ran late for an image that has since
+    been replaced does nothing. ``force`` re-encodes existing files (see
+    build_derivatives).
+    """
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, field_name)
+    rows = model.objects.filter(pk=pk)
+    if field_file:
+        derivatives = build_derivatives(field_file, field_name, force=force)
+        rows = rows.filter(**{field_name: field_file.name})
+    else:
+        derivatives = {}
+
+    updated = rows.update(**{f'{field_name}_derivatives': derivatives})
+    if updated and model._meta.model_name == 'dinosaur':
+        # queryset.update() skips the signal that invalidates the catalog cache
+        bump_catalog_version()
+
+
+def _run(model, pk, field_name):
+    try:
+        refresh_derivatives(model, pk, field_name)
+    except Exception:
+        logger.exception('Could not build %s derivatives for %s %s', field_name, model.__name__, pk)
+    finally:
+        if threading.current_thread().name.startswith('image-derivatives'):
+            connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                thread_name_prefix='image-derivatives',
+            )
+    return _executor
+
+
+def schedule_derivatives(instance, field_name):
+    """
+    Queue derivative generation for an instance if its image changed.
+
+    Runs once the current transaction commits, on the worker pool or
+    inline when settings.IMAGE_DERIVATIVE_WORKERS is 0.
+    """
+    field_file = getattr(instance, field_name)
+    current = getattr(instance, f'{field_name}_derivatives') or {}
+    if (field_file.name or None) == current.get('source'):
+        return
+
+    model, pk = type(instance), instance.pk
+    if getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 0):
+        transaction.on_commit(lambda: _get_executor().submit(_run, model, pk, field_name))
+    else:
+        transaction.on_commit(lambda: _run(model, pk, field_name))
+
+
+def srcset(derivatives, fmt):
+    """Build a srcset attribute value for one format, or '' if none exist."""
+    variants = (derivatives or {}).get(fmt) or {}
+    return ', '.join(
+        f'{default_storage.url(name)} {width}w'
+        for width, name in sorted(variants.items(), key=lambda item: int(item[0]))
+    )
@@ -0,0 +1,204 @@
+"""
+Bulk, idempotent catalog import.
+
+Rows are streamed from JSONL or CSV files and upserted in fixed-size
+batches with bulk_create(update_conflicts=True), keyed on the unique
+Dinosaur.name. Memory use is bounded by the batch size, not the file size.
+"""
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.db import reset_queries, transaction
+
+from .catalog import bump_catalog_version
+from .models import Dinosaur, Period
+
+DINOSAUR_FIELDS = [
+    'scientific_name', 'period_id', 'diet', 'length_meters', 'weight_kg',
+    'description', 'fun_fact', 'discovered_year',
+]
+DIETS = {value for value, label in Dinosaur.DIET_CHOICES}
+
+
+class ImportRowError(ValueError):
+    """Raised for a catalog row that cannot be imported."""
+
+
+@dataclass
+class ImportStats:
+    """Counters reported by import_dinosaurs()."""
+    rows: int = 0
+    upserted: int = 0
+    skipped: int = 0
+    batches: int = 0
+    errors: list = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0
+
+
+def read_catalog(path):
+    """
+    Stream catalog rows from a .jsonl or .csv file.
+
+    Yields:
+        One dictionary per row, or an ImportRowError for a JSONL line that
+        is not a JSON object, so one bad line does not end the import
+    """
+    path = Path(path)
+    with path.open(newline='', encoding='utf-8') as handle:
+        if path.suffix.lower() == '.csv':
+            yield from csv.DictReader(handle)
+        else:
+            for number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    yield ImportRowError(f'line {number} is not valid JSON ({exc})')
+                    continue
+                if not isinstance(row, dict):
+                    yield ImportRowError(f'line {number} is not a JSON object')
+                    continue
+                yield row
+
+
+def _validate(value, name):
+    """Run the model field's validators, which bulk_create() skips."""
+    try:
+        Dinosaur._meta.get_field(name).run_validators(value)
+    except ValidationError as exc:
+        raise ImportRowError(f'{name} {value}: {" ".join(exc.messages)}')
+    return value
+
+
+def _decimal(value, name):
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ImportRowError(f'{name} is not a number: {value!r}')
+    if not number.is_finite():
+        raise ImportRowError(f'{name} is not a number: {value!r}')
+    # Minimum, and max_digits/decimal_places, which the column enforces too
+    return _validate(number, name)
+
+
+def build_dinosaur(row, period_ids):
+    """
+    Validate one catalog row and turn it into an unsaved Dinosaur.
+
+    Args:
+        row: Dictionary with the Dinosaur fields; ``period`` is a period name
+        period_ids: Mapping of period name to primary key
+
+    Returns:
+        Dinosaur object
+
+    Raises:
+        ImportRowError: if the row is invalid
+    """
+    if not isinstance(row, dict):
+        raise ImportRowError(f'expected a mapping of fields, got {type(row).__name__}')
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ImportRowError('name is required')
+    period = (row.get('period') or '').strip().lower()
+    if period not in period_ids:
+        raise ImportRowError(f'unknown period {period!r}')
+    diet = (row.get('diet') or '').strip().lower()
+    if diet not in DIETS:
+        raise ImportRowError(f'unknown diet {diet!r}')
+    year = row.get('discovered_year')
+    try:
+        year = int(year) if year not in (None, '') else None
+    except (TypeError, ValueError):
+        raise ImportRowError(f'discovered_year is not a number: {year!r}')
+    if year is not None:
+        _validate(year, 'discovered_year')
+
+    return Dinosaur(
+        name=name,
+        scientific_name=row.get('scientific_name') or '',
+        period_id=period_ids[period],
+        diet=diet,
+        length_meters=_decimal(row.get('length_meters'), 'length_meters'),
+        weight_kg=_decimal(row.get('weight_kg'), 'weight_kg'),
+        description=row.get('description') or '',
+        fun_fact=row.get('fun_fact') or '',
+        discovered_year=year,
+    )
+
+
+def import_dinosaurs(rows, batch_size=2000, on_batch=None, max_errors=20):
+    """
+    Upsert dinosaurs from an iterable of row dictionaries.
+
+    Each batch is one transaction and one INSERT ... ON CONFLICT (name)
+    DO UPDATE statement. Re-running an import is a no-op apart from
+    updated_at.
+
+    Args:
+        rows: Iterable of dictionaries (see build_dinosaur); ImportRowError
+            items (see read_catalog) are counted as skipped rows
+        batch_size: Rows per transaction
+        on_batch: Optional callback receiving ImportStats after each batch
+        max_errors: Number of row errors to keep for reporting
+
+    Returns:
+        ImportStats
+    """
+    period_ids = dict(Period.objects.values_list('name', 'id'))
+    stats = ImportStats()
+    rows = iter(rows)
+
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+
+        # Last row wins when a name repeats inside one batch
+        batch = {}
+        for row in chunk:
+            stats.rows += 1
+            try:
+                if isinstance(row, ImportRowError):
+                    raise row
+                dinosaur = build_dinosaur(row, period_ids)
+            except ImportRowError as exc:
+                stats.skipped += 1
+                if len(stats.errors) < max_errors:
+                    stats.errors.append(f'row {stats.rows}: {exc}')
+                continue
+            batch[dinosaur.name] = dinosaur
+
+        if batch:
+            with transaction.atomic():
+                Dinosaur.objects.bulk_create(
+                    batch.values(),
+                    update_conflicts=True,
+                    unique_fields=['name'],
+                    update_fields=DINOSAUR_FIELDS + ['updated_at'],
+                )
+            stats.upserted += len(batch)
+        stats.batches += 1
+        # Keep DEBUG's query log from growing with the file
+        reset_queries()
+        if on_batch:
+            on_batch(stats)
+
+    # bulk_create bypasses post_save, so invalidate catalog caches here
+    bump_catalog_version()
+    return stats
@@ -0,0 +1,248 @@
+"""
+Write-behind ingestion of game scores.
+
+With settings.SCORE_WRITE_BEHIND on, submit_game_score() appends the
+score to a local SQLite journal (settings.SCORE_JOURNAL_PATH) and returns
+as soon as the append is on disk, without touching the main database.
+A background thread flushes the journal every SCORE_FLUSH_INTERVAL
+seconds, or about every SCORE_FLUSH_BATCH_SIZE scores, applying each
+batch in one transaction with services.save_game_scores_bulk().
+
+Crash safety: the same transaction advances the journal's
+ScoreJournalCheckpoint, and entries are deleted from the journal only
+after it commits. Entries left behind by a crash are replayed by the next
+flush (or ``manage.py flush_scores``) and the checkpoint skips the ones
+already applied, so every score is applied exactly once.
+
+An entry the database rejects (bad data, not an outage) would fail its
+batch on every retry. When a batch fails that way its entries are applied
+one by one, and the ones that still fail are moved to the journal's
+quarantine table with the error, so the rest are not held back.
+"""
+import atexit
+import datetime
+import logging
+import sqlite3
+import threading
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import services
+from .models import GameScore, ScoreJournalCheckpoint
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS entries ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,'
+    ' game_type TEXT NOT NULL, score INTEGER NOT NULL, completed_at TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS quarantine ('
+    ' id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, game_type TEXT NOT NULL,'
+    ' score INTEGER NOT NULL, completed_at TEXT NOT NULL, error TEXT NOT NULL)',
+]
+# Largest score the GameScore.score column holds
+MAX_SCORE = 2 ** 31 - 1
+# Errors caused by an entry itself; anything else (e.g. the database being
+# down) fails the whole flush, to be retried
+ENTRY_ERRORS = (DataError, IntegrityError, TypeError, ValueError, OverflowError)
+
+_local = threading.local()
+_flush_lock = threading.Lock()
+_flusher = None
+_flusher_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def _journal():
+    """This thread's connection to the journal, created on first use."""
+    path = str(settings.SCORE_JOURNAL_PATH)
+    conn = getattr(_local, 'connection', None)
+    if conn is not None and _local.path == path:
+        return conn
+    if conn is not None:
+        conn.close()
+    # Autocommit: every append is its own durable transaction
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=FULL')
+    for statement in JOURNAL_SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT OR IGNORE INTO meta VALUES ('journal_id', ?)", (uuid.uuid4().hex,))
+    _local.connection, _local.path = conn, path
+    return conn
+
+
+def journal_id():
+    """Identifier of the journal file, the key of its checkpoint."""
+    return _journal().execute("SELECT value FROM meta WHERE key = 'journal_id'").fetchone()[0]
+
+
+def pending_count():
+    """Number of journal entries not yet deleted (applied or not)."""
+    return _journal().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+
+def quarantined_count():
+    """Number of journal entries set aside because they could not be applied."""
+    return _journal().execute('SELECT COUNT(*) FROM quarantine').fetchone()[0]
+
+
+def check_score(game_type, score):
+    """
+    Reject a game score that could never be saved.
+
+    Raises:
+        ValueError: for an unknown game or a score outside 0..MAX_SCORE
+    """
+    if game_type not in dict(GameScore.GAME_TYPES):
+        raise ValueError(f'Unknown game {game_type!r}')
+    if not 0 <= score <= MAX_SCORE:
+        raise ValueError(f'Score {score} is outside 0..{MAX_SCORE}')
+
+
+def enqueue_score(user_id, game_type, score, completed_at=None):
+    """
+    Append a game score to the journal.
+
+    Returns:
+        Journal entry id
+
+    Raises:
+        ValueError: for an unknown game or an out-of-range score
+    """
+    check_score(game_type, score)
+    completed_at = completed_at or timezone.now()
+    cursor = _journal().execute(
+        'INSERT INTO entries (user_id, game_type, score, completed_at) VALUES (?, ?, ?, ?)',
+        (user_id, game_type, score, completed_at.isoformat()),
+    )
+    if cursor.lastrowid % settings.SCORE_FLUSH_BATCH_SIZE == 0:
+        _wake.set()  # A full batch is waiting; don't wait for the interval
+    return cursor.lastrowid
+
+
+def submit_game_score(user, game_type, score):
+    """
+    Record a game score, buffered when settings.SCORE_WRITE_BEHIND is on.
+
+    Buffered scores are applied by the flusher thread, or once the current
+    transaction commits when settings.SCORE_FLUSH_INTERVAL is 0.
+
+    Returns:
+        True if the score was buffered, False if it was saved already
+
+    Raises:
+        ValueError: for an unknown game or an out-of-range score
+    """
+    check_score(game_type, score)
+    if not getattr(settings, 'SCORE_WRITE_BEHIND', False):
+        services.save_game_score(user, game_type, score)
+        return False
+
+    enqueue_score(user.pk, game_type, score)
+    if settings.SCORE_FLUSH_INTERVAL:
+        _start_flusher()
+    else:
+        transaction.on_commit(flush)
+    return True
+
+
+def flush(batch_size=None):
+    """
+    Apply every pending journal entry, one batch per transaction.
+
+    Returns:
+        Number of journal entries applied
+    """
+    batch_size = batch_size or settings.SCORE_FLUSH_BATCH_SIZE
+    conn = _journal()
+    journal = journal_id()
+    applied = 0
+    with _flush_lock:
+        while True:
+            with transaction.atomic():
+                checkpoint, _ = (
+                    ScoreJournalCheckpoint.objects.select_for_update().get_or_create(journal=journal)
+                )
+                rows = conn.execute(
+                    'SELECT id, user_id, game_type, score, completed_at FROM entries '
+                    'WHERE id > ? ORDER BY id LIMIT ?',
+                    (checkpoint.last_entry_id, batch_size),
+                ).fetchall()
+                if rows:
+                    # Scores of users deleted in the meantime are dropped
+                    users = set(
+                        User.objects.filter(pk__in={row[1] for row in rows}).values_list('pk', flat=True)
+                    )
+                    entries = [row for row in rows if row[1] in users]
+                    try:
+                        _apply(entries)
+                    except ENTRY_ERRORS:
+                        for entry in entries:
+                            try:
+                                _apply([entry])
+                            except ENTRY_ERRORS as exc:
+                                _quarantine(conn, entry, exc)
+                    checkpoint.last_entry_id = rows[-1][0]
+                    checkpoint.save(update_fields=['last_entry_id', 'updated_at'])
+            # Only once committed: a crash before this replays, then skips, the
+            # batch. Inside an outer transaction the entries are kept until a
+            # later flush, as that transaction may still roll back.
+            if not transaction.get_connection().in_atomic_block:
+                conn.execute('DELETE FROM entries WHERE id <= ?', (checkpoint.last_entry_id,))
+            applied += len(rows)
+            if len(rows) < batch_size:
+                return applied
+
+
+def _apply(entries):
+    """Save journal entries in a savepoint, so a failure leaves no trace."""
+    with transaction.atomic():
+        services.save_game_scores_bulk(
+            (user_id, game_type, score, datetime.datetime.fromisoformat(completed_at))
+            for _, user_id, game_type, score, completed_at in entries
+        )
+
+
+def _quarantine(conn, entry, exc):
+    """Set aside a journal entry that cannot be applied."""
+    logger.error('Quarantined buffered game score %s: %r', entry[0], exc)
+    # Keyed on the entry id, so a replayed batch does not add it twice
+    conn.execute(
+        'INSERT OR REPLACE INTO quarantine (id, user_id, game_type, score, completed_at, error) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        (*entry, repr(exc)),
+    )
+
+
+def _flush_forever():
+    while True:
+        _wake.wait(settings.SCORE_FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Could not flush buffered game scores; will retry')
+        finally:
+            close_old_connections()
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception('Buffered game scores left in %s', settings.SCORE_JOURNAL_PATH)
+
+
+def _start_flusher():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_forever, name='score-flusher', daemon=True)
+            _flusher.start()
+            atexit.register(_flush_at_exit)
@@ -0,0 +1,247 @@
+"""
+SQL query instrumentation for requests and tests.
+
+QueryInstrumentationMiddleware records every query a request issues, logs
+a structured summary to the ``encyclopedia.queries`` logger, optionally
+emits a Server-Timing header and flags views that exceed their budget in
+settings.QUERY_BUDGETS or repeat the same SQL shape (a likely N+1).
+
+unindexed_steps() runs SQLite's EXPLAIN QUERY PLAN on a recorded statement
+and reports the table scans and sorts no index serves; QueryPlanMixin
+turns that into a test assertion.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('encyclopedia.queries')
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+# "encyclopedia_albumitem" U0 -> U0 is an alias of encyclopedia_albumitem
+_ALIAS_RE = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)\b')
+_SCAN_RE = re.compile(r'^SCAN (\w+)( USING (?:COVERING )?INDEX \w+)?')
+_LIMIT_RE = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+
+def sql_shape(sql):
+    """Normalize a SQL statement so repeats with different values compare equal."""
+    shape = _IN_LIST_RE.sub('IN (...)', sql)
+    return _LITERAL_RE.sub('?', shape)
+
+
+class QueryStats:
+    """Queries recorded while a capture_queries() block was active."""
+
+    def __init__(self):
+        self.queries = []
+        self.params = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - start) * 1000))
+            self.params.append(None if many else params)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration_ms(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self, threshold=2):
+        """SQL shapes executed at least ``threshold`` times, most repeated first."""
+        shapes = Counter(sql_shape(sql) for sql, _ in self.queries)
+        return {shape: n for shape, n in shapes.most_common() if n >= threshold}
+
+
+@contextmanager
+def capture_queries(using=None):
+    """
+    Record the queries run on one or all database connections.
+
+    Yields:
+        QueryStats instance, filled in as queries execute
+    """
+    stats = QueryStats()
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        yield stats
+
+
+def explain_query_plan(sql, params=None, using='default'):
+    """Return the detail lines of SQLite's EXPLAIN QUERY PLAN for one statement."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def unindexed_steps(sql, params=None, using='default'):
+    """
+    Find the steps of a statement's plan that are not served by an index.
+
+    Reported steps are full table scans, scans of a whole index (chosen only
+    for its sort order) unless the statement has a LIMIT, i.e. is an ordered
+    top-N read that stops early, and sorts of the result in a temporary
+    B-tree (except for full-text matches, which are ranked by relevance).
+    Only SELECT, UPDATE and DELETE statements on application tables are
+    explained.
+
+    Returns:
+        List of (table name, plan detail) tuples; the table is None for sorts
+    """
+    if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS) or 'sqlite_master' in sql:
+        return []
+    connection = connections[using]
+    tables = set(connection.introspection.table_names())
+    aliases = {alias: table for table, alias in _ALIAS_RE.findall(sql)}
+    plan = explain_query_plan(sql, params, using)
+    # Full-text matches are found by their own index and ranked by relevance
+    full_text = any('VIRTUAL TABLE' in detail for detail in plan)
+    steps = []
+    for detail in plan:
+        if detail.startswith('USE TEMP B-TREE FOR ORDER BY'):
+            if not full_text:
+                steps.append((None, detail))
+            continue
+        match = _SCAN_RE.match(detail)
+        if not match or 'VIRTUAL TABLE' in detail:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table in tables and not (match.group(2) and _LIMIT_RE.search(sql)):
+            steps.append((table, detail))
+    return steps
+
+
+def get_query_budget(view_name, method='GET'):
+    """Return the configured query budget for a URL name and method, or None."""
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    budget = budgets.get(f'{method} {view_name}')
+    if budget is None and method in ('GET', 'HEAD'):
+        budget = budgets.get(view_name)
+    return budget
+
+
+class QueryInstrumentationMiddleware:
+    """Record per-request query count, DB time and duplicated SQL shapes."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with capture_queries() as stats:
+            response = self.get_response(request)
+        return self.record(request, response, stats, start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        # The async ORM runs queries on the request's sync thread, whose
+        # connections are not the event loop thread's: hook them there.
+        stack = ExitStack()
+        stats = await sync_to_async(stack.enter_context)(capture_queries())
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.record(request, response, stats, start)
+
+    def record(self, request, response, stats, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        request.query_stats = stats
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.url_name if match else None
+        budget = get_query_budget(view_name, request.method)
+        duplicates = stats.duplicates(getattr(settings, 'QUERY_DUPLICATE_THRESHOLD', 3))
+        over_budget = budget is not None and stats.count > budget
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.duration_ms, 2),
+            'total_ms': round(total_ms, 2),
+            'budget': budget,
+            'duplicates': duplicates,
+        }
+        level = logging.WARNING if over_budget or duplicates else logging.DEBUG
+        logger.log(
+            level,
+            '%(method)s %(path)s view=%(view)s queries=%(queries)s db_ms=%(db_ms)s budget=%(budget)s',
+            record,
+            extra={'query_stats': record},
+        )
+
+        if getattr(settings, 'SERVER_TIMING_HEADER', False):
+            response['Server-Timing'] = (
+                f'db;dur={stats.duration_ms:.2f};desc="{stats.count} queries", '
+                f'app;dur={total_ms:.2f}'
+            )
+        return response
+
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting that a response stayed within its query budget."""
+
+    def assertWithinQueryBudget(self, response, budget=None):
+        # Test client responses carry wsgi_request, AsyncClient ones asgi_request
+        request = getattr(response, 'wsgi_request', None) or response.asgi_request
+        stats = getattr(request, 'query_stats', None)
+        if stats is None:
+            self.fail('QueryInstrumentationMiddleware is not installed')
+        view_name = request.resolver_match.url_name
+        if budget is None:
+            budget = get_query_budget(view_name, request.method)
+        if budget is None:
+            self.fail(f'No query budget configured for {view_name!r}')
+        if stats.count > budget:
+            lines = [f'{n}x {shape}' for shape, n in stats.duplicates().items()]
+            self.fail(
+                f'{view_name} ran {stats.count} queries, budget is {budget}.\n'
+                + '\n'.join(lines or [sql for sql, _ in stats.queries])
+            )
+
+
+class QueryPlanMixin:
+    """TestCase mixin asserting that recorded queries are served by indexes."""
+
+    def assertUsesIndexes(self, stats, allow_full_scan=()):
+        """
+        Fail if any statement in ``stats`` (from capture_queries) scans a
+        whole table or sorts without an index. Statements that read one of
+        the ``allow_full_scan`` tables in full may also sort.
+        """
+        if connections['default'].vendor != 'sqlite':
+            self.skipTest('Query plans are only checked on SQLite')
+        problems = []
+        for (sql, _), params in zip(stats.queries, stats.params):
+            steps = unindexed_steps(sql, params)
+            if any(table in allow_full_scan for table, _ in steps):
+                steps = [(table, detail) for table, detail in steps if table is not None]
+            problems += [
+                f'{detail}\n    {sql}' for table, detail in steps if table not in allow_full_scan
+            ]
+        if problems:
+            self.fail('Queries without a usable index:\n' + '\n'.join(problems))
@@ -0,0 +1,71 @@
+"""
+Management command to compare the JSON API with the HTML views.
+Usage: python manage.py bench_api [--requests 200]
+
+Requests go through the full middleware stack with Django's test client,
+as a throwaway user created inside a transaction that is rolled back at
+the end. Run `python manage.py seed` (or import a catalog) first.
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from encyclopedia import services
+from encyclopedia.models import Dinosaur
+
+PAIRS = [
+    ('gallery', 'gallery', 'api_dinosaurs'),
+    ('library / periods', 'library', 'api_periods'),
+    ('profile / scores', 'profile', 'api_scores'),
+    ('home / progress', 'home', 'api_progress'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JSON API throughput (200 and 304) against the HTML views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        dinosaurs = list(Dinosaur.objects.all()[:5])
+        if not dinosaurs:
+            raise CommandError('The catalog is empty; run seed first.')
+
+        with transaction.atomic():
+            user = User.objects.create_user(username='__bench_api__')
+            for dinosaur in dinosaurs:
+                services.collect_dinosaur(user, dinosaur)
+            services.save_game_score(user, 'puzzleaurus', 100)
+
+            client = Client()
+            client.force_login(user)
+            n = options['requests']
+            self.stdout.write(f'{n} requests each, requests/second')
+            self.stdout.write(
+                f'  {"endpoint":<20}{"html":>10}{"json":>10}{"json 304":>10}{"bytes html/json":>18}'
+            )
+            for label, html_name, api_name in PAIRS:
+                html_url, api_url = reverse(html_name), reverse(api_name)
+                html_rps, html_bytes = self._run(client, html_url, n)
+                json_rps, json_bytes = self._run(client, api_url, n)
+                etag = client.get(api_url)['ETag']
+                cached_rps, _ = self._run(client, api_url, n, HTTP_IF_NONE_MATCH=etag)
+                self.stdout.write(
+                    f'  {label:<20}{html_rps:>10.0f}{json_rps:>10.0f}{cached_rps:>10.0f}'
+                    f'  {html_bytes:>8,}/{json_bytes:<7,}'
+                )
+            transaction.set_rollback(True)
+
+    def _run(self, client, url, n, **headers):
+        size = 0
+        start = time.perf_counter()
+        for _ in range(n):
+            response = client.get(url, **headers)
+            if response.status_code not in (200, 304):
+                raise CommandError(f'{url} returned {response.status_code}')
+            size = len(response.content)
+        return n / (time.perf_counter() - start), size
@@ -0,0 +1,69 @@
+"""
+Management command to measure login latency.
+Usage: python manage.py bench_logins [--requests 200]
+
+Each request comes from a new visitor (a fresh test client from its own
+address, so no session cookie and no throttling) and goes through the full middleware stack: the guest
+login view and, for comparison, a password login. Users and sessions are
+created inside a transaction that is rolled back at the end, with a
+private in-memory cache, so the database and the real cache are left
+untouched. The session engine is whatever settings.SESSION_ENGINE is.
+"""
+import ipaddress
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from encyclopedia.instrumentation import capture_queries
+
+USERNAME = '__bench_logins__'
+PASSWORD = 'bench-logins-password'
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-logins',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure guest and password login latency for new visitors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        self.stdout.write(f'{n} logins each, session engine {settings.SESSION_ENGINE}')
+        self.stdout.write(f'  {"login":<12}{"p50 ms":>10}{"p95 ms":>10}{"queries":>10}')
+        with override_settings(CACHES=BENCH_CACHES), transaction.atomic():
+            User.objects.create_user(username=USERNAME, password=PASSWORD)
+            self.report('guest', self._run(n, lambda client: client.post(reverse('guest_login'))))
+            self.report('password', self._run(n, lambda client: client.post(
+                reverse('login'), {'username': USERNAME, 'password': PASSWORD}
+            )))
+            transaction.set_rollback(True)
+
+    def _run(self, n, login):
+        timings, queries = [], 0
+        for i in range(n):
+            client = Client(REMOTE_ADDR=str(ipaddress.ip_address('10.0.0.1') + i))
+            with capture_queries() as stats:
+                start = time.perf_counter()
+                response = login(client)
+                timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 302, response.status_code
+            queries = max(queries, stats.count)
+        return timings, queries
+
+    def report(self, label, results):
+        timings, queries = results
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        self.stdout.write(
+            f'  {label:<12}{statistics.median(timings):>10.2f}{p95:>10.2f}{queries:>10}'
+        )
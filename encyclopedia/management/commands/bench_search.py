@@ -0,0 +1,96 @@
+"""
+Management command to benchmark full-text search against icontains.
+Usage: python manage.py bench_search [--rows 10000 100000] [--repeat 20]
+
+Synthetic dinosaurs are inserted inside a transaction that is rolled back
+at the end, so the database is left untouched.
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from encyclopedia.models import Dinosaur, Period
+from encyclopedia import search
+
+SYLLABLES = ['tyr', 'anno', 'sau', 'rus', 'tri', 'cera', 'tops', 'ptero', 'dactyl',
+             'stego', 'bra', 'chio', 'velo', 'ci', 'rap', 'tor', 'ank', 'ylo', 'spino']
+WORDS = ['armored', 'feathered', 'swift', 'giant', 'crest', 'horn', 'plates', 'tail',
+         'claw', 'herd', 'swamp', 'forest', 'coast', 'desert', 'fossil', 'skull']
+QUERIES = ['tyr', 'sauru', 'crest', 'horned claw', 'fossil skull', 'zzz']
+
+
+def _name(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+class Command(BaseCommand):
+    help = 'Compare search latency of the full-text index and icontains lookups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('No full-text index on this database; run migrate first.')
+
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            period, _ = Period.objects.get_or_create(
+                name='cretaceous', defaults={'start_mya': 145, 'end_mya': 66}
+            )
+            inserted = 0
+            for target in sorted(options['rows']):
+                batch = [
+                    Dinosaur(
+                        name=_name(rng),
+                        scientific_name=f'{_name(rng)} {_name(rng).lower()}',
+                        period=period,
+                        diet=rng.choice(['herbivore', 'carnivore', 'omnivore']),
+                        length_meters=1,
+                        weight_kg=1,
+                        description=_text(rng, 30),
+                        fun_fact=_text(rng, 12),
+                    )
+                    for _ in range(target - inserted)
+                ]
+                Dinosaur.objects.bulk_create(batch, batch_size=2000)
+                inserted = target
+                self._report(target, options['repeat'])
+            transaction.set_rollback(True)
+
+    def _time(self, run, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+
+    def _report(self, rows, repeat):
+        self.stdout.write(f'\n{rows:,} rows (median of {repeat}, ms)')
+        self.stdout.write(
+            f'  {"query":<14}{"matches":>9}'
+            f'{"page icontains":>16}{"page fts":>10}{"count icontains":>17}{"count fts":>11}'
+        )
+        for query in QUERIES:
+            slow = Dinosaur.objects.filter(search.icontains_filter(query))
+            fast = Dinosaur.objects.filter(search.search_filter(query))
+            timings = [
+                self._time(lambda qs=qs: list(qs.values_list('id', flat=True)[:50]), repeat)
+                for qs in (slow, fast)
+            ] + [
+                self._time(qs.count, repeat)
+                for qs in (slow, fast)
+            ]
+            self.stdout.write(
+                f'  {query:<14}{fast.count():>9,}'
+                f'{timings[0]:>16.2f}{timings[1]:>10.2f}{timings[2]:>17.2f}{timings[3]:>11.2f}'
+            )
@@ -0,0 +1,128 @@
+"""
+Management command to benchmark the service layer at growing data sizes.
+Usage: python manage.py bench_services [--rows 1000 10000 100000]
+       [--output results.json] [--baseline baseline.json] [--threshold 0.25]
+
+For each size the catalog is grown to that many dinosaurs with
+generate_data (one generated user per 100 dinosaurs, with albums and game
+scores), then every benchmark in encyclopedia/benchmarks.py runs as the
+user with the largest album. Everything is inserted inside a transaction
+that is rolled back at the end, and a private in-memory cache is used, so
+the database and the real cache are left untouched.
+
+Results (median ms, queries and peak allocations, cold and warm cache)
+are printed and, with --output, stored as JSON. With --baseline the
+command fails when a benchmark got slower or allocates more than the
+threshold allows, or issues more queries. Record a baseline with
+    python manage.py bench_services --output baseline.json
+"""
+import json
+import platform
+from io import StringIO
+
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+from encyclopedia import benchmarks
+from encyclopedia.models import Dinosaur, Period
+
+USERNAME_PREFIX = '__bench_services__'
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-services',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark service functions (time, queries, allocations) and compare to a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+        parser.add_argument('--only', nargs='+', choices=sorted(benchmarks.BENCHMARKS),
+                            help='Run only these benchmarks')
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Compare against the results in this JSON file')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed relative growth of time and allocations (0.25 = 25%%)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not Period.objects.exists():
+            raise CommandError('No periods; run seed first.')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(f'Cannot read baseline {options["baseline"]}: {error}')
+
+        results = {}
+        with override_settings(CACHES=BENCH_CACHES), transaction.atomic():
+            for size in sorted(options['rows']):
+                self.grow_to(size, options['seed'])
+                context = benchmarks.BenchmarkContext.for_busiest_user(
+                    User.objects.filter(username__startswith=USERNAME_PREFIX), options['seed']
+                )
+                results[str(size)] = benchmarks.run_benchmarks(
+                    context, options['only'], options['repeat']
+                )
+                self.report(size, results[str(size)])
+            transaction.set_rollback(True)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'meta': self.meta(options), 'results': results}, f, indent=2)
+            self.stdout.write(f'\nResults written to {options["output"]}')
+
+        if baseline is not None:
+            regressions = benchmarks.compare(results, baseline, options['threshold'])
+            for size, name, mode, metric, old, new in regressions:
+                self.stdout.write(self.style.ERROR(
+                    f'  {size} rows {name} ({mode}): {metric} {old} -> {new}'
+                ))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f'✓ No regressions against {options["baseline"]}'))
+
+    def grow_to(self, size, seed):
+        missing = size - Dinosaur.objects.count()
+        if missing <= 0:
+            return
+        call_command(
+            'generate_data',
+            dinosaurs=missing,
+            users=max(1, missing // 100),
+            username_prefix=USERNAME_PREFIX,
+            seed=seed + size,
+            stdout=StringIO(),
+        )
+
+    def report(self, size, results):
+        self.stdout.write(f'\n{size:,} dinosaurs (median of repeats; cold / warm cache)')
+        self.stdout.write(f'  {"benchmark":<20}{"ms":>17}{"queries":>11}{"alloc KiB":>19}')
+        for name, modes in results.items():
+            cold, warm = modes['cold'], modes['warm']
+            self.stdout.write(
+                f'  {name:<20}'
+                f'{cold["ms"]:>8.2f} /{warm["ms"]:>7.2f}'
+                f'{cold["queries"]:>6} /{warm["queries"]:>3}'
+                f'{cold["alloc_kib"]:>10.1f} /{warm["alloc_kib"]:>7.1f}'
+            )
+
+    def meta(self, options):
+        return {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+        }
@@ -0,0 +1,132 @@
+"""
+Management command to load-test concurrent writes through the full stack.
+Usage: python manage.py bench_writes [--threads 8] [--seconds 10]
+
+Each thread logs in its own throwaway user and, until the time is up,
+alternates saving a game score and collecting a dinosaur with Django's
+test client, so every write also pays for connection setup (or reuse,
+with CONN_MAX_AGE) and the session/auth queries of a real request.
+The users and everything they wrote are deleted at the end.
+
+Compare database modes by running it once per configuration, e.g.
+    SQLITE_TUNED=False python manage.py bench_writes
+    python manage.py bench_writes
+
+With --scores-only every write is a score save, to compare synchronous
+saves with write-behind ingestion (SCORE_WRITE_BEHIND=True). Buffered
+scores are then drained before the totals are computed, so the reported
+throughput covers applying them too.
+"""
+import random
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.urls import reverse
+from encyclopedia import ingestion
+from encyclopedia.models import Dinosaur
+
+USERNAME_PREFIX = '__bench_writes__'
+
+
+class Command(BaseCommand):
+    help = 'Measure write throughput and lock errors under concurrent requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--scores-only', action='store_true',
+                            help='Only save game scores (no collects)')
+
+    def handle(self, *args, **options):
+        dinosaur_ids = list(Dinosaur.objects.values_list('id', flat=True)[:200])
+        if not dinosaur_ids:
+            raise CommandError('The catalog is empty; run seed first.')
+
+        self.describe_database()
+        users = [
+            User.objects.create_user(username=f'{USERNAME_PREFIX}{i}')
+            for i in range(options['threads'])
+        ]
+        results = [{'latencies': [], 'errors': 0} for _ in users]
+        deadline = time.perf_counter() + options['seconds']
+        try:
+            threads = [
+                threading.Thread(
+                    target=self.worker,
+                    args=(user, dinosaur_ids, deadline, options['seed'] + i, results[i],
+                          options['scores_only']),
+                )
+                for i, user in enumerate(users)
+            ]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            acknowledged = time.perf_counter() - start
+            if settings.SCORE_WRITE_BEHIND:
+                ingestion.flush()
+            elapsed = time.perf_counter() - start
+        finally:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        latencies = sorted(ms for result in results for ms in result['latencies'])
+        errors = sum(result['errors'] for result in results)
+        if not latencies:
+            raise CommandError(f'No write succeeded ({errors} errors)')
+        self.stdout.write(
+            f'{len(latencies)} writes in {elapsed:.1f}s from {len(users)} threads: '
+            f'{len(latencies) / elapsed:.0f} writes/s, '
+            f'p50 {statistics.median(latencies):.1f} ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms, '
+            f'{errors} lock errors'
+        )
+        if settings.SCORE_WRITE_BEHIND:
+            self.stdout.write(
+                f'Write-behind scores: acknowledged at {len(latencies) / acknowledged:.0f} writes/s, '
+                f'journal drained {elapsed - acknowledged:.1f}s after the last request'
+            )
+
+    def worker(self, user, dinosaur_ids, deadline, seed, result, scores_only):
+        rng = random.Random(seed)
+        client = Client()
+        client.force_login(user)
+        score_url = reverse('puzzleaurus')
+        try:
+            while time.perf_counter() < deadline:
+                if scores_only or rng.random() < 0.5:
+                    url, data = score_url, {'score': rng.randint(10, 500)}
+                else:
+                    url, data = reverse('dinosaur_detail', args=[rng.choice(dinosaur_ids)]), {'collect': '1'}
+                start = time.perf_counter()
+                try:
+                    response = client.post(url, data)
+                except OperationalError:
+                    result['errors'] += 1
+                    continue
+                if response.status_code != 302:
+                    raise CommandError(f'{url} returned {response.status_code}')
+                result['latencies'].append((time.perf_counter() - start) * 1000)
+        finally:
+            connection.close()
+
+    def describe_database(self):
+        db = connections['default']
+        details = [
+            db.vendor,
+            f"CONN_MAX_AGE={db.settings_dict['CONN_MAX_AGE']}",
+            f'SCORE_WRITE_BEHIND={settings.SCORE_WRITE_BEHIND}',
+        ]
+        if db.vendor == 'sqlite':
+            with db.cursor() as cursor:
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout'):
+                    cursor.execute(f'PRAGMA {pragma}')
+                    details.append(f'{pragma}={cursor.fetchone()[0]}')
+        self.stdout.write('Database: ' + ', '.join(details))
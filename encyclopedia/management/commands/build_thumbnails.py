@@ -0,0 +1,55 @@
+"""
+Management command to (re)build responsive image derivatives.
+Usage: python manage.py build_thumbnails [--force] [--workers 4]
+
+Needed once for images uploaded before derivatives existed, or after
+changing images.DERIVATIVE_SPECS. Existing derivative files with the same
+content hash are reused, so re-running is cheap; --force re-encodes and
+overwrites them, e.g. after changing images.FORMATS.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from encyclopedia import images
+from encyclopedia.models import Dinosaur, UserProfile
+
+TARGETS = [(Dinosaur, 'image'), (UserProfile, 'avatar')]
+
+
+def _build(model, pk, field_name, force):
+    try:
+        images.refresh_derivatives(model, pk, field_name, force=force)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Build WebP/AVIF thumbnails for dinosaur images and avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild up-to-date rows too, re-encoding their existing files')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        jobs = []
+        for model, field_name in TARGETS:
+            rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for pk, name, derivatives in rows.values_list('pk', field_name, f'{field_name}_derivatives'):
+                if options['force'] or (derivatives or {}).get('source') != name:
+                    jobs.append((model, pk, field_name))
+
+        self.stdout.write(f'Building derivatives for {len(jobs)} images '
+                          f'({", ".join(images.available_formats())})...')
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [pool.submit(_build, *job, options['force']) for job in jobs]
+            for (model, pk, field_name), future in zip(jobs, futures):
+                try:
+                    future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'  {model.__name__} {pk}: {exc}')
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(jobs) - failed} images processed, {failed} failed'))
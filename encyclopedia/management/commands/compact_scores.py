@@ -0,0 +1,121 @@
+"""
+Management command to roll up old game scores and prune the raw rows.
+Usage: python manage.py compact_scores [--retention-days 365] [--batch-size 5000]
+       [--rebuild] [--dry-run]
+
+Raw GameScore rows older than the retention (settings.GAME_SCORE_RETENTION_DAYS)
+are pruned in batches, each in its own short transaction. The cutoff is
+moved back to a Monday, so whole days and weeks are pruned at once, and
+the daily/weekly rollups of those windows are first recomputed from the
+raw rows, which are still complete at that point. The daily and weekly
+BestScore rows of the pruned windows are deleted with them; all-time
+bests are kept.
+
+--rebuild also recomputes the rollups of every window that still has raw
+rows, e.g. after scores were bulk inserted around services.py. Run it
+when no scores are being saved.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+from encyclopedia import services
+from encyclopedia.models import BestScore, GameScore, GameScoreRollup
+
+TRUNCATE = {'day': TruncDate, 'week': TruncWeek}
+
+
+def start_of_day(day):
+    """Aware datetime of midnight at the start of a local date."""
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+class Command(BaseCommand):
+    help = 'Recompute score rollups for old windows and prune raw scores past the retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute the rollups of every window that still has raw scores')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be pruned without changing anything')
+
+    def handle(self, *args, **options):
+        retention_days = options['retention_days']
+        if retention_days is None:
+            retention_days = settings.GAME_SCORE_RETENTION_DAYS
+        if retention_days < 1:
+            raise CommandError('--retention-days must be at least 1')
+        cutoff = services.leaderboard_window('week', timezone.now() - datetime.timedelta(days=retention_days))
+        expired = GameScore.objects.filter(completed_at__lt=start_of_day(cutoff))
+        expired_bests = BestScore.objects.exclude(scope='all').filter(period_start__lt=cutoff)
+
+        oldest = GameScore.objects.order_by('completed_at').values_list('completed_at', flat=True).first()
+        if options['dry_run']:
+            self.stdout.write(
+                f'{expired.count()} scores and {expired_bests.count()} daily/weekly bests '
+                f'before {cutoff} would be pruned'
+            )
+            return
+        if oldest is not None:
+            first_week = services.leaderboard_window('week', oldest)
+            if options['rebuild']:
+                self.rebuild(first_week)
+            elif first_week < cutoff:
+                self.rebuild(first_week, cutoff)
+
+        pruned = 0
+        while True:
+            with transaction.atomic():
+                ids = list(expired.order_by().values_list('pk', flat=True)[:options['batch_size']])
+                if not ids:
+                    break
+                GameScore.objects.filter(pk__in=ids).delete()
+            pruned += len(ids)
+        pruned_bests, _ = expired_bests.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {pruned} scores and {pruned_bests} daily/weekly bests before {cutoff} pruned'
+        ))
+
+    def rebuild(self, start, end=None):
+        """Recompute the rollups of the windows starting in [start, end)."""
+        scores = GameScore.objects.filter(completed_at__gte=start_of_day(start))
+        rollups = GameScoreRollup.objects.filter(period_start__gte=start)
+        if end is not None:
+            scores = scores.filter(completed_at__lt=start_of_day(end))
+            rollups = rollups.filter(period_start__lt=end)
+
+        created = 0
+        with transaction.atomic():
+            rollups.delete()
+            for granularity, truncate in TRUNCATE.items():
+                totals = (
+                    scores.order_by()
+                    .annotate(period_start=truncate('completed_at', output_field=models.DateField()))
+                    .values('user_id', 'game_type', 'period_start')
+                    .annotate(count=models.Count('pk'), total=models.Sum('score'), best=models.Max('score'))
+                )
+                created += len(GameScoreRollup.objects.bulk_create([
+                    GameScoreRollup(
+                        user_id=row['user_id'],
+                        game_type=row['game_type'],
+                        granularity=granularity,
+                        period_start=row['period_start'],
+                        count=row['count'],
+                        best_score=row['best'],
+                        total_score=row['total'],
+                    )
+                    for row in totals.iterator(chunk_size=5000)
+                ], batch_size=1000))
+            user_ids = set(scores.order_by().values_list('user_id', flat=True).distinct())
+
+            def bump_versions():
+                for user_id in user_ids:
+                    services.bump_user_data_version(user_id, 'scores')
+            transaction.on_commit(bump_versions)
+        period = f'{start} to {end}' if end else f'since {start}'
+        self.stdout.write(f'  {created} rollups rebuilt ({period})')
@@ -0,0 +1,39 @@
+"""
+Management command to pre-populate albums for many users at once.
+Usage: python manage.py fill_albums (--all-users | --users alice bob) [--period jurassic]
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from encyclopedia import services
+from encyclopedia.models import Dinosaur
+
+
+class Command(BaseCommand):
+    help = 'Mark dinosaurs as collected for many users with bulk statements (no tokens awarded)'
+
+    def add_arguments(self, parser):
+        users = parser.add_mutually_exclusive_group(required=True)
+        users.add_argument('--users', nargs='+', metavar='USERNAME')
+        users.add_argument('--all-users', action='store_true')
+        parser.add_argument('--period', help='Only collect dinosaurs from this period')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['users']:
+            users = users.filter(username__in=options['users'])
+            missing = set(options['users']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"Unknown user(s): {', '.join(sorted(missing))}")
+        user_ids = list(users.values_list('pk', flat=True))
+
+        dinosaur_ids = None
+        if options['period']:
+            dinosaur_ids = Dinosaur.objects.filter(
+                period__name=options['period']
+            ).values_list('pk', flat=True)
+
+        collected = services.fill_albums(user_ids, dinosaur_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {collected} album items collected for {len(user_ids)} users'
+        ))
@@ -0,0 +1,27 @@
+"""
+Management command to apply game scores buffered in the score journal.
+Usage: python manage.py flush_scores [--batch-size 500]
+
+Replays whatever a stopped or crashed server left in the journal
+(settings.SCORE_JOURNAL_PATH); entries already applied are skipped.
+Entries the database rejects are kept in the journal's quarantine table.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from encyclopedia import ingestion
+
+
+class Command(BaseCommand):
+    help = 'Apply game scores waiting in the write-behind journal'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        applied = ingestion.flush(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {applied} buffered scores applied'))
+        quarantined = ingestion.quarantined_count()
+        if quarantined:
+            self.stdout.write(self.style.WARNING(
+                f'{quarantined} scores could not be applied (quarantine table of {settings.SCORE_JOURNAL_PATH})'
+            ))
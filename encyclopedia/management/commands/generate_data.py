@@ -0,0 +1,227 @@
+"""
+Management command to fill the database with realistic synthetic data.
+Usage: python manage.py generate_data [--dinosaurs 10000] [--users 1000]
+       [--items-per-user 40] [--scores-per-user 15] [--seed 42]
+
+Everything is written with bulk INSERTs in batches:
+
+- dinosaurs spread over the periods by their length in time, mostly
+  herbivores, with log-normal body lengths and weights that scale with
+  length cubed;
+- users ``<prefix>00001``... sharing one password (default ``loadtest``),
+  each with a profile, a token ledger entry and an album read model;
+- album items: collection sizes are log-normal (most users collected a
+  few dinosaurs, a few collected hundreds) and popular dinosaurs are
+  collected far more often than obscure ones;
+- game scores: active collectors also play more, scores are normally
+  distributed per game, spread over the last 90 days.
+
+Leaderboards and score rollups are rebuilt at the end. Periods must exist: run seed first.
+Generated users can be removed with --delete.
+"""
+import math
+import random
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from encyclopedia import catalog, services
+from encyclopedia.models import (
+    AlbumItem, Dinosaur, GameScore, Period, TokenTransaction, UserProfile
+)
+
+SYLLABLES = ['tyr', 'anno', 'sau', 'rus', 'tri', 'cera', 'tops', 'ptero', 'dactyl', 'stego',
+             'bra', 'chio', 'velo', 'ci', 'rap', 'tor', 'ank', 'ylo', 'spino', 'allo', 'iguan',
+             'odon', 'dipl', 'odo', 'cus', 'para', 'saur', 'olo', 'phus', 'maia', 'gallim', 'imus']
+EPITHETS = ['rex', 'horridus', 'armatus', 'longiceps', 'magnus', 'gracilis', 'robustus',
+            'altus', 'fragilis', 'giganteus', 'stenops', 'ungulatus', 'parvus', 'carolinensis']
+WORDS = ['armored', 'feathered', 'swift', 'giant', 'crest', 'horn', 'plates', 'tail', 'claw',
+         'herd', 'swamp', 'forest', 'coast', 'desert', 'fossil', 'skull', 'teeth', 'nest',
+         'eggs', 'river', 'predator', 'grazer', 'beak', 'spikes', 'frill', 'long', 'neck']
+# Share of species per diet
+DIET_WEIGHTS = {'herbivore': 0.65, 'carnivore': 0.30, 'omnivore': 0.05}
+GAME_SCORES = {'puzzleaurus': (250, 90), 'memodyn': (180, 60)}  # (mean, stdev)
+DEFAULT_PASSWORD = 'loadtest'
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic dinosaurs, users, album items and game scores in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dinosaurs', type=int, default=10_000)
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--items-per-user', type=int, default=40,
+                            help='Median album size (log-normal)')
+        parser.add_argument('--scores-per-user', type=int, default=15,
+                            help='Mean number of game scores per user')
+        parser.add_argument('--username-prefix', default='loadtest_')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--delete', action='store_true',
+                            help='Delete previously generated users and their data, then exit')
+
+    def handle(self, *args, **options):
+        prefix = options['username_prefix']
+        if options['delete']:
+            deleted, _ = User.objects.filter(username__startswith=prefix).delete()
+            self.stdout.write(self.style.SUCCESS(f'✓ {deleted:,} rows deleted'))
+            return
+
+        periods = list(Period.objects.all())
+        if not periods:
+            raise CommandError('No periods; run seed first.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        with transaction.atomic():
+            self.generate_dinosaurs(periods, options['dinosaurs'])
+        catalog.bump_catalog_version()  # bulk_create() skips the signals
+        dinosaur_ids = list(Dinosaur.objects.order_by('id').values_list('id', flat=True))
+        if not dinosaur_ids:
+            raise CommandError('The catalog is empty; generate some dinosaurs first.')
+
+        with transaction.atomic():
+            user_ids = self.generate_users(prefix, options['users'], options['password'])
+        with transaction.atomic():
+            self.generate_album_items(user_ids, dinosaur_ids, options['items_per_user'])
+        with transaction.atomic():
+            self.generate_scores(user_ids, options['scores_per_user'])
+        call_command('rebuild_leaderboards', stdout=self.stdout)
+        call_command('compact_scores', rebuild=True, stdout=self.stdout)
+
+    def generate_dinosaurs(self, periods, count):
+        rng = self.rng
+        taken = set(Dinosaur.objects.values_list('name', flat=True))
+        spans = [period.start_mya - period.end_mya for period in periods]
+        diets, diet_weights = list(DIET_WEIGHTS), list(DIET_WEIGHTS.values())
+
+        def rows():
+            for _ in range(count):
+                name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+                if name in taken:
+                    name = f'{name} {rng.choice(EPITHETS)}'
+                suffix = 2
+                while name in taken:
+                    name, suffix = f'{name.rsplit(" #", 1)[0]} #{suffix}', suffix + 1
+                taken.add(name)
+                period = rng.choices(periods, weights=spans)[0]
+                length = min(max(rng.lognormvariate(math.log(6), 0.7), 0.3), 40)
+                weight = min(max(12 * length ** 3 * rng.lognormvariate(0, 0.4), 0.5), 90_000)
+                words = rng.randint(25, 70)
+                yield Dinosaur(
+                    name=name,
+                    scientific_name=f'{name.split()[0]} {rng.choice(EPITHETS)}',
+                    period=period,
+                    diet=rng.choices(diets, weights=diet_weights)[0],
+                    length_meters=round(length, 2),
+                    weight_kg=round(weight, 2),
+                    description=' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.',
+                    fun_fact=' '.join(rng.choice(WORDS) for _ in range(12)).capitalize() + '.',
+                    # Discoveries accelerate towards the present
+                    discovered_year=int(rng.triangular(1820, 2024, 2024)),
+                )
+
+        created = 0
+        for batch in _batches(rows(), self.batch_size):
+            Dinosaur.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(f'  {created:,} dinosaurs')
+
+    def generate_users(self, prefix, count, password):
+        start = User.objects.filter(username__startswith=prefix).count() + 1
+        hashed = make_password(password)  # Hashed once: one password for all
+        users = (
+            User(username=f'{prefix}{n:05d}', password=hashed, date_joined=self.now)
+            for n in range(start, start + count)
+        )
+        for batch in _batches(users, self.batch_size):
+            User.objects.bulk_create(batch)
+
+        user_ids = list(
+            User.objects.filter(username__startswith=prefix, profile__isnull=True)
+            .order_by('id').values_list('id', flat=True)
+        )
+        tokens = {user_id: int(self.rng.expovariate(1 / 150)) for user_id in user_ids}
+        for batch in _batches(user_ids, self.batch_size):
+            UserProfile.objects.bulk_create(
+                [UserProfile(user_id=user_id, tokens=tokens[user_id]) for user_id in batch]
+            )
+            TokenTransaction.objects.bulk_create([
+                TokenTransaction(
+                    user_id=user_id, amount=tokens[user_id], balance_after=tokens[user_id],
+                    reason='adjustment',
+                )
+                for user_id in batch
+            ])
+        self.stdout.write(f'  {len(user_ids):,} users (password {password!r})')
+        return user_ids
+
+    def generate_album_items(self, user_ids, dinosaur_ids, median_items):
+        rng = self.rng
+        total = len(dinosaur_ids)
+        self.album_sizes = {}
+
+        def rows():
+            for user_id in user_ids:
+                size = min(total, int(rng.lognormvariate(math.log(max(median_items, 1)), 1.0)))
+                picked = set()
+                while len(picked) < size:
+                    # Skewed towards low indexes: a few dinosaurs are very popular
+                    picked.add(dinosaur_ids[int(total * rng.random() ** 3)])
+                self.album_sizes[user_id] = size
+                for dinosaur_id in picked:
+                    yield AlbumItem(
+                        user_id=user_id,
+                        dinosaur_id=dinosaur_id,
+                        is_collected=True,
+                        collected_at=self.now - timedelta(seconds=rng.randint(0, 180 * 86400)),
+                    )
+
+        created = 0
+        for batch in _batches(rows(), self.batch_size):
+            AlbumItem.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+
+        for batch in _batches(user_ids, self.batch_size):
+            UserProfile.objects.filter(user_id__in=batch).update(
+                collected_count=services.collected_count_expression()
+            )
+        services.refresh_albums(user_ids)
+        self.stdout.write(f'  {created:,} album items')
+
+    def generate_scores(self, user_ids, mean_scores):
+        rng = self.rng
+        mean_album = sum(self.album_sizes.values()) / len(self.album_sizes) if self.album_sizes else 1
+
+        def rows():
+            for user_id in user_ids:
+                # Users who collect a lot also play a lot
+                activity = self.album_sizes.get(user_id, 0) / mean_album if mean_album else 1
+                for _ in range(int(rng.expovariate(1 / max(mean_scores * activity, 0.1)))):
+                    game_type = rng.choice(list(GAME_SCORES))
+                    mean, stdev = GAME_SCORES[game_type]
+                    yield GameScore(
+                        user_id=user_id,
+                        game_type=game_type,
+                        score=max(0, int(rng.gauss(mean, stdev))),
+                        completed_at=self.now - timedelta(seconds=rng.randint(0, 90 * 86400)),
+                    )
+
+        created = 0
+        for batch in _batches(rows(), self.batch_size):
+            GameScore.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(f'  {created:,} game scores')
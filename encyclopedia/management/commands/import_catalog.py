@@ -0,0 +1,50 @@
+"""
+Management command to bulk import a dinosaur catalog.
+Usage: python manage.py import_catalog catalog.jsonl [--batch-size 2000]
+
+Accepts JSONL (one object per line) or CSV with a header row. Columns:
+name, scientific_name, period, diet, length_meters, weight_kg,
+description, fun_fact, discovered_year. Rows are upserted by name, so
+re-running an import is safe.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from encyclopedia.importer import import_dinosaurs, read_catalog
+
+
+class Command(BaseCommand):
+    help = 'Stream a JSONL/CSV dinosaur catalog into the database with batched upserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to a .jsonl or .csv catalog file')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=50,
+            help='Print progress every N batches (0 to disable)',
+        )
+
+    def handle(self, *args, **options):
+        every = options['progress_every']
+
+        def progress(stats):
+            if every and stats.batches % every == 0:
+                self.stdout.write(
+                    f'  {stats.rows:,} rows ({stats.rows_per_second:,.0f} rows/sec)'
+                )
+
+        try:
+            stats = import_dinosaurs(
+                read_catalog(options['path']),
+                batch_size=options['batch_size'],
+                on_batch=progress,
+            )
+        except FileNotFoundError:
+            raise CommandError(f'No such file: {options["path"]}')
+
+        for error in stats.errors:
+            self.stdout.write(self.style.WARNING(f'  {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {stats.upserted:,} dinosaurs upserted, {stats.skipped:,} rows skipped, '
+            f'{stats.rows:,} rows in {stats.elapsed:.1f}s ({stats.rows_per_second:,.0f} rows/sec)'
+        ))
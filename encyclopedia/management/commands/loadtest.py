@@ -0,0 +1,211 @@
+"""
+Management command to load-test a running server over HTTP.
+Usage: python manage.py loadtest [--url http://127.0.0.1:8000] [--users 10]
+       [--seconds 30] [--flows browse collect play read]
+
+Start the server first (``python manage.py runserver --noreload``, or
+gunicorn) against a database filled by ``generate_data``. Every virtual
+user is a thread with its own cookie jar that logs in as one of the
+generated users and then, until the time is up, picks a flow at random:
+
+- browse: GET the gallery, sometimes filtered by period or paged;
+- collect: GET a dinosaur's detail page, then POST collect;
+- play: GET the Puzzleaurus page, then POST a score;
+- read: GET one of the read-only pages (home, map, library, profile or a
+  dinosaur's detail page).
+
+--flows limits the mix, e.g. ``--flows read`` to compare the same pages
+served over WSGI and ASGI:
+
+    gunicorn dino_encyclopedia.wsgi --threads 8
+    uvicorn dino_encyclopedia.asgi:application --port 8001
+    python manage.py loadtest --flows read
+    python manage.py loadtest --flows read --url http://127.0.0.1:8001
+
+Only the standard library is used, so nothing leaves the machine. At the
+end it prints requests, errors, requests/s and p50/p95/p99 latency per
+endpoint.
+"""
+import random
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from encyclopedia.models import Dinosaur, Period
+
+from .generate_data import DEFAULT_PASSWORD
+
+# Relative weight of each flow
+FLOWS = {'browse': 5, 'collect': 3, 'play': 2, 'read': 5}
+DEFAULT_FLOWS = ['browse', 'collect', 'play']
+READ_PAGES = ['home', 'map', 'library', 'profile']
+_NEXT_PAGE_RE = re.compile(r'href="(\?[^"]*after=[^"]+)"')
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    """Report redirects as responses so their latency is timed on its own."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class VirtualUser:
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), _NoRedirect)
+        self.samples = []  # (endpoint, milliseconds, ok)
+
+    def request(self, endpoint, path, data=None, expect=(200,)):
+        headers = {}
+        if data is not None:
+            data = urlencode(data).encode()
+            csrf = next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+            headers = {'X-CSRFToken': csrf, 'Referer': self.base_url + path}
+        request = Request(self.base_url + path, data=data, headers=headers)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                status, body = response.status, response.read()
+        except HTTPError as error:
+            status, body = error.code, error.read()
+        except (URLError, TimeoutError, ConnectionError):
+            status, body = None, b''
+        self.samples.append((endpoint, (time.perf_counter() - start) * 1000, status in expect))
+        return body.decode(errors='replace')
+
+    def login(self, username, password):
+        self.request('GET /login/', reverse('login'))
+        self.request(
+            'POST /login/', reverse('login'),
+            {'username': username, 'password': password}, expect=(302,),
+        )
+        if not any(cookie.name == 'sessionid' for cookie in self.cookies):
+            raise CommandError(f'Could not log in as {username}; run generate_data first.')
+
+
+class Command(BaseCommand):
+    help = 'Run a login/gallery/collect/score/read-page load test against a running server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+        parser.add_argument('--seconds', type=float, default=30)
+        parser.add_argument('--username-prefix', default='loadtest_')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--flows', nargs='+', choices=sorted(FLOWS), default=DEFAULT_FLOWS,
+                            help='Flows to pick from (weighted as in FLOWS)')
+
+    def handle(self, *args, **options):
+        usernames = list(
+            User.objects.filter(username__startswith=options['username_prefix'])
+            .order_by('id').values_list('username', flat=True)[:options['users']]
+        )
+        if len(usernames) < options['users']:
+            raise CommandError(
+                f'Only {len(usernames)} generated users; run generate_data --users {options["users"]}.'
+            )
+        self.dinosaur_ids = list(Dinosaur.objects.values_list('id', flat=True)[:5000])
+        self.periods = list(Period.objects.values_list('name', flat=True))
+        if not self.dinosaur_ids:
+            raise CommandError('The catalog is empty; run generate_data first.')
+
+        clients = [VirtualUser(options['url'], options['timeout']) for _ in usernames]
+        deadline = time.perf_counter() + options['seconds']
+        threads = [
+            threading.Thread(
+                target=self.run_user,
+                args=(
+                    client, username, options['password'], deadline, options['seed'] + i,
+                    options['flows'],
+                ),
+            )
+            for i, (client, username) in enumerate(zip(clients, usernames))
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        self.report([sample for client in clients for sample in client.samples], elapsed)
+
+    def run_user(self, client, username, password, deadline, seed, flows):
+        rng = random.Random(seed)
+        try:
+            client.login(username, password)
+        except CommandError as error:
+            self.stderr.write(str(error))
+            return
+        weights = [FLOWS[flow] for flow in flows]
+        while time.perf_counter() < deadline:
+            getattr(self, f'flow_{rng.choices(flows, weights=weights)[0]}')(client, rng)
+
+    def flow_browse(self, client, rng):
+        path = reverse('gallery')
+        if rng.random() < 0.3:
+            path += '?' + urlencode({'period': rng.choice(self.periods)})
+        html = client.request('GET /gallery/', path)
+        if rng.random() < 0.3 and (match := _NEXT_PAGE_RE.search(html)):
+            client.request('GET /gallery/?after=', reverse('gallery') + match[1].replace('&amp;', '&'))
+
+    def flow_collect(self, client, rng):
+        path = reverse('dinosaur_detail', args=[rng.choice(self.dinosaur_ids)])
+        client.request('GET /gallery/<id>/', path)
+        client.request('POST /gallery/<id>/', path, {'collect': '1'}, expect=(302,))
+
+    def flow_play(self, client, rng):
+        path = reverse('puzzleaurus')
+        client.request('GET /puzzleaurus/', path)
+        client.request('POST /puzzleaurus/', path, {'score': rng.randint(10, 500)}, expect=(302,))
+
+    def flow_read(self, client, rng):
+        if rng.random() < 0.2:
+            path = reverse('dinosaur_detail', args=[rng.choice(self.dinosaur_ids)])
+            client.request('GET /gallery/<id>/', path)
+        else:
+            path = reverse(rng.choice(READ_PAGES))
+            client.request(f'GET {path}', path)
+
+    def report(self, samples, elapsed):
+        by_endpoint = defaultdict(list)
+        errors = defaultdict(int)
+        for endpoint, ms, ok in samples:
+            by_endpoint[endpoint].append(ms)
+            errors[endpoint] += not ok
+        if not samples:
+            raise CommandError('No request was made')
+
+        rows = [('endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms')]
+        for endpoint, latencies in sorted(by_endpoint.items(), key=lambda item: item[0].split()[::-1]):
+            if len(latencies) > 1:
+                cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+                p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+            else:
+                p50 = p95 = p99 = latencies[0]
+            rows.append((
+                endpoint, len(latencies), errors[endpoint], f'{len(latencies) / elapsed:.1f}',
+                f'{p50:.1f}', f'{p95:.1f}', f'{p99:.1f}',
+            ))
+        rows.append((
+            'total', len(samples), sum(errors.values()), f'{len(samples) / elapsed:.1f}', '', '', '',
+        ))
+        widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+        for row in rows:
+            self.stdout.write('  '.join(
+                str(cell).ljust(width) if i == 0 else str(cell).rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            ))
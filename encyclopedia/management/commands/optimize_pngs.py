@@ -0,0 +1,99 @@
+"""
+Management command to losslessly recompress PNG artwork.
+Usage: python manage.py optimize_pngs [PATH ...] [--dry-run] [--workers 4]
+
+Each PNG is re-encoded with maximum zlib compression and Pillow's
+optimizer. RGBA images whose alpha channel is fully opaque are stored as
+RGB. A file is only replaced when the new encoding is smaller and decodes
+to exactly the same pixels (and, for palette images, the same palette).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+DEFAULT_PATHS = ['public/assets/img/books', 'public/assets/img/puzzles']
+
+# Ancillary data that must survive recompression
+KEEP_INFO = ['transparency', 'icc_profile', 'dpi', 'gamma']
+
+
+def _pixels(image):
+    return image.mode, image.size, image.getpalette(), image.tobytes()
+
+
+def recompress(path, dry_run=False):
+    """
+    Recompress one PNG in place.
+
+    Returns:
+        Tuple (path, original size, new size); sizes are equal when the
+        file was left alone
+    """
+    original = Path(path).read_bytes()
+    with Image.open(BytesIO(original)) as image:
+        if getattr(image, 'is_animated', False):
+            return path, len(original), len(original)
+        image.load()
+        options = {key: image.info[key] for key in KEEP_INFO if key in image.info}
+        if image.mode == 'RGBA' and image.getchannel('A').getextrema() == (255, 255):
+            # A constant, fully opaque alpha channel carries no information
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, format='PNG', optimize=True, **options)
+        candidate = buffer.getvalue()
+        if len(candidate) >= len(original):
+            return path, len(original), len(original)
+        with Image.open(BytesIO(candidate)) as check:
+            check.load()
+            if _pixels(check) != _pixels(image):
+                return path, len(original), len(original)
+
+    if not dry_run:
+        temporary = f'{path}.tmp'
+        Path(temporary).write_bytes(candidate)
+        os.replace(temporary, path)
+    return path, len(original), len(candidate)
+
+
+class Command(BaseCommand):
+    help = 'Losslessly recompress PNG files and report the bytes saved'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help=f'Files or directories (default: {", ".join(DEFAULT_PATHS)})')
+        parser.add_argument('--dry-run', action='store_true', help='Report savings without writing files')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        files = []
+        for raw in options['paths'] or DEFAULT_PATHS:
+            path = Path(raw) if Path(raw).is_absolute() else Path(settings.BASE_DIR) / raw
+            if path.is_dir():
+                files.extend(sorted(path.rglob('*.png')))
+            elif path.is_file():
+                files.append(path)
+            else:
+                raise CommandError(f'No such file or directory: {path}')
+
+        before = after = changed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            jobs = [pool.submit(recompress, str(path), options['dry_run']) for path in files]
+            for job in jobs:
+                path, old_size, new_size = job.result()
+                before += old_size
+                after += new_size
+                if new_size < old_size:
+                    changed += 1
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'  {path}: {old_size:,} -> {new_size:,} bytes')
+
+        saved = before - after
+        verb = 'would save' if options['dry_run'] else 'saved'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {changed} of {len(files)} PNGs recompressed, {verb} {saved:,} bytes '
+            f'({saved / before:.1%} of {before:,})' if before else '✓ No PNG files found'
+        ))
@@ -0,0 +1,50 @@
+"""
+Management command to delete expired guest accounts.
+Usage: python manage.py reap_guests [--batch-size 500] [--dry-run]
+
+Every guest login creates an account of its own (services.create_guest_user),
+which expires with its session settings.GUEST_ACCOUNT_TTL_HOURS later.
+Expired accounts are deleted in batches, each in its own short transaction,
+together with everything they own (profile, album, scores, tokens); the
+album signals skip items deleted along with their user, so a batch costs
+the same queries whatever the size of the albums. Expired
+sessions are then cleared, as clearsessions does, unless the session engine
+keeps no server-side state. Run it from cron, e.g. hourly.
+"""
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from encyclopedia import services
+
+
+class Command(BaseCommand):
+    help = 'Delete guest accounts past their expiry, and expired sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report how many guests would be deleted without deleting them')
+
+    def handle(self, *args, **options):
+        expired = services.get_expired_guests()
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} expired guest accounts would be deleted')
+            return
+
+        reaped = 0
+        while True:
+            with transaction.atomic():
+                ids = list(expired.order_by().values_list('pk', flat=True)[:options['batch_size']])
+                if not ids:
+                    break
+                User.objects.filter(pk__in=ids).delete()
+            reaped += len(ids)
+
+        try:
+            import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+        except NotImplementedError:
+            pass  # signed_cookies: sessions expire on the client
+        self.stdout.write(self.style.SUCCESS(f'✓ {reaped} expired guest accounts deleted'))
@@ -0,0 +1,54 @@
+"""
+Management command to rebuild the materialized leaderboards from game scores.
+Usage: python manage.py rebuild_leaderboards
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from encyclopedia.models import BestScore, GameScore
+from encyclopedia import services
+
+
+class Command(BaseCommand):
+    help = 'Recompute BestScore rows (all-time, weekly, daily) from GameScore'
+
+    def handle(self, *args, **options):
+        # Read and replace in one transaction, so a score saved between the
+        # read and the delete cannot be left out of the rebuilt rows
+        with transaction.atomic():
+            # All-time bests older than every raw score come from rows pruned
+            # by compact_scores and cannot be recomputed; keep them as they
+            # are. Daily and weekly bests are rebuilt for every window that
+            # still has raw scores; compact_scores deletes those of the
+            # windows it prunes.
+            oldest = GameScore.objects.order_by('completed_at').values_list('completed_at', flat=True).first()
+            kept = BestScore.objects.filter(scope='all')
+            if oldest is not None:
+                kept = kept.filter(achieved_at__lt=oldest)
+            bests = {
+                (entry.user_id, entry.game_type, entry.scope, entry.period_start): (entry.best_score, entry.achieved_at)
+                for entry in kept
+            }
+            scores = GameScore.objects.order_by().values_list(
+                'user_id', 'game_type', 'score', 'completed_at'
+            )
+            for user_id, game_type, score, completed_at in scores.iterator(chunk_size=5000):
+                for scope, _ in BestScore.SCOPE_CHOICES:
+                    key = (user_id, game_type, scope, services.leaderboard_window(scope, completed_at))
+                    best = bests.get(key)
+                    if best is None or (score, -completed_at.timestamp()) > (best[0], -best[1].timestamp()):
+                        bests[key] = (score, completed_at)
+
+            BestScore.objects.all().delete()
+            BestScore.objects.bulk_create([
+                BestScore(
+                    user_id=user_id,
+                    game_type=game_type,
+                    scope=scope,
+                    period_start=period_start,
+                    best_score=score,
+                    achieved_at=achieved_at,
+                )
+                for (user_id, game_type, scope, period_start), (score, achieved_at) in bests.items()
+            ], batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(bests)} leaderboard entries rebuilt'))
@@ -0,0 +1,49 @@
+"""
+Management command to reconcile denormalized album progress counters.
+Usage: python manage.py reconcile_progress [--dry-run]
+
+The UserAlbum rows of the drifted profiles are rebuilt from their album
+items as well.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from encyclopedia.models import UserProfile
+from encyclopedia.services import bump_user_data_version, collected_count_expression, refresh_albums
+
+
+class Command(BaseCommand):
+    help = 'Recompute UserProfile.collected_count from album items and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted profiles without updating them',
+        )
+
+    def handle(self, *args, **options):
+        drifted = list(
+            UserProfile.objects
+            .annotate(actual=collected_count_expression())
+            .exclude(collected_count=F('actual'))
+            .select_related('user')
+        )
+
+        for profile in drifted:
+            self.stdout.write(
+                f'  {profile.user.username}: {profile.collected_count} -> {profile.actual}'
+            )
+            profile.collected_count = profile.actual
+
+        if options['dry_run']:
+            self.stdout.write(f'{len(drifted)} profiles would be updated')
+            return
+
+        with transaction.atomic():
+            UserProfile.objects.bulk_update(drifted, ['collected_count'], batch_size=500)
+            refresh_albums([profile.user_id for profile in drifted])
+        # bulk_update() skips the signals that invalidate cached progress
+        for profile in drifted:
+            bump_user_data_version(profile.user_id, 'album')
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(drifted)} profiles reconciled'))
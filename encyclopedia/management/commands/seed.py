@@ -3,6 +3,7 @@ Management command to seed the database with initial data.
 Usage: python manage.py seed
 """
 from django.core.management.base import BaseCommand
+from encyclopedia.importer import import_dinosaurs
 from encyclopedia.models import Period, Dinosaur, UserProfile
 from django.contrib.auth.models import User
 
@@ -15,34 +16,34 @@ class Command(BaseCommand):
         
         # Create geological periods
         self.stdout.write('Creating geological periods...')
-        triassic, _ = Period.objects.get_or_create(
-            name='triassic',
-            defaults={
-                'era': 'mesozoic',
-                'start_mya': 252,
-                'end_mya': 201,
-                'description': 'The Triassic Period was the first period of the Mesozoic Era. It began after the Permian-Triassic extinction event and ended with the Triassic-Jurassic extinction event. Dinosaurs first appeared during this period.'
-            }
-        )
-        
-        jurassic, _ = Period.objects.get_or_create(
-            name='jurassic',
-            defaults={
-                'era': 'mesozoic',
-                'start_mya': 201,
-                'end_mya': 145,
-                'description': 'The Jurassic Period was the middle period of the Mesozoic Era. It was named after the Jura Mountains. This period saw the diversification of dinosaurs including the largest land animals ever to exist.'
-            }
-        )
-        
-        cretaceous, _ = Period.objects.get_or_create(
-            name='cretaceous',
-            defaults={
-                'era': 'mesozoic',
-                'start_mya': 145,
-                'end_mya': 66,
-                'description': 'The Cretaceous Period was the last and longest period of the Mesozoic Era. It ended with the Cretaceous-Paleogene extinction event that wiped out all non-avian dinosaurs.'
-            }
+        periods = [
+            Period(
+                name='triassic',
+                era='mesozoic',
+                start_mya=252,
+                end_mya=201,
+                description='The Triassic Period was the first period of the Mesozoic Era. It began after the Permian-Triassic extinction event and ended with the Triassic-Jurassic extinction event. Dinosaurs first appeared during this period.'
+            ),
+            Period(
+                name='jurassic',
+                era='mesozoic',
+                start_mya=201,
+                end_mya=145,
+                description='The Jurassic Period was the middle period of the Mesozoic Era. It was named after the Jura Mountains. This period saw the diversification of dinosaurs including the largest land animals ever to exist.'
+            ),
+            Period(
+                name='cretaceous',
+                era='mesozoic',
+                start_mya=145,
+                end_mya=66,
+                description='The Cretaceous Period was the last and longest period of the Mesozoic Era. It ended with the Cretaceous-Paleogene extinction event that wiped out all non-avian dinosaurs.'
+            ),
+        ]
+        Period.objects.bulk_create(
+            periods,
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['era', 'start_mya', 'end_mya', 'description'],
         )
         
         self.stdout.write(self.style.SUCCESS('✓ Periods created'))
@@ -55,7 +56,7 @@ class Command(BaseCommand):
             {
                 'name': 'Coelophysis',
                 'scientific_name': 'Coelophysis bauri',
-                'period': triassic,
+                'period': 'triassic',
                 'diet': 'carnivore',
                 'length_meters': 3.0,
                 'weight_kg': 32.0,
@@ -66,7 +67,7 @@ class Command(BaseCommand):
             {
                 'name': 'Plateosaurus',
                 'scientific_name': 'Plateosaurus engelhardti',
-                'period': triassic,
+                'period': 'triassic',
                 'diet': 'herbivore',
                 'length_meters': 7.0,
                 'weight_kg': 4000.0,
@@ -77,7 +78,7 @@ class Command(BaseCommand):
             {
                 'name': 'Eoraptor',
                 'scientific_name': 'Eoraptor lunensis',
-                'period': triassic,
+                'period': 'triassic',
                 'diet': 'omnivore',
                 'length_meters': 1.0,
                 'weight_kg': 10.0,
@@ -90,7 +91,7 @@ class Command(BaseCommand):
             {
                 'name': 'Allosaurus',
                 'scientific_name': 'Allosaurus fragilis',
-                'period': jurassic,
+                'period': 'jurassic',
                 'diet': 'carnivore',
                 'length_meters': 9.5,
                 'weight_kg': 2300.0,
@@ -101,7 +102,7 @@ class Command(BaseCommand):
             {
                 'name': 'Stegosaurus',
                 'scientific_name': 'Stegosaurus stenops',
-                'period': jurassic,
+                'period': 'jurassic',
                 'diet': 'herbivore',
                 'length_meters': 9.0,
                 'weight_kg': 5000.0,
@@ -112,7 +113,7 @@ class Command(BaseCommand):
             {
                 'name': 'Brachiosaurus',
                 'scientific_name': 'Brachiosaurus altithorax',
-                'period': jurassic,
+                'period': 'jurassic',
                 'diet': 'herbivore',
                 'length_meters': 25.0,
                 'weight_kg': 56000.0,
@@ -123,7 +124,7 @@ class Command(BaseCommand):
             {
                 'name': 'Archaeopteryx',
                 'scientific_name': 'Archaeopteryx lithographica',
-                'period': jurassic,
+                'period': 'jurassic',
                 'diet': 'carnivore',
                 'length_meters': 0.5,
                 'weight_kg': 1.0,
@@ -136,7 +137,7 @@ class Command(BaseCommand):
             {
                 'name': 'Tyrannosaurus Rex',
                 'scientific_name': 'Tyrannosaurus rex',
-                'period': cretaceous,
+                'period': 'cretaceous',
                 'diet': 'carnivore',
                 'length_meters': 12.3,
                 'weight_kg': 8400.0,
@@ -147,7 +148,7 @@ class Command(BaseCommand):
             {
                 'name': 'Triceratops',
                 'scientific_name': 'Triceratops horridus',
-                'period': cretaceous,
+                'period': 'cretaceous',
                 'diet': 'herbivore',
                 'length_meters': 9.0,
                 'weight_kg': 12000.0,
@@ -158,7 +159,7 @@ class Command(BaseCommand):
             {
                 'name': 'Velociraptor',
                 'scientific_name': 'Velociraptor mongoliensis',
-                'period': cretaceous,
+                'period': 'cretaceous',
                 'diet': 'carnivore',
                 'length_meters': 2.0,
                 'weight_kg': 15.0,
@@ -169,7 +170,7 @@ class Command(BaseCommand):
             {
                 'name': 'Spinosaurus',
                 'scientific_name': 'Spinosaurus aegyptiacus',
-                'period': cretaceous,
+                'period': 'cretaceous',
                 'diet': 'carnivore',
                 'length_meters': 15.0,
                 'weight_kg': 7400.0,
@@ -180,7 +181,7 @@ class Command(BaseCommand):
             {
                 'name': 'Ankylosaurus',
                 'scientific_name': 'Ankylosaurus magniventris',
-                'period': cretaceous,
+                'period': 'cretaceous',
                 'diet': 'herbivore',
                 'length_meters': 6.25,
                 'weight_kg': 6000.0,
@@ -191,7 +192,7 @@ class Command(BaseCommand):
             {
                 'name': 'Parasaurolophus',
                 'scientific_name': 'Parasaurolophus walkeri',
-                'period': cretaceous,
+                'period': 'cretaceous',
                 'diet': 'herbivore',
                 'length_meters': 10.0,
                 'weight_kg': 2500.0,
@@ -201,13 +202,8 @@ class Command(BaseCommand):
             },
         ]
         
-        for dino_data in dinosaurs_data:
-            dinosaur, created = Dinosaur.objects.get_or_create(
-                name=dino_data['name'],
-                defaults=dino_data
-            )
-            if created:
-                self.stdout.write(f'  ✓ Created {dinosaur.name}')
+        stats = import_dinosaurs(dinosaurs_data)
+        self.stdout.write(f'  ✓ Upserted {stats.upserted} dinosaurs')
         
         self.stdout.write(self.style.SUCCESS(f'✓ {Dinosaur.objects.count()} dinosaurs in database'))
         
@@ -219,7 +215,8 @@ class Command(BaseCommand):
                 email='test@example.com',
                 password='test123'
             )
-            UserProfile.objects.create(user=test_user, tokens=100)
+            # The profile itself is created by the post_save signal on User
+            UserProfile.objects.filter(user=test_user).update(tokens=100)
             self.stdout.write(self.style.SUCCESS('✓ Test user created (username: test, password: test123)'))
         
         self.stdout.write(self.style.SUCCESS('\n✅ Database seeded successfully!'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:46
+
+from django.db import migrations, models
+
+
+def populate_collected_count(apps, schema_editor):
+    UserProfile = apps.get_model('encyclopedia', 'UserProfile')
+    AlbumItem = apps.get_model('encyclopedia', 'AlbumItem')
+    counts = (
+        AlbumItem.objects.filter(is_collected=True)
+        .order_by()
+        .values('user_id')
+        .annotate(total=models.Count('pk'))
+    )
+    for row in counts:
+        UserProfile.objects.filter(user_id=row['user_id']).update(collected_count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='collected_count',
+            field=models.PositiveIntegerField(default=0, help_text='Denormalized number of collected album items'),
+        ),
+        migrations.RunPython(populate_collected_count, migrations.RunPython.noop),
+    ]
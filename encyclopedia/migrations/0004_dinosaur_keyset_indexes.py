@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0003_tokentransaction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dinosaur',
+            index=models.Index(fields=['name', 'id'], name='dinosaur_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dinosaur',
+            index=models.Index(fields=['period', 'name', 'id'], name='dinosaur_period_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dinosaur',
+            index=models.Index(fields=['diet', 'name', 'id'], name='dinosaur_diet_name_idx'),
+        ),
+    ]
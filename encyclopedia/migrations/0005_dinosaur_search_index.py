@@ -0,0 +1,126 @@
+# Full-text search index for Dinosaur (see encyclopedia/search.py)
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE encyclopedia_dinosaur_fts USING fts5(
+        name, scientific_name, description, fun_fact,
+        content='encyclopedia_dinosaur', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER encyclopedia_dinosaur_fts_ai AFTER INSERT ON encyclopedia_dinosaur BEGIN
+        INSERT INTO encyclopedia_dinosaur_fts(rowid, name, scientific_name, description, fun_fact)
+        VALUES (new.id, new.name, new.scientific_name, new.description, new.fun_fact);
+    END
+    """,
+    """
+    CREATE TRIGGER encyclopedia_dinosaur_fts_ad AFTER DELETE ON encyclopedia_dinosaur BEGIN
+        INSERT INTO encyclopedia_dinosaur_fts(encyclopedia_dinosaur_fts, rowid, name, scientific_name, description, fun_fact)
+        VALUES ('delete', old.id, old.name, old.scientific_name, old.description, old.fun_fact);
+    END
+    """,
+    """
+    CREATE TRIGGER encyclopedia_dinosaur_fts_au AFTER UPDATE ON encyclopedia_dinosaur BEGIN
+        INSERT INTO encyclopedia_dinosaur_fts(encyclopedia_dinosaur_fts, rowid, name, scientific_name, description, fun_fact)
+        VALUES ('delete', old.id, old.name, old.scientific_name, old.description, old.fun_fact);
+        INSERT INTO encyclopedia_dinosaur_fts(rowid, name, scientific_name, description, fun_fact)
+        VALUES (new.id, new.name, new.scientific_name, new.description, new.fun_fact);
+    END
+    """,
+    "INSERT INTO encyclopedia_dinosaur_fts(encyclopedia_dinosaur_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS encyclopedia_dinosaur_fts_au",
+    "DROP TRIGGER IF EXISTS encyclopedia_dinosaur_fts_ad",
+    "DROP TRIGGER IF EXISTS encyclopedia_dinosaur_fts_ai",
+    "DROP TABLE IF EXISTS encyclopedia_dinosaur_fts",
+]
+
+POSTGRES_FORWARD = [
+    """
+    CREATE TABLE encyclopedia_dinosaur_search (
+        dinosaur_id bigint PRIMARY KEY,
+        document tsvector NOT NULL,
+        names tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX encyclopedia_dinosaur_search_doc_idx ON encyclopedia_dinosaur_search USING GIN (document)",
+    "CREATE INDEX encyclopedia_dinosaur_search_names_idx ON encyclopedia_dinosaur_search USING GIN (names)",
+    """
+    CREATE FUNCTION encyclopedia_dinosaur_search_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM encyclopedia_dinosaur_search WHERE dinosaur_id = OLD.id;
+            RETURN OLD;
+        END IF;
+        INSERT INTO encyclopedia_dinosaur_search (dinosaur_id, document, names)
+        VALUES (
+            NEW.id,
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(NEW.scientific_name, '')), 'B')
+            || setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C')
+            || setweight(to_tsvector('english', coalesce(NEW.fun_fact, '')), 'D'),
+            to_tsvector('simple', coalesce(NEW.name, '') || ' ' || coalesce(NEW.scientific_name, ''))
+        )
+        ON CONFLICT (dinosaur_id) DO UPDATE
+            SET document = EXCLUDED.document, names = EXCLUDED.names;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER encyclopedia_dinosaur_search_sync
+    AFTER INSERT OR DELETE OR UPDATE OF name, scientific_name, description, fun_fact
+    ON encyclopedia_dinosaur
+    FOR EACH ROW EXECUTE FUNCTION encyclopedia_dinosaur_search_sync()
+    """,
+    """
+    INSERT INTO encyclopedia_dinosaur_search (dinosaur_id, document, names)
+    SELECT
+        id,
+        setweight(to_tsvector('english', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(scientific_name, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'C')
+        || setweight(to_tsvector('english', coalesce(fun_fact, '')), 'D'),
+        to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(scientific_name, ''))
+    FROM encyclopedia_dinosaur
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    "DROP TRIGGER IF EXISTS encyclopedia_dinosaur_search_sync ON encyclopedia_dinosaur",
+    "DROP FUNCTION IF EXISTS encyclopedia_dinosaur_search_sync()",
+    "DROP TABLE IF EXISTS encyclopedia_dinosaur_search",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+                if not cursor.fetchone()[0]:
+                    # Without FTS5, search.py falls back to icontains lookups
+                    return
+        for statement in statements_by_vendor.get(vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0004_dinosaur_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
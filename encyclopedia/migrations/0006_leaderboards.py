@@ -0,0 +1,75 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:55
+
+import datetime
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_all_time_bests(apps, schema_editor):
+    GameScore = apps.get_model('encyclopedia', 'GameScore')
+    BestScore = apps.get_model('encyclopedia', 'BestScore')
+    bests = {}
+    scores = GameScore.objects.order_by('user_id', 'game_type', '-score', 'completed_at')
+    for row in scores.values('user_id', 'game_type', 'score', 'completed_at').iterator():
+        bests.setdefault((row['user_id'], row['game_type']), row)
+    BestScore.objects.bulk_create([
+        BestScore(
+            user_id=row['user_id'],
+            game_type=row['game_type'],
+            scope='all',
+            period_start=datetime.date(1970, 1, 1),
+            best_score=row['score'],
+            achieved_at=row['completed_at'],
+        )
+        for row in bests.values()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0005_dinosaur_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BestScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_type', models.CharField(choices=[('puzzleaurus', 'Puzzleaurus'), ('memodyn', 'Memodyn')], max_length=20)),
+                ('scope', models.CharField(choices=[('all', 'All time'), ('week', 'This week'), ('day', 'Today')], max_length=10)),
+                ('period_start', models.DateField(help_text='First day of the leaderboard window')),
+                ('best_score', models.IntegerField(validators=[django.core.validators.MinValueValidator(0)])),
+                ('achieved_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-best_score', 'achieved_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='gamescore',
+            index=models.Index(fields=['game_type', '-score'], name='gamescore_game_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamescore',
+            index=models.Index(fields=['user', 'game_type', '-score'], name='gamescore_user_game_idx'),
+        ),
+        migrations.AddField(
+            model_name='bestscore',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='best_scores', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='bestscore',
+            index=models.Index(fields=['game_type', 'scope', 'period_start', '-best_score', 'achieved_at'], name='bestscore_leaderboard_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bestscore',
+            unique_together={('user', 'game_type', 'scope', 'period_start')},
+        ),
+        migrations.RunPython(backfill_all_time_bests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0006_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dinosaur',
+            name='name',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_missing_profiles(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserProfile = apps.get_model('encyclopedia', 'UserProfile')
+    AlbumItem = apps.get_model('encyclopedia', 'AlbumItem')
+    missing = User.objects.filter(profile__isnull=True).values_list('pk', flat=True)
+    counts = dict(
+        AlbumItem.objects.filter(is_collected=True, user_id__in=missing)
+        .order_by()
+        .values('user_id')
+        .annotate(total=models.Count('pk'))
+        .values_list('user_id', 'total')
+    )
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=pk, collected_count=counts.get(pk, 0)) for pk in missing],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0007_dinosaur_name_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('encyclopedia', '0008_backfill_user_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAlbum',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='album', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('collected_ids', models.JSONField(default=list, help_text='Sorted ids of collected dinosaurs')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='albumitem',
+            options={},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0009_user_album'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dinosaur',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized WebP/AVIF copies of image (see images.py)'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized WebP/AVIF copies of avatar (see images.py)'),
+        ),
+    ]
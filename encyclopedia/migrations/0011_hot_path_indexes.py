@@ -0,0 +1,43 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0010_image_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='albumitem',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='album_items', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='bestscore',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='best_scores', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='gamescore',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='game_scores', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='albumitem',
+            index=models.Index(condition=models.Q(('is_collected', True)), fields=['user', '-collected_at', '-id'], name='albumitem_collected_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bestscore',
+            index=models.Index(fields=['user', 'scope', 'game_type'], name='bestscore_user_scope_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamescore',
+            index=models.Index(fields=['user', '-score'], name='gamescore_user_score_idx'),
+        ),
+    ]
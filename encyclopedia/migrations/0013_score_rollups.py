@@ -0,0 +1,77 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate, TruncWeek
+
+
+def backfill_rollups(apps, schema_editor):
+    GameScore = apps.get_model('encyclopedia', 'GameScore')
+    GameScoreRollup = apps.get_model('encyclopedia', 'GameScoreRollup')
+    for granularity, trunc in (('day', TruncDate), ('week', TruncWeek)):
+        totals = (
+            GameScore.objects.order_by()
+            .annotate(period_start=trunc('completed_at', output_field=models.DateField()))
+            .values('user_id', 'game_type', 'period_start')
+            .annotate(count=models.Count('pk'), total=models.Sum('score'), best=models.Max('score'))
+        )
+        GameScoreRollup.objects.bulk_create(
+            (
+                GameScoreRollup(
+                    user_id=row['user_id'],
+                    game_type=row['game_type'],
+                    granularity=granularity,
+                    period_start=row['period_start'],
+                    count=row['count'],
+                    best_score=row['best'],
+                    total_score=row['total'],
+                )
+                for row in totals.iterator(chunk_size=5000)
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0012_score_journal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameScoreRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_type', models.CharField(choices=[('puzzleaurus', 'Puzzleaurus'), ('memodyn', 'Memodyn')], max_length=20)),
+                ('granularity', models.CharField(choices=[('day', 'Daily'), ('week', 'Weekly')], max_length=10)),
+                ('period_start', models.DateField(help_text='First day of the window (weeks start on Monday)')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('best_score', models.IntegerField(default=0)),
+                ('total_score', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-period_start'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='gamescore',
+            index=models.Index(fields=['completed_at'], name='gamescore_completed_idx'),
+        ),
+        migrations.AddField(
+            model_name='gamescorerollup',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='score_rollups', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='gamescorerollup',
+            index=models.Index(fields=['granularity', 'period_start'], name='rollup_window_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='gamescorerollup',
+            unique_together={('user', 'game_type', 'granularity', 'period_start')},
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
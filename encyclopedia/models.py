@@ -1,6 +1,9 @@
+import datetime
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 
 class Period(models.Model):
@@ -36,7 +39,7 @@ class Dinosaur(models.Model):
         ('omnivore', 'Omnivore'),
     ]
     
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, unique=True)
     scientific_name = models.CharField(max_length=200, blank=True)
     period = models.ForeignKey(Period, on_delete=models.CASCADE, related_name='dinosaurs')
     diet = models.CharField(max_length=20, choices=DIET_CHOICES)
@@ -55,6 +58,12 @@ class Dinosaur(models.Model):
     description = models.TextField()
     fun_fact = models.TextField(blank=True)
     image = models.ImageField(upload_to='dinosaurs/', blank=True, null=True)
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Resized WebP/AVIF copies of image (see images.py)"
+    )
     discovered_year = models.IntegerField(
         blank=True, 
         null=True,
@@ -65,6 +74,12 @@ class Dinosaur(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Keyset pagination seeks on (name, id), optionally per filter
+            models.Index(fields=['name', 'id'], name='dinosaur_name_id_idx'),
+            models.Index(fields=['period', 'name', 'id'], name='dinosaur_period_name_idx'),
+            models.Index(fields=['diet', 'name', 'id'], name='dinosaur_diet_name_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -74,7 +89,17 @@ class UserProfile(models.Model):
     """Extended user profile with game-specific data"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    avatar_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Resized WebP/AVIF copies of avatar (see images.py)"
+    )
     tokens = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    collected_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Denormalized number of collected album items"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -84,29 +109,56 @@ class UserProfile(models.Model):
     @property
     def progress_percentage(self):
         """Calculate user's album completion percentage"""
-        total_dinosaurs = Dinosaur.objects.count()
+        from .catalog import get_catalog_size
+
+        total_dinosaurs = get_catalog_size()
         if total_dinosaurs == 0:
             return 0
-        collected = AlbumItem.objects.filter(user=self.user, is_collected=True).count()
-        return round((collected / total_dinosaurs) * 100, 2)
+        return round((self.collected_count / total_dinosaurs) * 100, 2)
 
 
 class AlbumItem(models.Model):
     """Represents a dinosaur collection item in user's album"""
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='album_items')
+    # Lookups by user use the (user, dinosaur) unique index
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='album_items', db_index=False)
     dinosaur = models.ForeignKey(Dinosaur, on_delete=models.CASCADE)
     is_collected = models.BooleanField(default=False)
     collected_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         unique_together = ['user', 'dinosaur']
-        ordering = ['dinosaur__period', 'dinosaur__name']
+        indexes = [
+            # A user's collection, newest first; also serves collected counts
+            models.Index(
+                fields=['user', '-collected_at', '-id'],
+                name='albumitem_collected_idx',
+                condition=models.Q(is_collected=True),
+            ),
+        ]
     
     def __str__(self):
         status = "✓" if self.is_collected else "✗"
         return f"{status} {self.user.username} - {self.dinosaur.name}"
 
 
+class UserAlbum(models.Model):
+    """
+    Album read model: the ids of every dinosaur a user has collected, in one row.
+    
+    Derived from AlbumItem by services.materialize_albums() and merged with
+    the cached catalog to render the full album, so reading an album costs
+    one primary-key lookup however large the catalog is.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='album'
+    )
+    collected_ids = models.JSONField(default=list, help_text="Sorted ids of collected dinosaurs")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user_id}'s album ({len(self.collected_ids)} collected)"
+
+
 class GameScore(models.Model):
     """Stores game scores for mini-games"""
     GAME_TYPES = [
@@ -114,13 +166,130 @@ class GameScore(models.Model):
         ('memodyn', 'Memodyn'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='game_scores')
+    # Lookups by user use the composite indexes below
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='game_scores', db_index=False)
     game_type = models.CharField(max_length=20, choices=GAME_TYPES)
     score = models.IntegerField(validators=[MinValueValidator(0)])
-    completed_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: scores buffered by ingestion.py keep their submission time
+    completed_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-completed_at']
+        indexes = [
+            models.Index(fields=['game_type', '-score'], name='gamescore_game_score_idx'),
+            models.Index(fields=['user', 'game_type', '-score'], name='gamescore_user_game_idx'),
+            models.Index(fields=['user', '-score'], name='gamescore_user_score_idx'),
+            # Retention pruning and the admin's date ordering
+            models.Index(fields=['completed_at'], name='gamescore_completed_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.get_game_type_display()}: {self.score}"
+
+
+class BestScore(models.Model):
+    """Materialized best score per user, game and leaderboard window"""
+    SCOPE_CHOICES = [
+        ('all', 'All time'),
+        ('week', 'This week'),
+        ('day', 'Today'),
+    ]
+    # period_start used for the all-time scope
+    ALL_TIME_START = datetime.date(1970, 1, 1)
+    
+    # Lookups by user use the unique index and bestscore_user_scope_idx
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='best_scores', db_index=False)
+    game_type = models.CharField(max_length=20, choices=GameScore.GAME_TYPES)
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    period_start = models.DateField(help_text="First day of the leaderboard window")
+    best_score = models.IntegerField(validators=[MinValueValidator(0)])
+    achieved_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['user', 'game_type', 'scope', 'period_start']
+        indexes = [
+            # Top-N and rank lookups are range scans on this index
+            models.Index(
+                fields=['game_type', 'scope', 'period_start', '-best_score', 'achieved_at'],
+                name='bestscore_leaderboard_idx'
+            ),
+            models.Index(fields=['user', 'scope', 'game_type'], name='bestscore_user_scope_idx'),
+        ]
+        ordering = ['-best_score', 'achieved_at']
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.get_game_type_display()} ({self.scope}): {self.best_score}"
+
+
+class GameScoreRollup(models.Model):
+    """
+    Daily and weekly totals of a user's scores in one game.
+    
+    Updated with every saved score (services.record_score_rollups) and
+    rebuilt from the raw rows by compact_scores before old GameScore rows
+    are pruned, so statistics never scan the raw score history.
+    """
+    GRANULARITY_CHOICES = [
+        ('day', 'Daily'),
+        ('week', 'Weekly'),
+    ]
+    
+    # Lookups by user use the unique index
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='score_rollups', db_index=False)
+    game_type = models.CharField(max_length=20, choices=GameScore.GAME_TYPES)
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    period_start = models.DateField(help_text="First day of the window (weeks start on Monday)")
+    count = models.PositiveIntegerField(default=0)
+    best_score = models.IntegerField(default=0)
+    total_score = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['user', 'game_type', 'granularity', 'period_start']
+        indexes = [
+            models.Index(fields=['granularity', 'period_start'], name='rollup_window_idx'),
+        ]
+        ordering = ['-period_start']
+    
+    @property
+    def average_score(self):
+        return round(self.total_score / self.count, 1) if self.count else 0
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.get_game_type_display()} ({self.granularity} of {self.period_start})"
+
+
+class ScoreJournalCheckpoint(models.Model):
+    """
+    Last score journal entry applied to the database (see ingestion.py).
+    
+    Advanced in the same transaction that inserts the scores, so entries
+    replayed after a crash are recognised as already applied.
+    """
+    journal = models.CharField(max_length=64, unique=True, help_text="Journal identifier")
+    last_entry_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Journal {self.journal} applied up to #{self.last_entry_id}"
+
+
+class TokenTransaction(models.Model):
+    """Append-only ledger of token awards and deductions"""
+    REASON_CHOICES = [
+        ('welcome', 'Welcome bonus'),
+        ('collect', 'Dinosaur collected'),
+        ('game', 'Game score'),
+        ('adjustment', 'Adjustment'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='token_transactions')
+    amount = models.IntegerField(help_text="Requested change (positive or negative)")
+    balance_after = models.IntegerField(null=True, blank=True)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default='adjustment')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.amount:+d} ({self.get_reason_display()})"
@@ -0,0 +1,252 @@
+"""
+Full-text search engine for the dinosaur catalog.
+
+SQLite uses an FTS5 virtual table and PostgreSQL uses a tsvector side
+table with a GIN index. Both are created by migration 0005 and kept in
+sync with encyclopedia_dinosaur by database triggers, so bulk inserts and
+queryset updates are indexed too. The SQLite triggers are reinstalled
+after every migrate (see signals.py). Other backends (or SQLite builds
+without FTS5) fall back to icontains lookups.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+SQLITE_TABLE = 'encyclopedia_dinosaur_fts'
+POSTGRES_TABLE = 'encyclopedia_dinosaur_search'
+
+# Sentinels wrapped around matches by the database, swapped for <mark>
+# tags after the snippet has been HTML-escaped.
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_available = {}
+
+# Recreated after every migrate: SQLite drops a table's triggers whenever a
+# migration rebuilds it (e.g. AlterField on Dinosaur).
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_TABLE}_ai AFTER INSERT ON encyclopedia_dinosaur BEGIN
+        INSERT INTO {SQLITE_TABLE}(rowid, name, scientific_name, description, fun_fact)
+        VALUES (new.id, new.name, new.scientific_name, new.description, new.fun_fact);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_TABLE}_ad AFTER DELETE ON encyclopedia_dinosaur BEGIN
+        INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, name, scientific_name, description, fun_fact)
+        VALUES ('delete', old.id, old.name, old.scientific_name, old.description, old.fun_fact);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_TABLE}_au AFTER UPDATE ON encyclopedia_dinosaur BEGIN
+        INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, name, scientific_name, description, fun_fact)
+        VALUES ('delete', old.id, old.name, old.scientific_name, old.description, old.fun_fact);
+        INSERT INTO {SQLITE_TABLE}(rowid, name, scientific_name, description, fun_fact)
+        VALUES (new.id, new.name, new.scientific_name, new.description, new.fun_fact);
+    END
+    """,
+]
+
+
+def install_sqlite_triggers(using='default'):
+    """
+    Make sure the FTS5 sync triggers exist on a SQLite database.
+
+    Returns:
+        True if triggers were (re)installed
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return False
+    tables = conn.introspection.table_names()
+    if SQLITE_TABLE not in tables or 'encyclopedia_dinosaur' not in tables:
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+            [f'{SQLITE_TABLE}_%'],
+        )
+        if cursor.fetchone()[0] == len(SQLITE_TRIGGERS):
+            return False
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+        # Rows may have changed while the triggers were missing
+        cursor.execute(f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def tokenize(query):
+    """Split a free-text query into lowercase word tokens."""
+    return [token.lower() for token in _TOKEN_RE.findall(query or '')]
+
+
+def is_available():
+    """Return True if the current database has a full-text index."""
+    alias = connection.alias
+    if alias not in _available:
+        table = {'sqlite': SQLITE_TABLE, 'postgresql': POSTGRES_TABLE}.get(connection.vendor)
+        _available[alias] = bool(table) and table in connection.introspection.table_names()
+    return _available[alias]
+
+
+def _match_expression(tokens, columns=None):
+    """Build a backend query string where every token is a prefix match."""
+    if connection.vendor == 'sqlite':
+        terms = ' '.join(f'"{token}"*' for token in tokens)
+        if columns:
+            return '{%s} : (%s)' % (' '.join(columns), terms)
+        return terms
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+def _highlight(snippet):
+    """HTML-escape a database snippet and turn its sentinels into <mark> tags."""
+    if not snippet:
+        return ''
+    html = escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+def icontains_filter(query):
+    """Fallback filter: substring match on every searchable column."""
+    return (
+        Q(name__icontains=query)
+        | Q(scientific_name__icontains=query)
+        | Q(description__icontains=query)
+        | Q(fun_fact__icontains=query)
+    )
+
+
+def search_filter(query):
+    """
+    Build a Q object restricting Dinosaur rows to those matching a query.
+
+    Args:
+        query: Free-text search string
+
+    Returns:
+        Q object usable in Dinosaur.objects.filter()
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return Q()
+    if not is_available():
+        return icontains_filter(query)
+
+    if connection.vendor == 'sqlite':
+        sql = f'SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s'
+    else:
+        sql = f"SELECT dinosaur_id FROM {POSTGRES_TABLE} WHERE document @@ to_tsquery('english', %s)"
+    return Q(id__in=RawSQL(sql, [_match_expression(tokens)]))
+
+
+def ranked_search(query, limit=50):
+    """
+    Run a ranked full-text search.
+
+    Args:
+        query: Free-text search string
+        limit: Maximum number of hits
+
+    Returns:
+        List of (dinosaur_id, rank, snippet) tuples, best match first.
+        Higher rank is better.
+    """
+    tokens = tokenize(query)
+    if not tokens or not is_available():
+        return []
+
+    if connection.vendor == 'sqlite':
+        sql = (
+            f"SELECT rowid, -bm25({SQLITE_TABLE}, 10.0, 5.0, 1.0, 1.0), "
+            f"snippet({SQLITE_TABLE}, -1, %s, %s, '…', 16) "
+            f"FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+            f"ORDER BY bm25({SQLITE_TABLE}, 10.0, 5.0, 1.0, 1.0) LIMIT %s"
+        )
+        params = [_MARK_START, _MARK_END, _match_expression(tokens), limit]
+    else:
+        sql = (
+            f"SELECT s.dinosaur_id, ts_rank_cd(s.document, q), "
+            f"ts_headline('english', d.description || ' ' || d.fun_fact, q, %s) "
+            f"FROM {POSTGRES_TABLE} s "
+            f"JOIN encyclopedia_dinosaur d ON d.id = s.dinosaur_id, "
+            f"to_tsquery('english', %s) q "
+            f"WHERE s.document @@ q ORDER BY 2 DESC LIMIT %s"
+        )
+        options = f'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=20, MinWords=8'
+        params = [options, _match_expression(tokens), limit]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(pk, rank, _highlight(snippet)) for pk, rank, snippet in cursor.fetchall()]
+
+
+def snippets_for(query, ids):
+    """
+    Highlighted snippets for a known set of dinosaurs, e.g. one gallery page.
+
+    Returns:
+        Dictionary of dinosaur id to safe HTML snippet
+    """
+    ids = list(ids)
+    tokens = tokenize(query)
+    if not ids or not tokens or not is_available():
+        return {}
+
+    placeholders = ', '.join(['%s'] * len(ids))
+    if connection.vendor == 'sqlite':
+        sql = (
+            f"SELECT rowid, snippet({SQLITE_TABLE}, -1, %s, %s, '…', 16) "
+            f"FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s AND rowid IN ({placeholders})"
+        )
+        params = [_MARK_START, _MARK_END, _match_expression(tokens), *ids]
+    else:
+        sql = (
+            f"SELECT d.id, ts_headline('english', d.description || ' ' || d.fun_fact, "
+            f"to_tsquery('english', %s), %s) "
+            f"FROM encyclopedia_dinosaur d WHERE d.id IN ({placeholders})"
+        )
+        options = f'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=20, MinWords=8'
+        params = [_match_expression(tokens), options, *ids]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {pk: _highlight(snippet) for pk, snippet in cursor.fetchall()}
+
+
+def suggest(prefix, limit=8):
+    """
+    Typeahead: ids of dinosaurs whose name or scientific name starts with
+    the given words, best match first.
+
+    Returns:
+        List of dinosaur ids
+    """
+    tokens = tokenize(prefix)
+    if not tokens or not is_available():
+        return []
+
+    if connection.vendor == 'sqlite':
+        sql = (
+            f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+            f"ORDER BY bm25({SQLITE_TABLE}, 10.0, 5.0, 0.0, 0.0) LIMIT %s"
+        )
+        params = [_match_expression(tokens, columns=['name', 'scientific_name']), limit]
+    else:
+        sql = (
+            f"SELECT dinosaur_id FROM {POSTGRES_TABLE} "
+            f"WHERE names @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank_cd(names, to_tsquery('simple', %s)) DESC LIMIT %s"
+        )
+        expression = _match_expression(tokens)
+        params = [expression, expression, limit]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
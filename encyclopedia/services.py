@@ -2,9 +2,66 @@
 Business logic services for the encyclopedia app.
 Separates business logic from views (controllers).
 """
-from django.db.models import Q
+import base64
+import binascii
+import bisect
+import datetime
+import json
+import secrets
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Avg, Case, Count, F, FilteredRelation, IntegerField, Max, Min, OuterRef, Q, Subquery, Sum,
+    Value, When
+)
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
-from .models import Dinosaur, UserProfile, AlbumItem, Period, GameScore
+from .models import (
+    AlbumItem, BestScore, Dinosaur, GameScore, GameScoreRollup, Period, TokenTransaction,
+    UserAlbum, UserProfile
+)
+from . import search
+from .catalog import (
+    aget_catalog_size, aget_catalog_version, aget_version, bump_version, get_album_catalog,
+    get_catalog_size, get_catalog_version, get_version
+)
+
+
+MAP_DATA_CACHE_KEY = 'encyclopedia:map:{version}:{user_id}:{album_version}'
+USER_VERSION_CACHE_KEY = 'encyclopedia:user:{user_id}:{kind}_version'
+GAME_STATS_CACHE_KEY = 'encyclopedia:game-stats:{user_id}:{version}'
+GALLERY_PAGE_SIZE = 24
+COLLECT_TOKEN_AWARD = 10
+# Usernames of ephemeral guest accounts; registration refuses the prefix
+GUEST_USERNAME_PREFIX = 'guest-'
+
+
+def filter_dinosaurs(period_name=None, diet=None, query=None):
+    """
+    Get dinosaurs matching any combination of period, diet and search.
+    
+    Args:
+        period_name: Name of the geological period (optional)
+        diet: Type of diet (optional)
+        query: Full-text search string, prefix-matched (optional)
+    
+    Returns:
+        QuerySet of Dinosaur objects ordered by (name, id)
+    """
+    dinosaurs = Dinosaur.objects.all()
+    if period_name:
+        dinosaurs = dinosaurs.filter(period__name=period_name)
+    if diet:
+        dinosaurs = dinosaurs.filter(diet=diet)
+    if query:
+        dinosaurs = dinosaurs.filter(search.search_filter(query))
+    return dinosaurs.select_related('period').order_by('name', 'id')
 
 
 def get_dinosaurs_by_period(period_name=None):
@@ -17,9 +74,7 @@ def get_dinosaurs_by_period(period_name=None):
     Returns:
         QuerySet of Dinosaur objects
     """
-    if period_name:
-        return Dinosaur.objects.filter(period__name=period_name).select_related('period')
-    return Dinosaur.objects.all().select_related('period')
+    return filter_dinosaurs(period_name=period_name)
 
 
 def get_dinosaurs_by_diet(diet):
@@ -32,22 +87,162 @@ def get_dinosaurs_by_diet(diet):
     Returns:
         QuerySet of Dinosaur objects
     """
-    return Dinosaur.objects.filter(diet=diet).select_related('period')
+    return filter_dinosaurs(diet=diet)
+
+
+def search_dinosaurs(query, limit=50):
+    """
+    Full-text search over name, scientific name, description and fun fact.
+    
+    Args:
+        query: Search query string; every word is matched as a prefix
+        limit: Maximum number of results
+    
+    Returns:
+        List of Dinosaur objects, best match first, each annotated with
+        ``search_rank`` and a highlighted ``search_snippet``
+    """
+    if not search.is_available():
+        dinosaurs = list(filter_dinosaurs(query=query)[:limit])
+        for dinosaur in dinosaurs:
+            dinosaur.search_rank, dinosaur.search_snippet = 0, ''
+        return dinosaurs
+    
+    hits = search.ranked_search(query, limit=limit)
+    # in_bulk() returns a dict, so skip sorting by the default ordering
+    by_id = Dinosaur.objects.select_related('period').order_by().in_bulk([pk for pk, _, _ in hits])
+    results = []
+    for pk, rank, snippet in hits:
+        if pk in by_id:
+            dinosaur = by_id[pk]
+            dinosaur.search_rank, dinosaur.search_snippet = rank, snippet
+            results.append(dinosaur)
+    return results
 
 
-def search_dinosaurs(query):
+def suggest_dinosaurs(prefix, limit=8):
     """
-    Search dinosaurs by name or scientific name.
+    Typeahead suggestions for the gallery search box.
+    
+    Args:
+        prefix: Partial text typed by the user
+        limit: Maximum number of suggestions
+    
+    Returns:
+        List of dictionaries with dinosaur id, name and scientific name
+    """
+    if search.is_available():
+        ids = search.suggest(prefix, limit=limit)
+        by_id = Dinosaur.objects.only('name', 'scientific_name').order_by().in_bulk(ids)
+        dinosaurs = [by_id[pk] for pk in ids if pk in by_id]
+    else:
+        dinosaurs = Dinosaur.objects.filter(
+            Q(name__istartswith=prefix) | Q(scientific_name__istartswith=prefix)
+        ).only('name', 'scientific_name')[:limit] if prefix else []
+    return [
+        {'id': d.pk, 'name': d.name, 'scientific_name': d.scientific_name}
+        for d in dinosaurs
+    ]
+
+
+def attach_search_snippets(query, dinosaurs):
+    """
+    Set a highlighted ``search_snippet`` on each dinosaur of a result page.
     
     Args:
         query: Search query string
+        dinosaurs: List of Dinosaur objects (one page)
+    """
+    snippets = search.snippets_for(query, [d.pk for d in dinosaurs])
+    for dinosaur in dinosaurs:
+        dinosaur.search_snippet = snippets.get(dinosaur.pk, '')
+
+
+def encode_cursor(dinosaur):
+    """Encode a dinosaur's (name, id) sort key as an opaque page cursor."""
+    raw = json.dumps([dinosaur.name, dinosaur.pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a page cursor back into its (name, id) sort key.
     
     Returns:
-        QuerySet of matching Dinosaur objects
+        Tuple (name, id), or None if the cursor is missing or malformed
     """
-    return Dinosaur.objects.filter(
-        Q(name__icontains=query) | Q(scientific_name__icontains=query)
-    ).select_related('period')
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    # Cursors come back from clients: accept only what encode_cursor() writes,
+    # with an id the database can compare (no bigint overflow)
+    if not (isinstance(key, list) and len(key) == 2 and isinstance(key[0], str)
+            and type(key[1]) is int and 0 < key[1] < 2**63):
+        return None
+    return key[0], key[1]
+
+
+def paginate_dinosaurs(dinosaurs, after=None, before=None, page_size=GALLERY_PAGE_SIZE):
+    """
+    Keyset (seek) pagination over a queryset ordered by (name, id).
+    
+    Each page is a range scan starting at the cursor's sort key, so deep
+    pages cost the same as the first one.
+    
+    Args:
+        dinosaurs: QuerySet from filter_dinosaurs()
+        after: Cursor of the last item on the previous page (optional)
+        before: Cursor of the first item on the next page (optional)
+        page_size: Number of items per page
+    
+    Returns:
+        Dictionary with the page items and next/previous cursors
+    """
+    query, after_key, before_key = _page_query(dinosaurs, after, before, page_size)
+    return _page(list(query), after_key, before_key, page_size)
+
+
+async def apaginate_dinosaurs(dinosaurs, after=None, before=None, page_size=GALLERY_PAGE_SIZE):
+    """paginate_dinosaurs() for async views."""
+    query, after_key, before_key = _page_query(dinosaurs, after, before, page_size)
+    return _page([dinosaur async for dinosaur in query], after_key, before_key, page_size)
+
+
+def _page_query(dinosaurs, after, before, page_size):
+    """The page's rows (plus one, to detect more) and the decoded cursors."""
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before) if not after_key else None
+    if before_key:
+        name, pk = before_key
+        query = (
+            dinosaurs.filter(Q(name__lt=name) | Q(name=name, id__lt=pk))
+            .order_by('-name', '-id')[:page_size + 1]
+        )
+    elif after_key:
+        name, pk = after_key
+        query = dinosaurs.filter(Q(name__gt=name) | Q(name=name, id__gt=pk))[:page_size + 1]
+    else:
+        query = dinosaurs[:page_size + 1]
+    return query, after_key, before_key
+
+
+def _page(rows, after_key, before_key, page_size):
+    if before_key:
+        items = rows[:page_size][::-1]
+        has_previous, has_next = len(rows) > page_size, True
+    else:
+        items = rows[:page_size]
+        has_previous, has_next = bool(after_key), len(rows) > page_size
+    
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(items[-1]) if items and has_next else None,
+        'previous_cursor': encode_cursor(items[0]) if items and has_previous else None,
+    }
 
 
 def get_user_progress(user):
@@ -60,9 +255,16 @@ def get_user_progress(user):
     Returns:
         Dictionary with progress data
     """
-    total_dinosaurs = Dinosaur.objects.count()
-    collected = AlbumItem.objects.filter(user=user, is_collected=True).count()
-    
+    return _progress(get_or_create_user_profile(user).collected_count, get_catalog_size())
+
+
+async def aget_user_progress(user):
+    """get_user_progress() for async views."""
+    profile = await aget_or_create_user_profile(user)
+    return _progress(profile.collected_count, await aget_catalog_size())
+
+
+def _progress(collected, total_dinosaurs):
     progress_percentage = 0
     if total_dinosaurs > 0:
         progress_percentage = round((collected / total_dinosaurs) * 100, 2)
@@ -75,29 +277,83 @@ def get_user_progress(user):
     }
 
 
-def update_user_tokens(user, amount):
+def update_user_tokens(user, amount, reason='adjustment'):
     """
     Update user's token count.
     
+    Applies a single conditional UPDATE (tokens = MAX(tokens + amount, 0))
+    so concurrent awards never lose increments, and appends the change
+    to the TokenTransaction ledger in the same transaction.
+    
     Args:
         user: User object
         amount: Amount to add (positive) or subtract (negative)
+        reason: Ledger reason (see TokenTransaction.REASON_CHOICES)
     
     Returns:
         Updated token count
     """
-    profile, created = UserProfile.objects.get_or_create(user=user)
-    profile.tokens += amount
-    if profile.tokens < 0:
-        profile.tokens = 0
-    profile.save()
-    return profile.tokens
+    with transaction.atomic():
+        profiles = UserProfile.objects.filter(user=user)
+        if not profiles.update(tokens=Greatest(F('tokens') + amount, 0)):
+            UserProfile.objects.get_or_create(user=user)
+            profiles.update(tokens=Greatest(F('tokens') + amount, 0))
+        
+        tokens = profiles.values_list('tokens', flat=True).get()
+        TokenTransaction.objects.create(
+            user=user,
+            amount=amount,
+            balance_after=tokens,
+            reason=reason
+        )
+    return tokens
+
+
+def award_tokens_bulk(awards, reason='adjustment'):
+    """
+    Award tokens to many users at once.
+    
+    Issues one UPDATE for all profiles (a CASE over user ids) and one
+    bulk insert into the ledger, instead of a round trip per user.
+    
+    Args:
+        awards: Mapping of user id to amount
+        reason: Ledger reason (see TokenTransaction.REASON_CHOICES)
+    
+    Returns:
+        Number of profiles updated
+    """
+    awards = {user_id: amount for user_id, amount in awards.items() if amount}
+    if not awards:
+        return 0
+    
+    with transaction.atomic():
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=user_id) for user_id in awards],
+            ignore_conflicts=True
+        )
+        delta = Case(
+            *[When(user_id=user_id, then=Value(amount)) for user_id, amount in awards.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+        updated = UserProfile.objects.filter(user_id__in=awards).update(
+            tokens=Greatest(F('tokens') + delta, 0)
+        )
+        TokenTransaction.objects.bulk_create([
+            TokenTransaction(user_id=user_id, amount=amount, reason=reason)
+            for user_id, amount in awards.items()
+        ])
+    return updated
 
 
 def collect_dinosaur(user, dinosaur):
     """
     Mark a dinosaur as collected in user's album.
     
+    The album item flip, the profile's collected counter and the token
+    award are committed in a single transaction.
+    
     Args:
         user: User object
         dinosaur: Dinosaur object
@@ -105,20 +361,292 @@ def collect_dinosaur(user, dinosaur):
     Returns:
         AlbumItem object
     """
-    album_item, created = AlbumItem.objects.get_or_create(
-        user=user,
-        dinosaur=dinosaur
+    with transaction.atomic():
+        album_item, created = AlbumItem.objects.get_or_create(
+            user=user,
+            dinosaur=dinosaur
+        )
+        
+        if not album_item.is_collected:
+            now = timezone.now()
+            # Conditional update so concurrent collects only count once
+            flipped = AlbumItem.objects.filter(
+                pk=album_item.pk, is_collected=False
+            ).update(is_collected=True, collected_at=now)
+            album_item.is_collected = True
+            
+            if flipped:
+                album_item.collected_at = now
+                profiles = UserProfile.objects.filter(user=user)
+                if not profiles.update(collected_count=F('collected_count') + 1):
+                    get_or_create_user_profile(user)
+                    profiles.update(collected_count=F('collected_count') + 1)
+                add_to_album(user.pk, [dinosaur.pk])
+                
+                # Award tokens for new discovery
+                update_user_tokens(user, COLLECT_TOKEN_AWARD, reason='collect')
+                transaction.on_commit(lambda: bump_user_data_version(user.pk, 'album'))
+    
+    return album_item
+
+
+def collect_dinosaurs(user, dinosaur_ids):
+    """
+    Mark many dinosaurs as collected in user's album at once.
+    
+    Missing album items are inserted with one bulk INSERT that skips rows
+    which already exist, and uncollected items are flipped with one
+    conditional UPDATE. The collected counter and the token award are then
+    applied once for the whole batch, all in a single transaction.
+    
+    Args:
+        user: User object
+        dinosaur_ids: Iterable of Dinosaur primary keys (unknown ids are ignored)
+    
+    Returns:
+        Number of dinosaurs newly collected
+    """
+    dinosaur_ids = set(dinosaur_ids)
+    if not dinosaur_ids:
+        return 0
+    
+    with transaction.atomic():
+        existing = list(Dinosaur.objects.filter(pk__in=dinosaur_ids).order_by().values_list('pk', flat=True))
+        AlbumItem.objects.bulk_create(
+            [AlbumItem(user=user, dinosaur_id=pk) for pk in existing],
+            ignore_conflicts=True
+        )
+        collected = AlbumItem.objects.filter(
+            user=user, dinosaur_id__in=dinosaur_ids, is_collected=False
+        ).update(is_collected=True, collected_at=timezone.now())
+        
+        if collected:
+            profiles = UserProfile.objects.filter(user=user)
+            if not profiles.update(collected_count=F('collected_count') + collected):
+                get_or_create_user_profile(user)
+                profiles.update(collected_count=F('collected_count') + collected)
+            # Every existing id asked for is collected now, newly or before
+            add_to_album(user.pk, existing)
+            update_user_tokens(user, COLLECT_TOKEN_AWARD * collected, reason='collect')
+            # Bulk writes skip the AlbumItem signals
+            transaction.on_commit(lambda: bump_user_data_version(user.pk, 'album'))
+    return collected
+
+
+def collected_count_expression():
+    """
+    Expression computing a UserProfile's collected album items from scratch.
+    
+    Returns:
+        Expression usable in UserProfile.objects.annotate() or update()
+    """
+    collected = (
+        AlbumItem.objects
+        .filter(user=OuterRef('user'), is_collected=True)
+        .order_by()
+        .values('user')
+        .annotate(total=Count('pk'))
+        .values('total')
     )
+    return Coalesce(Subquery(collected, output_field=IntegerField()), Value(0))
+
+
+def fill_albums(user_ids, dinosaur_ids=None, batch_size=2000):
+    """
+    Pre-populate the albums of many users at once, e.g. for a classroom.
     
-    if not album_item.is_collected:
-        album_item.is_collected = True
-        album_item.collected_at = timezone.now()
-        album_item.save()
+    Album items are bulk inserted in batches, flipped with one UPDATE and
+    every affected profile's counter is recomputed with one UPDATE.
+    No tokens are awarded.
+    
+    Args:
+        user_ids: Iterable of User primary keys
+        dinosaur_ids: Dinosaur primary keys to collect (default: all)
+        batch_size: Rows per INSERT
+    
+    Returns:
+        Number of album items newly collected
+    """
+    user_ids = list(user_ids)
+    album_items = AlbumItem.objects.filter(user_id__in=user_ids, is_collected=False)
+    dinosaurs = Dinosaur.objects.order_by()
+    if dinosaur_ids is not None:
+        dinosaurs = dinosaurs.filter(pk__in=list(dinosaur_ids))
+        album_items = album_items.filter(dinosaur__in=dinosaurs)
+    dinosaur_ids = list(dinosaurs.values_list('pk', flat=True))
+    if not user_ids or not dinosaur_ids:
+        return 0
+    
+    with transaction.atomic():
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True
+        )
+        # bulk_create() materializes its input, so feed it one batch at a time
+        items = (
+            AlbumItem(user_id=user_id, dinosaur_id=dinosaur_id)
+            for user_id in user_ids
+            for dinosaur_id in dinosaur_ids
+        )
+        while batch := list(islice(items, batch_size)):
+            AlbumItem.objects.bulk_create(batch, ignore_conflicts=True)
         
-        # Award tokens for new discovery
-        update_user_tokens(user, 10)
+        collected = album_items.update(is_collected=True, collected_at=timezone.now())
+        
+        UserProfile.objects.filter(user_id__in=user_ids).update(
+            collected_count=collected_count_expression()
+        )
+        refresh_albums(user_ids)
+        
+        def bump_versions():
+            for user_id in user_ids:
+                bump_user_data_version(user_id, 'album')
+        transaction.on_commit(bump_versions)
+    return collected
+
+
+def _collected_ids_by_user(user_ids):
+    """Map each user id to the sorted ids of the dinosaurs they collected."""
+    collected = {user_id: [] for user_id in user_ids}
+    rows = AlbumItem.objects.filter(
+        user_id__in=user_ids, is_collected=True
+    ).order_by('user_id', 'dinosaur_id').values_list('user_id', 'dinosaur_id')
+    for user_id, dinosaur_id in rows:
+        collected[user_id].append(dinosaur_id)
+    return collected
+
+
+def refresh_albums(user_ids, create=True, batch_size=500):
+    """
+    Rebuild the UserAlbum read model of some users from their album items.
     
-    return album_item
+    Used where many items may have changed at once (fill_albums, deletes,
+    reconcile_progress); collecting uses add_to_album(). Write paths call
+    this inside their transaction, after the profile counter UPDATE has
+    locked the user's profile row, so two concurrent writers for one user
+    cannot overwrite each other's album.
+    
+    Args:
+        user_ids: Iterable of User primary keys
+        create: Insert missing albums; False only updates existing rows
+            (used from signals, where the user may be mid-deletion)
+        batch_size: Users per query
+    """
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        albums = _collected_ids_by_user(user_ids[start:start + batch_size])
+        if create:
+            UserAlbum.objects.bulk_create(
+                [UserAlbum(user_id=user_id, collected_ids=ids) for user_id, ids in albums.items()],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['collected_ids', 'updated_at']
+            )
+        else:
+            # One UPDATE for the batch; users without an album row are skipped
+            now = timezone.now()
+            UserAlbum.objects.bulk_update(
+                [UserAlbum(user_id=user_id, collected_ids=ids, updated_at=now) for user_id, ids in albums.items()],
+                ['collected_ids', 'updated_at']
+            )
+
+
+def add_to_album(user_id, dinosaur_ids):
+    """
+    Merge newly collected dinosaurs into a user's UserAlbum row.
+    
+    Reads and rewrites the one row instead of rebuilding it from every
+    album item, which refresh_albums() does (and still does here if the
+    user has no album row yet). Call it like refresh_albums(), after the
+    profile counter UPDATE has locked the user's profile row.
+    
+    Args:
+        user_id: User primary key
+        dinosaur_ids: Iterable of collected Dinosaur primary keys
+    """
+    ids = UserAlbum.objects.filter(user_id=user_id).values_list('collected_ids', flat=True).first()
+    if ids is None:
+        refresh_albums([user_id])
+        return
+    changed = False
+    for dinosaur_id in dinosaur_ids:
+        position = bisect.bisect_left(ids, dinosaur_id)
+        if position == len(ids) or ids[position] != dinosaur_id:
+            ids.insert(position, dinosaur_id)
+            changed = True
+    if changed:
+        UserAlbum.objects.filter(user_id=user_id).update(collected_ids=ids, updated_at=timezone.now())
+
+
+def get_collected_ids(user):
+    """
+    Get the ids of the dinosaurs a user has collected.
+    
+    Reads the user's UserAlbum row, building it from AlbumItem the first
+    time it is needed.
+    
+    Args:
+        user: User object
+    
+    Returns:
+        Set of Dinosaur primary keys
+    """
+    try:
+        return set(UserAlbum.objects.values_list('collected_ids', flat=True).get(user=user))
+    except UserAlbum.DoesNotExist:
+        ids = _collected_ids_by_user([user.pk])[user.pk]
+        # A concurrent writer's fresher row wins over this snapshot
+        UserAlbum.objects.bulk_create(
+            [UserAlbum(user_id=user.pk, collected_ids=ids)], ignore_conflicts=True
+        )
+        return set(ids)
+
+
+def get_album(user):
+    """
+    Build a user's full album, collected and missing dinosaurs by period.
+    
+    Merges the user's collected ids with the cached catalog, so the only
+    per-user query is the UserAlbum lookup.
+    
+    Args:
+        user: User object
+    
+    Returns:
+        List of dictionaries, one per period (oldest first), with the
+        period, its entries ({'dinosaur', 'collected'}) and counts
+    """
+    collected_ids = get_collected_ids(user)
+    album = []
+    for period, dinosaurs in get_album_catalog():
+        entries = [
+            {'dinosaur': dinosaur, 'collected': dinosaur.pk in collected_ids}
+            for dinosaur in dinosaurs
+        ]
+        album.append({
+            'period': period,
+            'entries': entries,
+            'collected': sum(entry['collected'] for entry in entries),
+            'total': len(entries),
+        })
+    return album
+
+
+def get_collected_items(user):
+    """
+    Get the dinosaurs a user has collected.
+    
+    Args:
+        user: User object
+    
+    Returns:
+        QuerySet of collected AlbumItem objects with their dinosaur and
+        period attached, most recently collected first
+    """
+    return AlbumItem.objects.filter(
+        user=user,
+        is_collected=True
+    ).select_related('dinosaur__period').order_by('-collected_at', '-id')
 
 
 def check_album_completion(user):
@@ -135,29 +663,131 @@ def check_album_completion(user):
     return progress['percentage'] >= 100
 
 
-def get_map_data():
+def get_map_data(user=None):
     """
     Prepare geological period data for map view.
     
+    Everything is computed by a single aggregate query over periods and
+    their dinosaurs, and cached per catalog version and user.
+    
+    Args:
+        user: User object, to include their collected count (optional)
+    
     Returns:
-        QuerySet of Period objects with dinosaur counts
+        List of dictionaries with the period, dinosaur count, per-diet
+        counts, the user's collected count and length/weight statistics
     """
-    periods = Period.objects.all()
-    map_data = []
+    user_id = user.pk if user is not None else None
+    cache_key = MAP_DATA_CACHE_KEY.format(
+        version=get_catalog_version(),
+        user_id=user_id,
+        album_version=get_user_data_version(user_id, 'album') if user_id else 0,
+    )
+    map_data = cache.get(cache_key)
+    if map_data is not None:
+        return map_data
     
-    for period in periods:
-        map_data.append({
-            'period': period,
-            'dinosaur_count': period.dinosaurs.count()
-        })
+    map_data = [_map_data_row(period) for period in _map_data_query(user_id)]
+    cache.set(cache_key, map_data, settings.VERSIONED_CACHE_TIMEOUT)
+    return map_data
+
+
+async def aget_map_data(user=None):
+    """get_map_data() for async views."""
+    user_id = user.pk if user is not None else None
+    cache_key = MAP_DATA_CACHE_KEY.format(
+        version=await aget_catalog_version(),
+        user_id=user_id,
+        album_version=await aget_user_data_version(user_id, 'album') if user_id else 0,
+    )
+    map_data = await cache.aget(cache_key)
+    if map_data is not None:
+        return map_data
     
+    map_data = [_map_data_row(period) async for period in _map_data_query(user_id)]
+    await cache.aset(cache_key, map_data, settings.VERSIONED_CACHE_TIMEOUT)
     return map_data
 
 
+def _map_data_query(user_id):
+    """Periods annotated with the map's counts and statistics."""
+    periods = Period.objects.annotate(
+        dinosaur_count=Count('dinosaurs'),
+        min_length=Min('dinosaurs__length_meters'),
+        max_length=Max('dinosaurs__length_meters'),
+        avg_length=Avg('dinosaurs__length_meters'),
+        min_weight=Min('dinosaurs__weight_kg'),
+        max_weight=Max('dinosaurs__weight_kg'),
+        avg_weight=Avg('dinosaurs__weight_kg'),
+        **{
+            f'{diet}_count': Count('dinosaurs', filter=Q(dinosaurs__diet=diet))
+            for diet, _ in Dinosaur.DIET_CHOICES
+        }
+    )
+    if user_id is not None:
+        # The join condition lives in ON, so it matches at most one album
+        # row per dinosaur and leaves the other aggregates untouched.
+        periods = periods.alias(
+            user_items=FilteredRelation(
+                'dinosaurs__albumitem',
+                condition=Q(
+                    dinosaurs__albumitem__user_id=user_id,
+                    dinosaurs__albumitem__is_collected=True,
+                ),
+            )
+        ).annotate(collected_count=Count('user_items'))
+    return periods
+
+
+def _map_data_row(period):
+    return {
+        'period': period,
+        'dinosaur_count': period.dinosaur_count,
+        'diet_counts': {diet: getattr(period, f'{diet}_count') for diet, _ in Dinosaur.DIET_CHOICES},
+        'collected_count': getattr(period, 'collected_count', None),
+        'length': {
+            'min': period.min_length,
+            'max': period.max_length,
+            'avg': period.avg_length,
+        },
+        'weight': {
+            'min': period.min_weight,
+            'max': period.max_weight,
+            'avg': period.avg_weight,
+        },
+    }
+
+
+def get_user_data_version(user_id, kind):
+    """
+    Get the version of one kind of per-user data ('album' or 'scores').
+    
+    Cache keys and ETags built from this version change whenever the
+    user's data of that kind changes (see bump_user_data_version).
+    
+    Returns:
+        Integer version number
+    """
+    return get_version(USER_VERSION_CACHE_KEY.format(user_id=user_id, kind=kind))
+
+
+async def aget_user_data_version(user_id, kind):
+    """get_user_data_version() for async code."""
+    return await aget_version(USER_VERSION_CACHE_KEY.format(user_id=user_id, kind=kind))
+
+
+def bump_user_data_version(user_id, kind):
+    """Invalidate cache entries and ETags built from a user's data version."""
+    bump_version(USER_VERSION_CACHE_KEY.format(user_id=user_id, kind=kind))
+
+
 def save_game_score(user, game_type, score):
     """
     Save a game score for a user.
     
+    Also updates the user's materialized best scores for the all-time,
+    weekly and daily leaderboards.
+    
     Args:
         user: User object
         game_type: Type of game ('puzzleaurus' or 'memodyn')
@@ -166,19 +796,73 @@ def save_game_score(user, game_type, score):
     Returns:
         GameScore object
     """
-    game_score = GameScore.objects.create(
-        user=user,
-        game_type=game_type,
-        score=score
-    )
-    
-    # Award tokens based on score
-    token_award = max(1, score // 10)
-    update_user_tokens(user, token_award)
+    with transaction.atomic():
+        game_score = GameScore.objects.create(
+            user=user,
+            game_type=game_type,
+            score=score
+        )
+        record_best_score(user.pk, game_type, score, game_score.completed_at)
+        record_score_rollups(score_rollup_totals([(user.pk, game_type, score, game_score.completed_at)]))
+        transaction.on_commit(lambda: bump_user_data_version(user.pk, 'scores'))
+        
+        update_user_tokens(user, game_token_award(score), reason='game')
     
     return game_score
 
 
+def save_game_scores_bulk(scores):
+    """
+    Save many game scores in one transaction (group commit).
+    
+    Used to apply buffered scores (see ingestion.py): one bulk INSERT for
+    the scores, one pass over the affected best scores, one rollup update
+    per user, game and window, and one aggregated token UPDATE for all
+    users, instead of a transaction per score.
+    
+    Args:
+        scores: Iterable of (user_id, game_type, score, completed_at)
+    
+    Returns:
+        List of created GameScore objects
+    """
+    scores = list(scores)
+    if not scores:
+        return []
+    
+    bests = {}
+    awards = defaultdict(int)
+    for user_id, game_type, score, completed_at in scores:
+        for scope, _ in BestScore.SCOPE_CHOICES:
+            key = (user_id, game_type, scope, leaderboard_window(scope, completed_at))
+            best = bests.get(key)
+            # Same tie-break as record_best_score(): the earlier score stays
+            if best is None or score > best[0] or (score == best[0] and completed_at < best[1]):
+                bests[key] = (score, completed_at)
+        awards[user_id] += game_token_award(score)
+    
+    with transaction.atomic():
+        game_scores = GameScore.objects.bulk_create([
+            GameScore(user_id=user_id, game_type=game_type, score=score, completed_at=completed_at)
+            for user_id, game_type, score, completed_at in scores
+        ])
+        record_best_scores(bests)
+        record_score_rollups(score_rollup_totals(scores))
+        award_tokens_bulk(awards, reason='game')
+        
+        def bump_versions():
+            for user_id in awards:
+                bump_user_data_version(user_id, 'scores')
+        transaction.on_commit(bump_versions)
+    
+    return game_scores
+
+
+def game_token_award(score):
+    """Tokens awarded for a game score."""
+    return max(1, score // 10)
+
+
 def get_user_high_scores(user, game_type=None):
     """
     Get user's high scores.
@@ -196,15 +880,430 @@ def get_user_high_scores(user, game_type=None):
     return scores.order_by('-score')[:10]
 
 
+async def aget_user_high_scores(user, game_type=None):
+    """get_user_high_scores() for async views, as a list."""
+    return [score async for score in get_user_high_scores(user, game_type)]
+
+
+def score_rollup_totals(scores):
+    """
+    Aggregate scores per daily and weekly rollup window.
+    
+    Args:
+        scores: Iterable of (user_id, game_type, score, completed_at)
+    
+    Returns:
+        Dictionary of (user_id, game_type, granularity, period_start) to
+        (count, total, best)
+    """
+    totals = {}
+    for user_id, game_type, score, completed_at in scores:
+        for granularity, _ in GameScoreRollup.GRANULARITY_CHOICES:
+            key = (user_id, game_type, granularity, leaderboard_window(granularity, completed_at))
+            count, total, best = totals.get(key, (0, 0, score))
+            totals[key] = (count + 1, total + score, max(best, score))
+    return totals
+
+
+def record_score_rollups(totals):
+    """
+    Add score totals to the daily and weekly rollups.
+    
+    Each window is a single conditional UPDATE with F() expressions, so
+    concurrent scores never lose increments.
+    
+    Args:
+        totals: Dictionary from score_rollup_totals()
+    """
+    for (user_id, game_type, granularity, period_start), (count, total, best) in totals.items():
+        lookup = {
+            'user_id': user_id,
+            'game_type': game_type,
+            'granularity': granularity,
+            'period_start': period_start,
+        }
+        rollups = GameScoreRollup.objects.filter(**lookup)
+        changes = {
+            'count': F('count') + count,
+            'total_score': F('total_score') + total,
+            'best_score': Greatest(F('best_score'), Value(best)),
+        }
+        if rollups.update(**changes):
+            continue
+        _, created = GameScoreRollup.objects.get_or_create(
+            **lookup,
+            defaults={'count': count, 'total_score': total, 'best_score': best}
+        )
+        if not created:
+            # Lost a race with a concurrent insert; add to the row it created
+            rollups.update(**changes)
+
+
+def get_user_game_stats(user):
+    """
+    Get a user's games played, average and best score per game.
+    
+    Read from the weekly rollups (never from raw scores) and cached until
+    the user's scores change.
+    
+    Args:
+        user: User object
+    
+    Returns:
+        List of dictionaries with game type, label, games, average and
+        best, in GameScore.GAME_TYPES order
+    """
+    cache_key = GAME_STATS_CACHE_KEY.format(
+        user_id=user.pk, version=get_user_data_version(user.pk, 'scores')
+    )
+    stats = cache.get(cache_key)
+    if stats is not None:
+        return stats
+    
+    stats = _game_stats(_game_totals(user))
+    cache.set(cache_key, stats, settings.VERSIONED_CACHE_TIMEOUT)
+    return stats
+
+
+async def aget_user_game_stats(user):
+    """get_user_game_stats() for async views."""
+    cache_key = GAME_STATS_CACHE_KEY.format(
+        user_id=user.pk, version=await aget_user_data_version(user.pk, 'scores')
+    )
+    stats = await cache.aget(cache_key)
+    if stats is not None:
+        return stats
+    
+    stats = _game_stats([row async for row in _game_totals(user)])
+    await cache.aset(cache_key, stats, settings.VERSIONED_CACHE_TIMEOUT)
+    return stats
+
+
+def _game_totals(user):
+    return (
+        GameScoreRollup.objects.filter(user=user, granularity='week')
+        .order_by()
+        .values('game_type')
+        .annotate(games=Sum('count'), total=Sum('total_score'), best=Max('best_score'))
+    )
+
+
+def _game_stats(rows):
+    totals = {row['game_type']: row for row in rows}
+    return [
+        {
+            'game_type': game_type,
+            'label': label,
+            'games': totals[game_type]['games'],
+            'average': round(totals[game_type]['total'] / totals[game_type]['games'], 1),
+            'best': totals[game_type]['best'],
+        }
+        for game_type, label in GameScore.GAME_TYPES
+        if game_type in totals and totals[game_type]['games']
+    ]
+
+
+def get_score_activity(days=30, game_type=None):
+    """
+    Get games played per day across all users, from the daily rollups.
+    
+    Args:
+        days: Number of days up to today
+        game_type: Optional game type filter
+    
+    Returns:
+        List of dictionaries with day, games, players, average and best,
+        oldest first
+    """
+    since = timezone.localdate() - datetime.timedelta(days=days - 1)
+    rollups = GameScoreRollup.objects.filter(granularity='day', period_start__gte=since)
+    if game_type:
+        rollups = rollups.filter(game_type=game_type)
+    rows = (
+        rollups.order_by('period_start')
+        .values('period_start')
+        .annotate(
+            games=Sum('count'),
+            players=Count('user_id', distinct=True),
+            total=Sum('total_score'),
+            best=Max('best_score'),
+        )
+    )
+    return [
+        {
+            'day': row['period_start'],
+            'games': row['games'],
+            'players': row['players'],
+            'average': round(row['total'] / row['games'], 1) if row['games'] else 0,
+            'best': row['best'],
+        }
+        for row in rows
+    ]
+
+
+def leaderboard_window(scope, when=None):
+    """
+    Get the first day of the leaderboard window containing a moment.
+    
+    Args:
+        scope: 'all', 'week' (starting Monday) or 'day'
+        when: Aware datetime (defaults to now)
+    
+    Returns:
+        Date used as BestScore.period_start
+    """
+    if scope == 'all':
+        return BestScore.ALL_TIME_START
+    day = timezone.localdate(when or timezone.now())
+    if scope == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+def record_best_score(user_id, game_type, score, achieved_at):
+    """
+    Raise the user's best scores for every leaderboard window if beaten.
+    
+    Args:
+        user_id: User primary key
+        game_type: Type of game
+        score: Score achieved
+        achieved_at: When the score was achieved
+    """
+    for scope, _ in BestScore.SCOPE_CHOICES:
+        lookup = {
+            'user_id': user_id,
+            'game_type': game_type,
+            'scope': scope,
+            'period_start': leaderboard_window(scope, achieved_at),
+        }
+        beaten = BestScore.objects.filter(**lookup, best_score__lt=score)
+        if beaten.update(best_score=score, achieved_at=achieved_at):
+            continue
+        entry, created = BestScore.objects.get_or_create(
+            **lookup,
+            defaults={'best_score': score, 'achieved_at': achieved_at}
+        )
+        if not created and entry.best_score < score:
+            # Lost a race with a concurrent insert; retry the conditional update
+            beaten.update(best_score=score, achieved_at=achieved_at)
+
+
+def record_best_scores(bests):
+    """
+    Raise many best scores at once, e.g. for a batch of buffered scores.
+    
+    Reads the affected entries in one query, then writes the beaten ones
+    with one bulk UPDATE and the missing ones with one bulk INSERT.
+    
+    Args:
+        bests: Mapping of (user_id, game_type, scope, period_start) to
+            (score, achieved_at), one per leaderboard entry
+    """
+    missing = dict(bests)
+    existing = BestScore.objects.select_for_update().filter(
+        user_id__in={user_id for user_id, _, _, _ in bests},
+        game_type__in={game_type for _, game_type, _, _ in bests},
+        period_start__in={period_start for _, _, _, period_start in bests},
+    ).order_by()
+    beaten = []
+    for entry in existing:
+        key = (entry.user_id, entry.game_type, entry.scope, entry.period_start)
+        if key not in missing:
+            continue
+        score, achieved_at = missing.pop(key)
+        if score > entry.best_score:
+            entry.best_score, entry.achieved_at = score, achieved_at
+            beaten.append(entry)
+    
+    BestScore.objects.bulk_update(beaten, ['best_score', 'achieved_at'], batch_size=500)
+    # An entry inserted concurrently by record_best_score() wins the
+    # conflict; rebuild_leaderboards repairs the rare higher score lost so.
+    BestScore.objects.bulk_create([
+        BestScore(
+            user_id=user_id,
+            game_type=game_type,
+            scope=scope,
+            period_start=period_start,
+            best_score=score,
+            achieved_at=achieved_at,
+        )
+        for (user_id, game_type, scope, period_start), (score, achieved_at) in missing.items()
+    ], batch_size=500, ignore_conflicts=True)
+
+
+def get_leaderboard(game_type, scope='all', limit=10):
+    """
+    Get the top players of a game for a leaderboard window.
+    
+    Args:
+        game_type: Type of game
+        scope: 'all', 'week' or 'day'
+        limit: Number of entries
+    
+    Returns:
+        List of BestScore objects with ``rank`` set, best first
+    """
+    entries = list(
+        BestScore.objects.filter(
+            game_type=game_type,
+            scope=scope,
+            period_start=leaderboard_window(scope)
+        ).select_related('user').order_by('-best_score', 'achieved_at')[:limit]
+    )
+    for rank, entry in enumerate(entries, start=1):
+        entry.rank = rank
+    return entries
+
+
+def get_user_rank(user, game_type, scope='all'):
+    """
+    Get a user's position on a leaderboard.
+    
+    Counts only the entries ranked above the user, using the leaderboard
+    index, rather than scanning every game score.
+    
+    Args:
+        user: User object
+        game_type: Type of game
+        scope: 'all', 'week' or 'day'
+    
+    Returns:
+        BestScore object with ``rank`` set, or None if the user has no
+        score in this window
+    """
+    board = BestScore.objects.filter(
+        game_type=game_type,
+        scope=scope,
+        period_start=leaderboard_window(scope)
+    )
+    entry = board.filter(user=user).first()
+    if entry is None:
+        return None
+    entry.rank = board.filter(
+        Q(best_score__gt=entry.best_score)
+        | Q(best_score=entry.best_score, achieved_at__lt=entry.achieved_at)
+    ).count() + 1
+    return entry
+
+
+def get_personal_bests(user):
+    """
+    Get a user's all-time best score for each game.
+    
+    Args:
+        user: User object
+    
+    Returns:
+        Dictionary of game type to BestScore object
+    """
+    return {
+        entry.game_type: entry
+        for entry in BestScore.objects.filter(user=user, scope='all').order_by()
+    }
+
+
+async def aget_personal_bests(user):
+    """get_personal_bests() for async views."""
+    return {
+        entry.game_type: entry
+        async for entry in BestScore.objects.filter(user=user, scope='all').order_by()
+    }
+
+
 def get_or_create_user_profile(user):
     """
     Get or create user profile.
     
+    Profiles are created by a post_save signal on User and request.user
+    arrives with its profile already joined (see backends.py), so this
+    normally costs no query. The database is only hit for users whose
+    profile was not loaded, or is missing.
+    
     Args:
         user: User object
     
     Returns:
         UserProfile object
     """
-    profile, created = UserProfile.objects.get_or_create(user=user)
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        profile, created = UserProfile.objects.get_or_create(user=user)
+        user.profile = profile
+        return profile
+
+
+async def aget_or_create_user_profile(user):
+    """get_or_create_user_profile() for async views."""
+    if User.profile.is_cached(user):
+        try:
+            return user.profile
+        except UserProfile.DoesNotExist:
+            pass  # Joined, but missing
+    profile, created = await UserProfile.objects.aget_or_create(user=user)
+    user.profile = profile
     return profile
+
+
+def create_guest_user():
+    """
+    Create the ephemeral account of one guest visitor.
+    
+    Every guest gets an account of their own, so guests never share an
+    album, tokens or a session. The password is unusable: nothing is
+    hashed, and the account cannot be logged into again once its session
+    ends. reap_guests deletes it after settings.GUEST_ACCOUNT_TTL_HOURS.
+    
+    Returns:
+        New User object, with its profile
+    """
+    user = User(username=GUEST_USERNAME_PREFIX + secrets.token_hex(6))
+    user.set_unusable_password()
+    with transaction.atomic():
+        user.save()  # The profile is created by the post_save signal
+    return user
+
+
+def guest_expires_at(user):
+    """
+    When a guest account expires, and with it the guest's session.
+    
+    Args:
+        user: Guest User object
+    
+    Returns:
+        Aware datetime
+    """
+    return user.date_joined + datetime.timedelta(hours=settings.GUEST_ACCOUNT_TTL_HOURS)
+
+
+def is_guest(user):
+    """
+    Check whether a user is an ephemeral guest account.
+    
+    Args:
+        user: User object
+    
+    Returns:
+        Boolean
+    """
+    return user.username.startswith(GUEST_USERNAME_PREFIX) and not user.has_usable_password()
+
+
+def get_expired_guests(now=None):
+    """
+    Get the guest accounts past their expiry.
+    
+    Args:
+        now: Reference time (defaults to now)
+    
+    Returns:
+        QuerySet of User objects
+    """
+    cutoff = (now or timezone.now()) - datetime.timedelta(hours=settings.GUEST_ACCOUNT_TTL_HOURS)
+    return User.objects.filter(
+        username__startswith=GUEST_USERNAME_PREFIX,
+        password__startswith=UNUSABLE_PASSWORD_PREFIX,
+        date_joined__lt=cutoff,
+    )
@@ -0,0 +1,113 @@
+"""
+Signal handlers for the encyclopedia app.
+Keeps denormalized counters and caches in sync with model changes.
+"""
+import threading
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .models import AlbumItem, Dinosaur, Period, UserProfile
+from . import catalog, images, search, services
+
+_local = threading.local()
+
+
+@receiver(post_save, sender=User)
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    """Give every new user a profile, so views never have to create one."""
+    if created and not raw:
+        UserProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Dinosaur)
+@receiver(post_delete, sender=Dinosaur)
+@receiver(post_save, sender=Period)
+@receiver(post_delete, sender=Period)
+def catalog_changed(sender, instance, **kwargs):
+    """Invalidate catalog-derived caches when a period or dinosaur changes."""
+    catalog.bump_catalog_version()
+    # Bump again on commit so readers that cached the old rows under the
+    # new version while the transaction was open are invalidated too.
+    transaction.on_commit(catalog.bump_catalog_version)
+
+
+@receiver(post_save, sender=Dinosaur)
+def dinosaur_image_saved(sender, instance, raw=False, **kwargs):
+    """Build responsive copies of a new or replaced dinosaur image."""
+    if not raw:
+        images.schedule_derivatives(instance, 'image')
+
+
+@receiver(post_save, sender=UserProfile)
+def avatar_saved(sender, instance, raw=False, **kwargs):
+    """Build responsive copies of a new or replaced avatar."""
+    if not raw:
+        images.schedule_derivatives(instance, 'avatar')
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Invalidate progress caches when a profile's counters are edited directly."""
+    if raw:
+        return
+    # Saves of other fields (an avatar upload) leave the progress as it was
+    if update_fields is None or 'collected_count' in update_fields:
+        services.bump_user_data_version(instance.user_id, 'album')
+
+
+@receiver(post_save, sender=AlbumItem)
+def album_item_saved(sender, instance, created, **kwargs):
+    """Invalidate the owner's album-derived caches when an item changes."""
+    # A new, uncollected item (collect_dinosaur's get_or_create) changes nothing yet
+    if not created or instance.is_collected:
+        services.refresh_albums([instance.user_id], create=False)
+    services.bump_user_data_version(instance.user_id, 'album')
+
+
+@receiver(post_delete, sender=AlbumItem)
+def album_item_deleted(sender, instance, origin=None, **kwargs):
+    """Keep the profile's collected counter and album in step with deleted items."""
+    if _is_user_delete(origin):
+        return  # The profile and album go with the user
+    if instance.is_collected:
+        UserProfile.objects.filter(
+            user_id=instance.user_id, collected_count__gt=0
+        ).update(collected_count=F('collected_count') - 1)
+    # One delete can remove many items of one user (a period with its
+    # dinosaurs, a queryset): rebuild each owner's album once, on commit.
+    # Registered per item, as a rolled-back transaction drops its callbacks;
+    # the owners it left pending just get an extra refresh with the next one.
+    if not hasattr(_local, 'deleted_item_owners'):
+        _local.deleted_item_owners = set()
+    _local.deleted_item_owners.add(instance.user_id)
+    transaction.on_commit(_refresh_deleted_item_owners)
+
+
+def _refresh_deleted_item_owners():
+    """Rebuild the albums of the users whose items were deleted, once each."""
+    user_ids = getattr(_local, 'deleted_item_owners', None)
+    if not user_ids:
+        return
+    _local.deleted_item_owners = set()
+    with transaction.atomic():
+        # Lock the profiles first, like the write paths (see refresh_albums)
+        list(UserProfile.objects.select_for_update().filter(user_id__in=user_ids).values_list('pk', flat=True))
+        services.refresh_albums(user_ids, create=False)
+    for user_id in user_ids:
+        services.bump_user_data_version(user_id, 'album')
+
+
+def _is_user_delete(origin):
+    """Whether a delete started from users (a User or a User queryset)."""
+    return isinstance(origin, User) or getattr(origin, 'model', None) is User
+
+
+@receiver(post_migrate)
+def reinstall_search_triggers(sender, using, **kwargs):
+    """Restore FTS sync triggers dropped when SQLite rebuilt the dinosaur table."""
+    if sender.name == 'encyclopedia':
+        search.install_sqlite_triggers(using)
@@ -0,0 +1,225 @@
+"""
+Production static file pipeline.
+
+CompressedManifestStaticFilesStorage extends Django's manifest storage
+(content-hashed file names) by writing ``.gz`` and ``.br`` copies of
+compressible files during collectstatic.
+
+StaticFilesMiddleware serves STATIC_ROOT from the application process:
+it indexes the collected files once at startup, picks the best
+precompressed variant the client accepts and marks hashed files as
+immutable so browsers and CDNs cache them for a year. Every variant has
+an ETag of its own, so a cache never revalidates one encoding against
+another.
+"""
+import gzip
+import json
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import brotli
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml',
+    '.ico', '.ttf', '.otf', '.eot', '.wasm',
+}
+# Keep a compressed copy only if it is at least this much smaller
+MIN_COMPRESSION_RATIO = 0.95
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+DEFAULT_MAX_AGE = 60
+
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def compress(data):
+    """
+    Compress one file's bytes with every encoding.
+
+    Returns:
+        Dictionary of file suffix ('.gz', '.br') to compressed bytes, only
+        for encodings that actually save space
+    """
+    variants = {
+        '.gz': gzip.compress(data, compresslevel=9, mtime=0),
+        '.br': brotli.compress(data, quality=11),
+    }
+    return {
+        suffix: payload for suffix, payload in variants.items()
+        if len(payload) < len(data) * MIN_COMPRESSION_RATIO
+    }
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes precompressed copies of text assets."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            with self.open(name) as handle:
+                data = handle.read()
+            for suffix, payload in compress(data).items():
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(payload))
+                yield name, name + suffix, True
+
+
+@dataclass
+class StaticFile:
+    """One collected file and its precompressed variants."""
+    path: str
+    size: int
+    mtime: float
+    content_type: str
+    immutable: bool
+    variants: dict = field(default_factory=dict)  # encoding -> (path, size, etag)
+
+    @property
+    def etag(self):
+        return f'"{int(self.mtime):x}-{self.size:x}"'
+
+
+def accepted_encodings(header):
+    """Encodings named in an Accept-Encoding header, excluding q=0 ones."""
+    accepted = set()
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def index_static_root(root, manifest_name='staticfiles.json'):
+    """
+    Index every file under STATIC_ROOT by its URL path relative to STATIC_URL.
+
+    Returns:
+        Dictionary of relative URL path to StaticFile
+    """
+    if not root or not os.path.isdir(root):
+        return {}
+
+    immutable = set()
+    manifest_path = os.path.join(root, manifest_name)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as handle:
+            immutable = set(json.load(handle).get('paths', {}).values())
+
+    files = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if name.endswith(('.gz', '.br')) or name == manifest_name:
+                continue
+            stat = os.stat(path)
+            static_file = StaticFile(
+                path=path,
+                size=stat.st_size,
+                mtime=stat.st_mtime,
+                content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                immutable=name in immutable,
+            )
+            for encoding, suffix in ENCODINGS:
+                if os.path.exists(path + suffix):
+                    # "<mtime>-<size>-gz": the bytes differ, so the tag must too
+                    etag = f'{static_file.etag[:-1]}-{suffix[1:]}"'
+                    static_file.variants[encoding] = (path + suffix, os.path.getsize(path + suffix), etag)
+            files[name] = static_file
+    return files
+
+
+class StaticFilesMiddleware:
+    """
+    Serve collected static files before the rest of the middleware stack.
+
+    Only files present in STATIC_ROOT when the process starts are served;
+    anything else falls through to the normal URL routing. In development
+    (no collectstatic), runserver's own static handler takes over.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        static_url = settings.STATIC_URL or ''
+        # A CDN or other absolute STATIC_URL is not ours to serve
+        self.prefix = None if urlsplit(static_url).netloc else '/' + static_url.lstrip('/')
+        self.files = index_static_root(settings.STATIC_ROOT) if self.prefix else {}
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.match(request)
+        if static_file is not None:
+            return self.serve(request, static_file)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = self.match(request)
+        if static_file is not None:
+            return self.serve(request, static_file)
+        return await self.get_response(request)
+
+    def match(self, request):
+        if self.files and request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            return self.files.get(request.path_info[len(self.prefix):])
+        return None
+
+    def serve(self, request, static_file):
+        headers = {
+            'Cache-Control': (
+                f'public, max-age={IMMUTABLE_MAX_AGE}, immutable' if static_file.immutable
+                else f'public, max-age={DEFAULT_MAX_AGE}'
+            ),
+            'Last-Modified': http_date(static_file.mtime),
+        }
+        if static_file.variants:
+            headers['Vary'] = 'Accept-Encoding'
+
+        path, size, etag = static_file.path, static_file.size, static_file.etag
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        for encoding, _ in ENCODINGS:
+            if encoding in accepted and encoding in static_file.variants:
+                path, size, etag = static_file.variants[encoding]
+                headers['Content-Encoding'] = encoding
+                break
+        headers['ETag'] = etag
+
+        # Weak comparison, as RFC 9110 asks for If-None-Match
+        if_none_match = {
+            tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))
+        }
+        if etag in if_none_match or '*' in if_none_match:
+            headers.pop('Content-Encoding', None)
+            return HttpResponseNotModified(headers=headers)
+        headers['Content-Length'] = str(size)
+
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=static_file.content_type, headers=headers)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            # Static assets are displayed, not downloaded
+            response.headers.pop('Content-Disposition', None)
+            for name, value in headers.items():
+                response[name] = value
+        return response
@@ -0,0 +1,78 @@
+"""
+Template fragment caching keyed on data versions.
+
+    {% load fragments %}
+    {% catalogcache 'dinosaur-card' dinosaur.pk %} ... {% endcatalogcache %}
+    {% usercache 'home-progress' 'album' %} ... {% endusercache %}
+
+Like Django's ``{% cache %}``, but the key always embeds the catalog
+version and, for ``usercache``, the current user and their data version
+of the given kind ('album' or 'scores'). Model signals bump those
+versions (see signals.py), so a cached fragment is never served after the
+data it shows has changed; stale entries simply age out. Fragments
+expire after settings.VERSIONED_CACHE_TIMEOUT, which bounds how stale
+they get when the cache is per process (see catalog.py). Extra arguments
+after the fragment name are added to the key, as with ``{% cache %}``.
+"""
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from .. import services
+from ..catalog import get_catalog_version
+
+register = template.Library()
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, vary_on, user_kind=None):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.user_kind = user_kind
+
+    def render(self, context):
+        fragment_name = self.fragment_name.resolve(context)
+        vary_on = [get_catalog_version()]
+        if self.user_kind is not None:
+            user = context.get('user')
+            if user is None or not user.is_authenticated:
+                return self.nodelist.render(context)
+            kind = self.user_kind.resolve(context)
+            vary_on += [user.pk, services.get_user_data_version(user.pk, kind)]
+        vary_on += [var.resolve(context) for var in self.vary_on]
+
+        key = make_template_fragment_key(fragment_name, vary_on)
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, settings.VERSIONED_CACHE_TIMEOUT)
+        return value
+
+
+def _parse(parser, token, user_scoped):
+    bits = token.split_contents()
+    tag_name, arguments = bits[0], bits[1:]
+    required = 2 if user_scoped else 1
+    if len(arguments) < required:
+        usage = "'fragment name' 'data kind'" if user_scoped else "'fragment name'"
+        raise template.TemplateSyntaxError(f"'{tag_name}' tag requires at least {usage}.")
+    nodelist = parser.parse((f'end{tag_name}',))
+    parser.delete_first_token()
+
+    variables = [parser.compile_filter(argument) for argument in arguments]
+    if user_scoped:
+        return VersionedCacheNode(nodelist, variables[0], variables[2:], user_kind=variables[1])
+    return VersionedCacheNode(nodelist, variables[0], variables[1:])
+
+
+@register.tag
+def catalogcache(parser, token):
+    """Cache a fragment of catalog data shared by every user."""
+    return _parse(parser, token, user_scoped=False)
+
+
+@register.tag
+def usercache(parser, token):
+    """Cache a fragment of one user's data; anonymous users are not cached."""
+    return _parse(parser, token, user_scoped=True)
@@ -0,0 +1,46 @@
+"""
+Template tags for responsive images.
+
+    {% load images %}
+    {% picture dinosaur 'image' sizes='(min-width: 768px) 33vw, 100vw' class='card-img-top' alt=dinosaur.name %}
+
+renders a <picture> with one <source srcset> per derivative format and
+the original upload as the <img> fallback.
+"""
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from .. import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(instance, field_name, sizes='100vw', **attrs):
+    """
+    Render a responsive <picture> for an ImageField, or '' if it is empty.
+
+    Args:
+        instance: Model instance with ``<field_name>`` and ``<field_name>_derivatives``
+        field_name: Name of the ImageField
+        sizes: The sizes attribute for the browser's srcset choice
+        **attrs: Extra <img> attributes (class, alt, width, height, ...)
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return ''
+    derivatives = getattr(instance, f'{field_name}_derivatives', None) or {}
+    sources = [
+        (f'image/{fmt}', srcset, sizes)
+        for fmt in images.FORMATS
+        if (srcset := images.srcset(derivatives, fmt))
+    ]
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    return format_html(
+        '<picture>{}<img src="{}"{}></picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', sources),
+        field_file.url,
+        flatatt(attrs),
+    )
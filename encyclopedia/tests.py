@@ -1,3 +1,1525 @@
-from django.test import TestCase
+import base64
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.db.models.signals import pre_save
+from django.http import HttpResponse
+from django.template import Template, TemplateSyntaxError
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import benchmarks, catalog, hashers, images, importer, ingestion, search, services
+from .db_backends.sqlite3.base import DatabaseWrapper as SQLiteTunedWrapper
+from .instrumentation import QueryBudgetMixin, QueryPlanMixin, capture_queries, sql_shape
+from .models import (
+    AlbumItem, BestScore, Dinosaur, GameScore, GameScoreRollup, Period, TokenTransaction, UserAlbum,
+    UserProfile
+)
+from .staticfiles import StaticFilesMiddleware
+
+
+def create_catalog():
+    """Three periods with two dinosaurs each."""
+    dinosaurs = []
+    for name, start, end in [('triassic', 252, 201), ('jurassic', 201, 145), ('cretaceous', 145, 66)]:
+        period = Period.objects.create(name=name, start_mya=start, end_mya=end)
+        for diet in ('herbivore', 'carnivore'):
+            dinosaurs.append(Dinosaur.objects.create(
+                name=f'{name.title()} {diet}',
+                period=period,
+                diet=diet,
+                length_meters=5,
+                weight_kg=500,
+                description=f'A {diet} from the {name}.',
+            ))
+    return dinosaurs
+
+
+class TokenLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='rex', password='pw')
+
+    def test_update_creates_profile_and_ledger_entry(self):
+        self.assertEqual(services.update_user_tokens(self.user, 50, reason='welcome'), 50)
+        entry = TokenTransaction.objects.get(user=self.user)
+        self.assertEqual((entry.amount, entry.balance_after, entry.reason), (50, 50, 'welcome'))
+
+    def test_balance_never_goes_negative(self):
+        services.update_user_tokens(self.user, 5)
+        self.assertEqual(services.update_user_tokens(self.user, -20), 0)
+
+    def test_bulk_award(self):
+        other = User.objects.create_user(username='trike', password='pw')
+        services.update_user_tokens(self.user, 10)
+        updated = services.award_tokens_bulk({self.user.id: 5, other.id: 7}, reason='game')
+        self.assertEqual(updated, 2)
+        tokens = dict(UserProfile.objects.values_list('user_id', 'tokens'))
+        self.assertEqual(tokens, {self.user.id: 15, other.id: 7})
+        self.assertEqual(TokenTransaction.objects.filter(reason='game').count(), 2)
+
+
+class TokenConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    AWARDS_PER_THREAD = 25
+
+    def test_concurrent_awards_are_not_lost(self):
+        user = User.objects.create_user(username='raptor', password='pw')
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(self.AWARDS_PER_THREAD):
+                    services.update_user_tokens(user, 1, reason='game')
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        expected = self.THREADS * self.AWARDS_PER_THREAD
+        self.assertEqual(UserProfile.objects.get(user=user).tokens, expected)
+        self.assertEqual(TokenTransaction.objects.filter(user=user).count(), expected)
+
+
+class WriteBehindScoreTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='raptor', password='pw')
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir, ignore_errors=True)
+        settings = override_settings(
+            SCORE_WRITE_BEHIND=True,
+            SCORE_FLUSH_INTERVAL=0,
+            SCORE_JOURNAL_PATH=os.path.join(journal_dir, 'journal.sqlite3'),
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_buffered_score_is_applied_after_commit(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('puzzleaurus'), {'score': 120})
+        self.assertRedirects(response, reverse('puzzleaurus'))
+        self.assertEqual(GameScore.objects.get(user=self.user).score, 120)
+        self.assertEqual(UserProfile.objects.get(user=self.user).tokens, 12)
+        self.assertEqual(services.get_personal_bests(self.user)['puzzleaurus'].best_score, 120)
+
+    def test_bulk_save_matches_one_by_one(self):
+        other = User.objects.create_user(username='trike', password='pw')
+        scores = [(self.user, 'memodyn', 80), (other, 'memodyn', 80), (self.user, 'memodyn', 150),
+                  (self.user, 'puzzleaurus', 5), (self.user, 'memodyn', 120)]
+        for user, game_type, score in scores:
+            services.save_game_score(user, game_type, score)
+        expected_tokens = dict(UserProfile.objects.values_list('user_id', 'tokens'))
+        expected_bests = set(BestScore.objects.values_list('user_id', 'game_type', 'scope', 'best_score'))
+
+        BestScore.objects.all().delete()
+        UserProfile.objects.update(tokens=0)
+        services.save_game_scores_bulk(
+            (user.pk, game_type, score, timezone.now()) for user, game_type, score in scores
+        )
+        self.assertEqual(dict(UserProfile.objects.values_list('user_id', 'tokens')), expected_tokens)
+        self.assertEqual(
+            set(BestScore.objects.values_list('user_id', 'game_type', 'scope', 'best_score')),
+            expected_bests,
+        )
+
+    def test_replayed_entries_are_applied_once(self):
+        for score in (10, 20, 30):
+            ingestion.enqueue_score(self.user.pk, 'memodyn', score)
+        # Inside the test transaction flush() keeps the entries, as if the
+        # process had crashed right after committing the batch
+        self.assertEqual(ingestion.flush(batch_size=2), 3)
+        self.assertEqual(ingestion.pending_count(), 3)
+        ingestion.flush()
+        self.assertEqual(GameScore.objects.filter(user=self.user).count(), 3)
+
+    def test_out_of_range_scores_are_refused(self):
+        for score in (-1, ingestion.MAX_SCORE + 1):
+            with self.assertRaises(ValueError):
+                ingestion.enqueue_score(self.user.pk, 'memodyn', score)
+        self.assertEqual(ingestion.pending_count(), 0)
+        self.client.force_login(self.user)
+        self.client.post(reverse('memodyn'), {'score': -50})
+        self.assertFalse(GameScore.objects.exists())
+
+    def test_entry_that_cannot_be_applied_is_quarantined(self):
+        ingestion.enqueue_score(self.user.pk, 'memodyn', 10)
+        ingestion._journal().execute(
+            "INSERT INTO entries (user_id, game_type, score, completed_at) VALUES (?, 'memodyn', 5, 'never')",
+            (self.user.pk,),
+        )
+        ingestion.enqueue_score(self.user.pk, 'memodyn', 30)
+        with self.assertLogs('encyclopedia.ingestion', 'ERROR'):
+            self.assertEqual(ingestion.flush(), 3)
+        self.assertEqual(sorted(GameScore.objects.values_list('score', flat=True)), [10, 30])
+        self.assertEqual(ingestion.quarantined_count(), 1)
+        # Replaying the batch skips it rather than quarantining it twice
+        ingestion.flush()
+        self.assertEqual(ingestion.quarantined_count(), 1)
+
+    def test_scores_of_deleted_users_are_dropped(self):
+        ingestion.enqueue_score(self.user.pk, 'memodyn', 10)
+        self.user.delete()
+        ingestion.flush()
+        self.assertFalse(GameScore.objects.exists())
+
+
+class ScoreRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='raptor', password='pw')
+
+    def rollups(self, granularity):
+        return list(
+            GameScoreRollup.objects.filter(granularity=granularity)
+            .values_list('game_type', 'count', 'total_score', 'best_score')
+        )
+
+    def test_saved_scores_update_rollups(self):
+        services.save_game_score(self.user, 'memodyn', 80)
+        services.save_game_score(self.user, 'memodyn', 150)
+        services.save_game_scores_bulk([(self.user.pk, 'memodyn', 100, timezone.now())])
+        self.assertEqual(self.rollups('day'), [('memodyn', 3, 330, 150)])
+        self.assertEqual(self.rollups('week'), [('memodyn', 3, 330, 150)])
+        self.assertEqual(
+            services.get_user_game_stats(self.user),
+            [{'game_type': 'memodyn', 'label': 'Memodyn', 'games': 3, 'average': 110.0, 'best': 150}],
+        )
+
+    def test_compaction_prunes_old_scores_but_keeps_their_rollups(self):
+        old = timezone.now() - datetime.timedelta(days=400)
+        # Inserted around services.py, so only compaction rolls it up
+        GameScore.objects.create(user=self.user, game_type='puzzleaurus', score=300, completed_at=old)
+        services.record_best_score(self.user.pk, 'puzzleaurus', 300, old)
+        services.save_game_score(self.user, 'puzzleaurus', 50)
+        call_command('compact_scores', retention_days=365, stdout=StringIO())
+
+        self.assertEqual(list(GameScore.objects.values_list('score', flat=True)), [50])
+        self.assertEqual(sorted(self.rollups('week')), [('puzzleaurus', 1, 50, 50), ('puzzleaurus', 1, 300, 300)])
+        self.assertEqual(services.get_user_game_stats(self.user)[0]['games'], 2)
+        # Only the current windows' daily and weekly bests are left
+        self.assertEqual(BestScore.objects.filter(best_score=300).get().scope, 'all')
+        self.assertEqual(BestScore.objects.filter(best_score=50).count(), 2)
+
+        call_command('rebuild_leaderboards', stdout=StringIO())
+        self.assertEqual(services.get_personal_bests(self.user)['puzzleaurus'].best_score, 300)
+
+    def test_admin_charts_activity_from_rollups(self):
+        services.save_game_score(self.user, 'memodyn', 80)
+        admin_user = User.objects.create_superuser(username='admin', password='pw')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:encyclopedia_gamescorerollup_changelist'))
+        self.assertContains(response, 'Games played per day')
+        self.assertEqual(response.context['activity'][0]['games'], 1)
+
+
+class QueryInstrumentationTests(TestCase):
+    def test_sql_shape_ignores_values(self):
+        self.assertEqual(
+            sql_shape("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'rex' LIMIT 21"),
+            sql_shape("SELECT * FROM t WHERE id IN (%s) AND name = 'trike' LIMIT 21"),
+        )
+
+    def test_capture_reports_duplicates(self):
+        user = User.objects.create_user(username='rex', password='pw')
+        with capture_queries() as stats:
+            for _ in range(3):
+                UserProfile.objects.filter(user=user).exists()
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(list(stats.duplicates().values()), [3])
+
+
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dinosaurs = create_catalog()
+        self.user = User.objects.create_user(username='rex', password='pw')
+        services.collect_dinosaur(self.user, self.dinosaurs[0])
+        services.save_game_score(self.user, 'puzzleaurus', 120)
+        self.client.force_login(self.user)
+
+    def test_pages_stay_within_budget(self):
+        urls = [
+            reverse('home'),
+            reverse('map'),
+            reverse('gallery'),
+            reverse('gallery') + '?period=jurassic&diet=carnivore&search=jur',
+            reverse('gallery_suggest') + '?q=tri',
+            reverse('dinosaur_detail', args=[self.dinosaurs[1].pk]),
+            reverse('album'),
+            reverse('library'),
+            reverse('profile'),
+            reverse('puzzleaurus'),
+            reverse('memodyn'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinQueryBudget(response)
+
+    def test_admin_profile_changelist_is_not_n_plus_one(self):
+        for i in range(10):
+            User.objects.create_user(username=f'kid{i}')
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:encyclopedia_userprofile_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(response.wsgi_request.query_stats.duplicates(threshold=3), {})
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog.reset_cache_stats()
+        self.dinosaurs = create_catalog()
+
+    def test_periods_are_served_from_cache(self):
+        catalog.get_periods()
+        with self.assertNumQueries(0):
+            periods = catalog.get_periods()
+        self.assertEqual([p.name for p in periods], ['triassic', 'jurassic', 'cretaceous'])
+        stats = catalog.get_cache_stats()
+        self.assertEqual((stats['misses'], stats['local_hits']), (1, 1))
+
+    def test_saving_a_dinosaur_invalidates_the_catalog(self):
+        dinosaur = self.dinosaurs[0]
+        self.assertEqual(catalog.get_dinosaur(dinosaur.pk).name, dinosaur.name)
+        self.assertEqual(catalog.get_catalog_size(), 6)
+        dinosaur.name = 'Renamed'
+        dinosaur.save()
+        Dinosaur.objects.filter(pk=self.dinosaurs[1].pk).delete()
+        self.assertEqual(catalog.get_dinosaur(dinosaur.pk).name, 'Renamed')
+        self.assertIsNone(catalog.get_dinosaur(self.dinosaurs[1].pk))
+        self.assertEqual(catalog.get_catalog_size(), 5)
+
+    @override_settings(VERSIONED_CACHE_TIMEOUT=0)
+    def test_entries_expire_without_a_version_bump(self):
+        # A per-process cache never sees another process's bump; expiry
+        # bounds how long such a process serves the old catalog.
+        catalog.get_periods()
+        Period.objects.filter(name='triassic').update(description='Renamed')
+        periods = catalog.get_periods()
+        self.assertEqual(periods[0].description, 'Renamed')
+        self.assertEqual(catalog.get_cache_stats()['misses'], 2)
+
+
+class ProgressCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dinosaurs = create_catalog()
+        self.user = User.objects.create_user(username='rex', password='pw')
+
+    def collected(self, user):
+        # A fresh user, not one with a stale profile cached on it
+        return services.get_user_progress(User.objects.get(pk=user.pk))['collected']
+
+    def test_collecting_twice_counts_once(self):
+        services.collect_dinosaur(self.user, self.dinosaurs[0])
+        services.collect_dinosaur(self.user, self.dinosaurs[0])
+        self.client.force_login(self.user)
+        self.client.post(reverse('dinosaur_detail', args=[self.dinosaurs[0].pk]), {'collect': '1'})
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.collected_count, 1)
+        self.assertEqual(profile.tokens, services.COLLECT_TOKEN_AWARD)
+        self.assertEqual(AlbumItem.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(self.collected(self.user), 1)
+
+    def test_only_counter_saves_invalidate_progress(self):
+        profile = UserProfile.objects.get(user=self.user)
+        version = services.get_user_data_version(self.user.pk, 'album')
+        profile.save(update_fields=['avatar', 'updated_at'])
+        self.assertEqual(services.get_user_data_version(self.user.pk, 'album'), version)
+        profile.collected_count = 2
+        profile.save()
+        self.assertNotEqual(services.get_user_data_version(self.user.pk, 'album'), version)
+
+    def test_reconcile_progress_repairs_drifted_counters(self):
+        other = User.objects.create_user(username='kid', password='pw')
+        services.collect_dinosaurs(self.user, [d.pk for d in self.dinosaurs[:3]])
+        services.collect_dinosaur(other, self.dinosaurs[0])
+        self.assertEqual(self.collected(self.user), 3)
+        # Writes that bypass the services (and their signals) let the counters drift
+        UserProfile.objects.filter(user=self.user).update(collected_count=5)
+        UserProfile.objects.filter(user=other).update(collected_count=0)
+
+        out = StringIO()
+        call_command('reconcile_progress', '--dry-run', stdout=out)
+        self.assertIn('rex: 5 -> 3', out.getvalue())
+        self.assertIn('kid: 0 -> 1', out.getvalue())
+        self.assertEqual(UserProfile.objects.get(user=self.user).collected_count, 5)
+
+        version = services.get_user_data_version(self.user.pk, 'album')
+        call_command('reconcile_progress', stdout=StringIO())
+        counts = dict(UserProfile.objects.values_list('user__username', 'collected_count'))
+        self.assertEqual(counts, {'rex': 3, 'kid': 1})
+        self.assertEqual(self.collected(self.user), 3)
+        self.assertEqual(self.collected(other), 1)
+        # Pages cached from the drifted counter are invalidated
+        self.assertGreater(services.get_user_data_version(self.user.pk, 'album'), version)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        period = Period.objects.create(name='cretaceous', start_mya=145, end_mya=66)
+
+        def create(name, description, **fields):
+            return Dinosaur.objects.create(
+                name=name, period=period, diet='carnivore', length_meters=5, weight_kg=500,
+                description=description, **fields
+            )
+
+        self.tyrannosaurus = create(
+            'Tyrannosaurus', 'The tyrant lizard king.', scientific_name='Tyrannosaurus rex'
+        )
+        self.albertosaurus = create(
+            'Albertosaurus', 'A smaller cousin of Tyrannosaurus, and <b>faster</b>.'
+        )
+        self.triceratops = create('Triceratops', 'A three-horned plant eater.')
+        self.client.force_login(User.objects.create_user(username='rex', password='pw'))
+
+    def names(self, dinosaurs):
+        return [dinosaur.name for dinosaur in dinosaurs]
+
+    def test_name_match_ranks_above_description_match(self):
+        results = services.search_dinosaurs('tyrannosaurus')
+        self.assertEqual(self.names(results), ['Tyrannosaurus', 'Albertosaurus'])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+    def test_words_are_matched_as_prefixes(self):
+        self.assertEqual(self.names(services.search_dinosaurs('tyr')), ['Tyrannosaurus', 'Albertosaurus'])
+        # The gallery lists matches by name
+        self.assertEqual(
+            self.names(services.filter_dinosaurs(query='tyr')), ['Albertosaurus', 'Tyrannosaurus']
+        )
+        suggestions = self.client.get(reverse('gallery_suggest'), {'q': 'tyr'}).json()['results']
+        self.assertEqual([s['name'] for s in suggestions], ['Tyrannosaurus'])
+
+    def test_snippets_highlight_matches_and_escape_html(self):
+        snippet = services.search_dinosaurs('cousin')[0].search_snippet
+        self.assertIn('<mark>cousin</mark>', snippet)
+        self.assertIn('&lt;b&gt;faster&lt;/b&gt;', snippet)
+
+        page = [self.triceratops, self.tyrannosaurus]
+        services.attach_search_snippets('tyrant', page)
+        self.assertEqual(page[0].search_snippet, '')
+        self.assertIn('<mark>tyrant</mark>', page[1].search_snippet)
+
+    def test_index_follows_updates_and_deletes(self):
+        self.triceratops.description = 'Fought off a tyrant now and then.'
+        self.triceratops.save()
+        Dinosaur.objects.filter(pk=self.albertosaurus.pk).update(name='Gorgosaurus')
+        self.assertEqual(
+            self.names(services.filter_dinosaurs(query='tyrant')), ['Triceratops', 'Tyrannosaurus']
+        )
+        self.assertEqual(self.names(services.filter_dinosaurs(query='gorgo')), ['Gorgosaurus'])
+        self.assertEqual(self.names(services.filter_dinosaurs(query='albert')), [])
+
+        self.tyrannosaurus.delete()
+        self.assertCountEqual(self.names(services.search_dinosaurs('tyr')), ['Gorgosaurus', 'Triceratops'])
+
+    def test_queries_that_break_the_search_syntax(self):
+        everything = ['Albertosaurus', 'Triceratops', 'Tyrannosaurus']
+        for query in ('', '"', '*', 'AND', 'tyrant OR', '(king'):
+            with self.subTest(query=query):
+                services.search_dinosaurs(query)
+                self.assertEqual(self.client.get(reverse('gallery'), {'search': query}).status_code, 200)
+        # No words to match: no filter, as for an empty query
+        self.assertEqual(self.names(services.filter_dinosaurs(query='"')), everything)
+        self.assertEqual(self.names(services.filter_dinosaurs(query='AND')), ['Albertosaurus'])
+
+    def test_icontains_fallback_without_a_full_text_index(self):
+        search._available[connection.alias] = False
+        self.addCleanup(search._available.pop, connection.alias)
+        tyrannosaurs = ['Albertosaurus', 'Tyrannosaurus']
+
+        self.assertEqual(self.names(services.search_dinosaurs('tyrannosaurus')), tyrannosaurs)
+        self.assertEqual(self.names(services.search_dinosaurs('AND')), ['Albertosaurus'])
+        # No words to match: no filter, as for an empty query
+        self.assertEqual(len(services.search_dinosaurs('"')), 3)
+        self.assertEqual(len(services.filter_dinosaurs(query='')), 3)
+        self.assertEqual(services.suggest_dinosaurs(''), [])
+        self.assertEqual(self.names(services.search_dinosaurs('tyr')), tyrannosaurs)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.dinosaurs = create_catalog()
+        jurassic = self.dinosaurs[2].period
+        for i in range(9):
+            self.dinosaurs.append(Dinosaur.objects.create(
+                name=f'Jurassic raptor {i}', period=jurassic, diet='carnivore',
+                length_meters=2, weight_kg=30, description='A raptor from the jurassic.',
+            ))
+        self.client.force_login(User.objects.create_user(username='rex', password='pw'))
+
+    def cursor(self, payload):
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def walk(self, dinosaurs, page_size):
+        """Follow next_cursor to the end, then previous_cursor back to the start."""
+        forward, pages, after = [], [], None
+        while True:
+            page = services.paginate_dinosaurs(dinosaurs, after=after, page_size=page_size)
+            pages.append([d.pk for d in page['items']])
+            forward += pages[-1]
+            after = page['next_cursor']
+            if after is None:
+                break
+
+        backward, before = [pages[-1]], page['previous_cursor']
+        while before is not None:
+            page = services.paginate_dinosaurs(dinosaurs, before=before, page_size=page_size)
+            backward.insert(0, [d.pk for d in page['items']])
+            before = page['previous_cursor']
+        return forward, pages, backward
+
+    def test_walking_the_catalog_forward_and_back(self):
+        expected = [d.pk for d in sorted(self.dinosaurs, key=lambda d: (d.name, d.pk))]
+        forward, pages, backward = self.walk(services.filter_dinosaurs(), page_size=4)
+
+        self.assertEqual(forward, expected)
+        self.assertEqual([len(page) for page in pages], [4, 4, 4, 3])
+        self.assertEqual(backward, pages)
+
+    def test_cursor_ties_on_name_are_broken_by_id(self):
+        # Names are unique, so a tie can only come from the cursor: the
+        # row with the cursor's name comes next only if its id is larger
+        target = Dinosaur.objects.get(name='Jurassic carnivore')
+        def first(**cursor):
+            return services.paginate_dinosaurs(services.filter_dinosaurs(), page_size=1, **cursor)['items'][0]
+
+        self.assertEqual(first(after=self.cursor([target.name, target.pk - 1])), target)
+        self.assertEqual(first(after=self.cursor([target.name, target.pk])).name, 'Jurassic herbivore')
+        self.assertEqual(first(before=self.cursor([target.name, target.pk + 1])), target)
+        self.assertEqual(first(before=self.cursor([target.name, target.pk])).name, 'Cretaceous herbivore')
+
+    def test_walking_combined_filters(self):
+        raptors = [d.pk for d in self.dinosaurs if d.name.startswith('Jurassic raptor')]
+        dinosaurs = services.filter_dinosaurs(period_name='jurassic', diet='carnivore', query='raptor')
+        forward, pages, backward = self.walk(dinosaurs, page_size=2)
+        self.assertEqual(forward, raptors)
+        self.assertEqual(backward, pages)
+
+        # The API walks the same pages, keeping the filters in each request
+        url, params, seen = reverse('api_dinosaurs'), {
+            'period': 'jurassic', 'diet': 'carnivore', 'search': 'raptor', 'limit': 2, 'fields': 'id',
+        }, []
+        while True:
+            body = self.client.get(url, params).json()
+            seen += [row['id'] for row in body['results']]
+            if not body['next']:
+                break
+            params['after'] = body['next']
+        self.assertEqual(seen, raptors)
+
+    def test_malformed_cursors_never_fail(self):
+        first_page = [d.name for d in services.paginate_dinosaurs(services.filter_dinosaurs())['items']]
+        malformed = [
+            'not a cursor!', '=', self.cursor(None), self.cursor({'name': 'x', 'id': 1}),
+            self.cursor(['x']), self.cursor([1, 2]), self.cursor(['x', '1 OR 1=1']),
+            self.cursor(['x', 2**70]),
+            base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+        ]
+        for cursor in malformed:
+            for param in ('after', 'before'):
+                with self.subTest(cursor=cursor, param=param):
+                    response = self.client.get(reverse('gallery'), {param: cursor})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual([d.name for d in response.context['dinosaurs']], first_page)
+
+                    response = self.client.get(reverse('api_dinosaurs'), {param: cursor})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('cursor', response.json()['error'])
+
+
+class MapDataTests(TestCase):
+    # period -> (name, diet, length, weight) of its dinosaurs
+    CATALOG = {
+        'triassic': [('Coelophysis', 'carnivore', 3, 25), ('Plateosaurus', 'herbivore', 8, 700)],
+        'jurassic': [
+            ('Allosaurus', 'carnivore', 9, 2300), ('Stegosaurus', 'herbivore', 7, 5000),
+            ('Brachiosaurus', 'herbivore', 22, 40000), ('Ornitholestes', 'omnivore', 2, 12),
+        ],
+        'cretaceous': [],
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.periods = {}
+        for start, (period_name, species) in zip((252, 201, 145), self.CATALOG.items()):
+            period = Period.objects.create(name=period_name, start_mya=start, end_mya=start - 50)
+            self.periods[period_name] = period
+            for name, diet, length, weight in species:
+                Dinosaur.objects.create(
+                    name=name, period=period, diet=diet, length_meters=length, weight_kg=weight,
+                    description=f'A {diet}.',
+                )
+        self.user = User.objects.create_user(username='rex', password='pw')
+
+    def rows(self, user=None):
+        return {row['period'].name: row for row in services.get_map_data(user)}
+
+    def test_counts_match_the_catalog(self):
+        rows = self.rows()
+        self.assertEqual(set(rows), set(self.CATALOG))
+        for period_name, species in self.CATALOG.items():
+            row = rows[period_name]
+            with self.subTest(period=period_name):
+                self.assertEqual(row['dinosaur_count'], len(species))
+                self.assertEqual(row['diet_counts'], {
+                    diet: sum(1 for _, d, _, _ in species if d == diet) for diet, _ in Dinosaur.DIET_CHOICES
+                })
+                self.assertIsNone(row['collected_count'])
+                if species:
+                    lengths = [length for _, _, length, _ in species]
+                    self.assertEqual(
+                        (row['length']['min'], row['length']['max']), (min(lengths), max(lengths))
+                    )
+                    self.assertAlmostEqual(float(row['length']['avg']), sum(lengths) / len(lengths))
+                    weights = [weight for _, _, _, weight in species]
+                    self.assertEqual(row['weight']['max'], max(weights))
+                else:
+                    self.assertIsNone(row['length']['avg'])
+
+        herbivores = Dinosaur.objects.filter(diet='herbivore').values_list('pk', flat=True)
+        services.collect_dinosaurs(self.user, list(herbivores))
+        collected = {name: row['collected_count'] for name, row in self.rows(self.user).items()}
+        self.assertEqual(collected, {'triassic': 1, 'jurassic': 2, 'cretaceous': 0})
+
+    def test_cache_follows_catalog_changes(self):
+        self.assertEqual(self.rows()['cretaceous']['dinosaur_count'], 0)
+        with self.assertNumQueries(0):
+            self.rows()
+
+        Dinosaur.objects.create(
+            name='Tyrannosaurus', period=self.periods['cretaceous'], diet='carnivore',
+            length_meters=12, weight_kg=8000, description='A carnivore.',
+        )
+        cretaceous = self.rows()['cretaceous']
+        self.assertEqual(cretaceous['dinosaur_count'], 1)
+        self.assertEqual(cretaceous['diet_counts']['carnivore'], 1)
+
+        Dinosaur.objects.filter(name='Allosaurus').delete()
+        jurassic = self.rows()['jurassic']
+        self.assertEqual(jurassic['dinosaur_count'], 3)
+        self.assertEqual(jurassic['diet_counts']['carnivore'], 0)
+
+        # A user's collected counts follow their album
+        self.assertEqual(self.rows(self.user)['jurassic']['collected_count'], 0)
+        services.collect_dinosaur(self.user, Dinosaur.objects.get(name='Stegosaurus'))
+        self.assertEqual(self.rows(self.user)['jurassic']['collected_count'], 1)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'player{i}', password='pw') for i in range(4)]
+
+    def test_best_scores_are_maintained_incrementally(self):
+        services.save_game_score(self.users[0], 'memodyn', 100)
+        services.save_game_score(self.users[0], 'memodyn', 80)
+        services.save_game_score(self.users[0], 'memodyn', 150)
+        bests = services.get_personal_bests(self.users[0])
+        self.assertEqual(bests['memodyn'].best_score, 150)
+        self.assertEqual(
+            set(BestScore.objects.filter(user=self.users[0]).values_list('scope', 'best_score')),
+            {('all', 150), ('week', 150), ('day', 150)},
+        )
+
+    def test_top_n_and_rank(self):
+        for user, score in zip(self.users, [300, 100, 200, 100]):
+            services.save_game_score(user, 'puzzleaurus', score)
+        board = services.get_leaderboard('puzzleaurus', limit=3)
+        self.assertEqual([(e.rank, e.user, e.best_score) for e in board],
+                         [(1, self.users[0], 300), (2, self.users[2], 200), (3, self.users[1], 100)])
+        self.assertEqual(services.get_user_rank(self.users[3], 'puzzleaurus').rank, 4)
+        self.assertEqual(services.get_user_rank(self.users[2], 'puzzleaurus', scope='day').rank, 2)
+        self.assertIsNone(services.get_user_rank(self.users[0], 'memodyn'))
+
+    def test_rank_lookup_does_not_touch_game_scores(self):
+        services.save_game_score(self.users[0], 'puzzleaurus', 50)
+        with capture_queries() as stats:
+            services.get_user_rank(self.users[0], 'puzzleaurus')
+        self.assertFalse(any('encyclopedia_gamescore' in sql for sql, _ in stats.queries))
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        Period.objects.create(name='jurassic', start_mya=201, end_mya=145)
+
+    def rows(self, **overrides):
+        row = {
+            'name': 'Allosaurus', 'scientific_name': 'Allosaurus fragilis', 'period': 'jurassic',
+            'diet': 'carnivore', 'length_meters': '9.5', 'weight_kg': '2300',
+            'description': 'Apex predator.', 'discovered_year': '1877',
+        }
+        row.update(overrides)
+        return [row]
+
+    def test_import_is_idempotent_upsert(self):
+        importer.import_dinosaurs(self.rows())
+        stats = importer.import_dinosaurs(self.rows(weight_kg='2500') + self.rows(name='Stegosaurus'))
+        self.assertEqual(stats.upserted, 2)
+        self.assertEqual(Dinosaur.objects.count(), 2)
+        self.assertEqual(Dinosaur.objects.get(name='Allosaurus').weight_kg, 2500)
+
+    def test_invalid_rows_are_skipped(self):
+        stats = importer.import_dinosaurs(
+            self.rows(period='permian') + self.rows(diet='rocks') + self.rows(name='Ok'), batch_size=2
+        )
+        self.assertEqual((stats.rows, stats.upserted, stats.skipped, stats.batches), (3, 1, 2, 2))
+        self.assertEqual(len(stats.errors), 2)
+
+    def test_unparseable_jsonl_lines_are_skipped(self):
+        lines = [
+            json.dumps(self.rows()[0]), '{"name": "Broken', '', '["Stegosaurus", "jurassic"]',
+            '"Diplodocus"', json.dumps(self.rows(name='Stegosaurus')[0]),
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as handle:
+            handle.write('\n'.join(lines) + '\n')
+        self.addCleanup(os.remove, handle.name)
+
+        stats = importer.import_dinosaurs(importer.read_catalog(handle.name))
+        self.assertEqual((stats.rows, stats.upserted, stats.skipped), (5, 2, 3))
+        self.assertTrue(stats.errors[0].startswith('row 2: line 2 is not valid JSON'))
+        self.assertEqual(stats.errors[1:], [
+            'row 3: line 4 is not a JSON object', 'row 4: line 5 is not a JSON object',
+        ])
+        # Rows that do not come from read_catalog are checked too
+        stats = importer.import_dinosaurs([['Diplodocus', 'jurassic']])
+        self.assertEqual(stats.skipped, 1)
+
+    def test_values_out_of_the_columns_bounds_are_skipped(self):
+        rejected = [
+            {'length_meters': '1000'},  # max_digits=5, decimal_places=2
+            {'length_meters': '9.125'},
+            {'length_meters': 'NaN'},
+            {'weight_kg': '100000000'},  # max_digits=10
+            {'weight_kg': 'Infinity'},
+            {'discovered_year': '1799'},
+            {'discovered_year': '2101'},
+        ]
+        accepted = [{'length_meters': '999.99'}, {'discovered_year': '1800'}, {'discovered_year': 2100}]
+        rows = [
+            self.rows(name=f'Dino {i}', **overrides)[0] for i, overrides in enumerate(rejected + accepted)
+        ]
+
+        stats = importer.import_dinosaurs(rows)
+        self.assertEqual((stats.upserted, stats.skipped), (len(accepted), len(rejected)))
+        self.assertEqual(
+            sorted(Dinosaur.objects.values_list('name', flat=True)), ['Dino 7', 'Dino 8', 'Dino 9']
+        )
+        self.assertEqual(stats.errors[0], (
+            'row 1: length_meters 1000: Ensure that there are no more than 3 digits before the decimal point.'
+        ))
+        self.assertEqual(stats.errors[5], (
+            'row 6: discovered_year 1799: Ensure this value is greater than or equal to 1800.'
+        ))
+
+
+class ApiTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dinosaurs = create_catalog()
+        self.user = User.objects.create_user(username='rex', password='pw')
+        self.client.force_login(self.user)
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        response = self.client.get(reverse('api_dinosaurs'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_sparse_fieldsets_and_pagination(self):
+        response = self.client.get(reverse('api_dinosaurs'), {'fields': 'id,diet', 'limit': 4})
+        data = response.json()
+        self.assertEqual(len(data['results']), 4)
+        self.assertEqual(set(data['results'][0]), {'id', 'diet'})
+        self.assertWithinQueryBudget(response)
+
+        second = self.client.get(reverse('api_dinosaurs'), {'limit': 4, 'after': data['next']}).json()
+        self.assertEqual(len(second['results']), len(self.dinosaurs) - 4)
+        self.assertIsNone(second['next'])
+
+        response = self.client.get(reverse('api_dinosaurs'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_catalog_etag_returns_304_until_catalog_changes(self):
+        url = reverse('api_dinosaur_detail', args=[self.dinosaurs[0].pk])
+        etag = self.client.get(url)['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertWithinQueryBudget(response)
+
+        Dinosaur.objects.filter(pk=self.dinosaurs[0].pk).update(fun_fact='New')
+        catalog.bump_catalog_version()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['fun_fact'], 'New')
+
+    def test_album_etag_changes_when_collecting(self):
+        url = reverse('api_album')
+        first = self.client.get(url)
+        self.assertEqual(first.json()['results'], [])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        services.collect_dinosaur(self.user, self.dinosaurs[0])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['dinosaur']['id'], self.dinosaurs[0].pk)
+        self.assertEqual(self.client.get(reverse('api_progress')).json()['collected'], 1)
+
+    def test_scores_etag_changes_when_playing(self):
+        url = reverse('api_scores')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            services.save_game_score(self.user, 'memodyn', 90)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['personal_bests']['memodyn']['score'], 90)
+
+    def test_cache_control_separates_catalog_and_user_data(self):
+        response = self.client.get(reverse('api_periods'))
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        response = self.client.get(reverse('api_album'))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+
+
+class ProfileLoadingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dinosaurs = create_catalog()
+        self.user = User.objects.create_user(username='rex', password='pw')
+        self.client.force_login(self.user)
+
+    def test_profile_is_created_with_the_user(self):
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+
+    def test_pages_read_the_profile_joined_to_the_session_user(self):
+        # Session, user with profile; catalog data comes from the cache
+        urls = [
+            reverse('home'),
+            reverse('map'),
+            reverse('library'),
+            reverse('dinosaur_detail', args=[self.dinosaurs[0].pk]),
+        ]
+        for url in urls:
+            self.client.get(url)
+            with self.subTest(url=url), self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertContains(response, 'bi-coin')
+
+    def test_profile_is_recreated_if_missing(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        # Recreating the profile costs queries beyond the page's budget
+        with self.assertLogs('encyclopedia.queries', 'WARNING') as logs:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('view=home', logs.output[0])
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+
+
+class AsyncViewTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dinosaurs = create_catalog()
+        self.user = User.objects.create_user(username='rex')
+        services.collect_dinosaur(self.user, self.dinosaurs[0])
+        services.save_game_score(self.user, 'puzzleaurus', 120)
+
+    async def test_read_pages_over_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        urls = [
+            reverse('home'),
+            reverse('map'),
+            reverse('gallery'),
+            reverse('gallery') + '?period=jurassic',
+            reverse('gallery') + '?search=jurassic',
+            reverse('dinosaur_detail', args=[self.dinosaurs[1].pk]),
+            reverse('library'),
+            reverse('profile'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinQueryBudget(response)
+        response = await self.async_client.get(reverse('profile'))
+        self.assertContains(response, '120')
+        self.assertContains(response, 'bi-coin')
+
+    async def test_anonymous_users_are_sent_to_login(self):
+        response = await self.async_client.get(reverse('map'))
+        self.assertRedirects(response, f'{reverse("login")}?next={reverse("map")}', fetch_redirect_response=False)
+
+    async def test_collect_over_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('dinosaur_detail', args=[self.dinosaurs[1].pk])
+        response = await self.async_client.post(url, {'collect': '1'})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertTrue(
+            await AlbumItem.objects.filter(user=self.user, dinosaur=self.dinosaurs[1], is_collected=True).aexists()
+        )
+
+
+class GuestLoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_each_guest_gets_an_account_of_their_own(self):
+        first, second = self.client_class(), self.client_class()
+        for client in (first, second):
+            response = client.post(reverse('guest_login'))
+            self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        guests = User.objects.filter(username__startswith=services.GUEST_USERNAME_PREFIX)
+        self.assertEqual(guests.count(), 2)
+        for guest in guests:
+            self.assertTrue(services.is_guest(guest))
+            self.assertFalse(guest.has_usable_password())
+            self.assertTrue(UserProfile.objects.filter(user=guest).exists())
+        self.assertEqual(first.get(reverse('profile')).status_code, 200)
+        self.assertEqual(first.session.get_expiry_date(), services.guest_expires_at(guests[0]))
+
+    def test_guest_prefix_is_reserved(self):
+        self.client.post(reverse('register'), {
+            'username': 'guest-rex', 'password': 'pw', 'password_confirm': 'pw',
+        })
+        self.assertFalse(User.objects.filter(username='guest-rex').exists())
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_guest_login_with_signed_cookie_sessions(self):
+        self.client.post(reverse('guest_login'))
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+
+    def test_guest_login_is_post_only(self):
+        self.assertEqual(self.client.get(reverse('guest_login')).status_code, 405)
+        self.assertFalse(User.objects.filter(username__startswith=services.GUEST_USERNAME_PREFIX).exists())
+        csrf_client = self.client_class(enforce_csrf_checks=True)
+        self.assertEqual(csrf_client.post(reverse('guest_login')).status_code, 403)
+
+    @override_settings(GUEST_ACCOUNT_TTL_HOURS=24)
+    def test_reaper_deletes_only_expired_guests(self):
+        create_catalog()
+        expired = services.create_guest_user()
+        services.collect_dinosaur(expired, Dinosaur.objects.first())
+        User.objects.filter(pk=expired.pk).update(
+            date_joined=timezone.now() - datetime.timedelta(hours=25)
+        )
+        fresh = services.create_guest_user()
+        member = User.objects.create_user(username='guest-member', password='pw')
+        User.objects.filter(pk=member.pk).update(date_joined=expired.date_joined)
+
+        call_command('reap_guests', stdout=StringIO())
+        self.assertEqual(
+            set(User.objects.values_list('pk', flat=True)), {fresh.pk, member.pk}
+        )
+        self.assertFalse(AlbumItem.objects.filter(user_id=expired.pk).exists())
+
+    @override_settings(GUEST_ACCOUNT_TTL_HOURS=24)
+    def test_reaper_queries_do_not_grow_with_album_size(self):
+        dinosaurs = create_catalog()
+
+        def expired_guests(items_each):
+            guests = [services.create_guest_user() for _ in range(3)]
+            for guest in guests:
+                for dinosaur in dinosaurs[:items_each]:
+                    services.collect_dinosaur(guest, dinosaur)
+            User.objects.filter(pk__in=[guest.pk for guest in guests]).update(
+                date_joined=timezone.now() - datetime.timedelta(hours=25)
+            )
+
+        expired_guests(1)
+        with capture_queries() as stats:
+            call_command('reap_guests', stdout=StringIO())
+        expired_guests(len(dinosaurs))
+        with self.assertNumQueries(stats.count):
+            call_command('reap_guests', stdout=StringIO())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(AlbumItem.objects.exists())
+
+
+class PasswordHashingTests(TestCase):
+    def test_hashes_are_made_on_the_pool_with_the_configured_cost(self):
+        with override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2**12):
+            encoded = make_password('pw')
+            self.assertTrue(encoded.startswith('scrypt$4096$'))
+            self.assertTrue(check_password('pw', encoded))
+        self.assertTrue(
+            hashers.run_bounded(lambda: threading.current_thread().name).startswith('password-hash')
+        )
+
+    def test_login_rehashes_with_the_preferred_hasher(self):
+        user = User.objects.create_user(username='rex')
+        user.password = make_password('pw', hasher='pbkdf2_sha256')
+        user.save()
+        response = self.client.post(reverse('login'), {'username': 'rex', 'password': 'pw'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$'))
+        self.assertTrue(user.check_password('pw'))
+
+
+@override_settings(THROTTLE_RATES={
+    'login_ip': (3, 60), 'login_username': (2, 60), 'register_ip': (1, 60), 'guest_ip': (1, 60),
+})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='rex', password='pw')
+
+    def login(self, password):
+        return self.client.post(reverse('login'), {'username': 'rex', 'password': password})
+
+    def test_failed_logins_lock_the_username(self):
+        self.assertEqual(self.login('wrong').status_code, 200)
+        self.assertEqual(self.login('wrong').status_code, 200)
+        # Refused before the password is checked, even the right one
+        self.assertEqual(self.login('pw').status_code, 429)
+        cache.clear()
+        self.assertEqual(self.login('pw').status_code, 302)
+
+    def test_success_clears_the_username_count(self):
+        self.login('wrong')
+        self.assertEqual(self.login('pw').status_code, 302)
+        self.client.logout()
+        self.login('wrong')
+        self.assertEqual(self.login('pw').status_code, 302)
+
+    def test_failures_are_counted_per_address(self):
+        for username in ('a', 'b', 'c'):
+            self.client.post(reverse('login'), {'username': username, 'password': 'x'})
+        self.assertEqual(self.login('pw').status_code, 429)
+        other = self.client_class(REMOTE_ADDR='203.0.113.7')
+        response = other.post(reverse('login'), {'username': 'rex', 'password': 'pw'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_registrations_are_limited_per_address(self):
+        data = {'username': 'raptor', 'password': 'pw', 'password_confirm': 'pw'}
+        self.client.post(reverse('register'), data)
+        self.client.logout()
+        data['username'] = 'raptor2'
+        self.assertEqual(self.client.post(reverse('register'), data).status_code, 429)
+        self.assertFalse(User.objects.filter(username='raptor2').exists())
+
+    def test_guest_logins_are_limited_per_address(self):
+        self.client.post(reverse('guest_login'))
+        self.client.logout()
+        self.assertEqual(self.client.post(reverse('guest_login')).status_code, 429)
+        self.assertEqual(User.objects.filter(username__startswith=services.GUEST_USERNAME_PREFIX).count(), 1)
+
+
+class BulkCollectTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dinosaurs = create_catalog()
+        self.ids = [dinosaur.pk for dinosaur in self.dinosaurs]
+        self.user = User.objects.create_user(username='rex', password='pw')
+
+    def test_collect_many_counts_each_dinosaur_once(self):
+        services.collect_dinosaur(self.user, self.dinosaurs[0])
+        AlbumItem.objects.create(user=self.user, dinosaur=self.dinosaurs[1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            collected = services.collect_dinosaurs(self.user, self.ids + [999999])
+
+        self.assertEqual(collected, len(self.ids) - 1)
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.collected_count, len(self.ids))
+        self.assertEqual(profile.tokens, services.COLLECT_TOKEN_AWARD * len(self.ids))
+        self.assertEqual(AlbumItem.objects.filter(user=self.user, is_collected=True).count(), len(self.ids))
+        self.assertEqual(services.collect_dinosaurs(self.user, self.ids), 0)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        other = User.objects.create_user(username='ptero')
+        with capture_queries() as small:
+            services.collect_dinosaurs(self.user, self.ids[:2])
+        with capture_queries() as large:
+            services.collect_dinosaurs(other, self.ids)
+        self.assertEqual(small.count, large.count)
+
+    def test_collect_endpoint(self):
+        self.client.force_login(self.user)
+        url = reverse('api_album_collect')
+        response = self.client.post(url, {'dinosaur_ids': self.ids[:3]}, content_type='application/json')
+        data = response.json()
+        self.assertEqual(data['collected'], 3)
+        self.assertEqual(data['tokens'], 3 * services.COLLECT_TOKEN_AWARD)
+        self.assertEqual(data['progress']['collected'], 3)
+
+        response = self.client.post(url, {'dinosaur_ids': 'all'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_fill_albums_for_many_users(self):
+        users = [self.user] + [User.objects.create_user(username=f'kid{i}') for i in range(3)]
+        services.collect_dinosaur(self.user, self.dinosaurs[2])  # a jurassic one
+
+        collected = services.fill_albums(
+            [user.pk for user in users],
+            Dinosaur.objects.filter(period__name='jurassic').values_list('pk', flat=True)
+        )
+
+        self.assertEqual(collected, 4 * 2 - 1)
+        counts = dict(UserProfile.objects.values_list('user__username', 'collected_count'))
+        self.assertEqual(counts, {'rex': 2, 'kid0': 2, 'kid1': 2, 'kid2': 2})
+
+
+class AlbumReadModelTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dinosaurs = create_catalog()
+        self.user = User.objects.create_user(username='rex', password='pw')
+
+    def collected_ids(self):
+        return UserAlbum.objects.get(user=self.user).collected_ids
+
+    def test_collecting_merges_into_the_read_model(self):
+        services.collect_dinosaur(self.user, self.dinosaurs[3])
+        with capture_queries() as stats:
+            services.collect_dinosaur(self.user, self.dinosaurs[1])
+        self.assertEqual(self.collected_ids(), [self.dinosaurs[1].pk, self.dinosaurs[3].pk])
+        # The album row is updated in place, not rebuilt from the album items
+        self.assertFalse([sql for sql, _ in stats.queries if 'INSERT INTO "encyclopedia_useralbum"' in sql])
+
+    def test_collecting_updates_the_read_model(self):
+        services.collect_dinosaur(self.user, self.dinosaurs[3])
+        services.collect_dinosaurs(self.user, [self.dinosaurs[0].pk, self.dinosaurs[3].pk])
+        self.assertEqual(self.collected_ids(), sorted([self.dinosaurs[0].pk, self.dinosaurs[3].pk]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AlbumItem.objects.get(user=self.user, dinosaur=self.dinosaurs[3]).delete()
+        self.assertEqual(self.collected_ids(), [self.dinosaurs[0].pk])
+
+    def test_bulk_delete_refreshes_each_album_once(self):
+        other = User.objects.create_user(username='kid', password='pw')
+        for user in (self.user, other):
+            services.collect_dinosaurs(user, [dinosaur.pk for dinosaur in self.dinosaurs[:4]])
+
+        # Deleting the triassic period cascades into two items of each user
+        with capture_queries() as stats, self.captureOnCommitCallbacks(execute=True):
+            self.dinosaurs[0].period.delete()
+        album_updates = [sql for sql, _ in stats.queries if sql.startswith('UPDATE "encyclopedia_useralbum"')]
+        self.assertEqual(len(album_updates), 1)
+        jurassic = [self.dinosaurs[2].pk, self.dinosaurs[3].pk]
+        for user in (self.user, other):
+            self.assertEqual(UserAlbum.objects.get(user=user).collected_ids, jurassic)
+            self.assertEqual(UserProfile.objects.get(user=user).collected_count, 2)
+
+    def test_album_is_built_lazily_and_merged_with_the_catalog(self):
+        AlbumItem.objects.create(user=self.user, dinosaur=self.dinosaurs[1], is_collected=True)
+        UserAlbum.objects.filter(user=self.user).delete()
+
+        album = services.get_album(self.user)
+
+        self.assertEqual([page['period'].name for page in album], ['triassic', 'jurassic', 'cretaceous'])
+        self.assertEqual([(page['collected'], page['total']) for page in album], [(1, 2), (0, 2), (0, 2)])
+        self.assertEqual(self.collected_ids(), [self.dinosaurs[1].pk])
+
+    def test_album_page_reads_one_row_for_the_user(self):
+        services.collect_dinosaur(self.user, self.dinosaurs[0])
+        self.client.force_login(self.user)
+        self.client.get(reverse('album'))
+        # Session, user with profile, UserAlbum row
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('album'))
+        # The oldest period's page is shown first
+        self.assertContains(response, self.dinosaurs[0].name)
+        self.assertNotContains(response, self.dinosaurs[1].name)
+        self.assertNotContains(response, self.dinosaurs[2].name)
+        response = self.client.get(reverse('album'), {'period': 'jurassic'})
+        self.assertNotContains(response, self.dinosaurs[0].name)
+
+
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0)
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+        self.dinosaur = create_catalog()[0]
+
+    def upload(self, width=1600, height=900):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'green').save(buffer, format='PNG')
+        return SimpleUploadedFile('rex.png', buffer.getvalue(), content_type='image/png')
+
+    def test_upload_builds_hashed_derivatives_without_upscaling(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dinosaur.image = self.upload(width=800, height=400)
+            self.dinosaur.save()
+
+        derivatives = Dinosaur.objects.get(pk=self.dinosaur.pk).image_derivatives
+        self.assertEqual(derivatives['source'], self.dinosaur.image.name)
+        self.assertEqual(sorted(derivatives['webp'], key=int), ['320', '640', '800'])
+        for name in derivatives['webp'].values():
+            self.assertRegex(name, r'^derivatives/dinosaurs/rex[^/]*-[0-9a-f]{16}-\d+\.webp$')
+            self.assertLess(default_storage.size(name), self.dinosaur.image.size)
+
+    def test_gallery_renders_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dinosaur.image = self.upload()
+            self.dinosaur.save()
+        user = User.objects.create_user(username='rex', password='pw')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('gallery'))
+
+        self.assertContains(response, '<source type="image/webp" srcset="/media/derivatives/dinosaurs/')
+        self.assertContains(response, ' 320w, ')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_force_re_encodes_existing_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dinosaur.image = self.upload(width=800, height=400)
+            self.dinosaur.save()
+        name = Dinosaur.objects.get(pk=self.dinosaur.pk).image_derivatives['webp']['320']
+        with default_storage.open(name, 'wb') as handle:
+            handle.write(b'stale')
+
+        images.refresh_derivatives(Dinosaur, self.dinosaur.pk, 'image')
+        with default_storage.open(name) as handle:
+            self.assertEqual(handle.read(), b'stale')
+
+        images.refresh_derivatives(Dinosaur, self.dinosaur.pk, 'image', force=True)
+        self.assertEqual(Dinosaur.objects.get(pk=self.dinosaur.pk).image_derivatives['webp']['320'], name)
+        with default_storage.open(name) as handle:
+            self.assertEqual(Image.open(handle).size, (320, 160))
+
+    def test_avatar_is_cropped_square(self):
+        profile = User.objects.create_user(username='rex').profile
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.avatar = self.upload(width=600, height=300)
+            profile.save()
+
+        name = UserProfile.objects.get(pk=profile.pk).avatar_derivatives['webp']['96']
+        with default_storage.open(name) as handle:
+            self.assertEqual(Image.open(handle).size, (96, 96))
+
+    def test_avatar_upload_keeps_concurrent_counter_updates(self):
+        user = User.objects.create_user(username='rex', password='pw')
+        self.client.force_login(user)
+
+        def award_tokens(sender, instance, **kwargs):
+            # Another request's F() update lands between the read and the save
+            UserProfile.objects.filter(pk=instance.pk).update(tokens=F('tokens') + 10)
+        pre_save.connect(award_tokens, sender=UserProfile)
+        self.addCleanup(pre_save.disconnect, award_tokens, sender=UserProfile)
+
+        self.client.post(reverse('profile_update'), {'avatar': self.upload()})
+        profile = UserProfile.objects.get(user=user)
+        self.assertTrue(profile.avatar.name.startswith('avatars/'))
+        self.assertEqual(profile.tokens, 10)
+
+
+class ProductionStaticTests(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.root)
+        with open(f'{self.source}/site.css', 'w') as handle:
+            handle.write('body { color: #333; }\n' * 200)
+        with open(f'{self.source}/robots.txt', 'w') as handle:
+            handle.write('User-agent: *\n')
+
+        production = override_settings(
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'encyclopedia.staticfiles.CompressedManifestStaticFilesStorage'},
+            },
+        )
+        production.enable()
+        self.addCleanup(production.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        with open(f'{self.root}/staticfiles.json') as handle:
+            self.hashed_css = json.load(handle)['paths']['site.css']
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse('app'))
+
+    def get(self, path, **headers):
+        return self.middleware(RequestFactory().get(f'/static/{path}', **headers))
+
+    def test_collectstatic_writes_hashed_and_compressed_copies(self):
+        self.assertRegex(self.hashed_css, r'^site\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.exists(f'{self.root}/{self.hashed_css}.gz'))
+        self.assertTrue(os.path.exists(f'{self.root}/{self.hashed_css}.br'))
+        # Too small to be worth compressing
+        self.assertFalse(os.path.exists(f'{self.root}/robots.txt.gz'))
+
+    def test_hashed_file_is_immutable_and_precompressed(self):
+        response = self.get(self.hashed_css, HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertTrue(body.startswith(b'body { color: #333; }'))
+
+    def test_unhashed_name_is_revalidated(self):
+        response = self.get('site.css')
+
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get(self.hashed_css)['ETag']
+
+        self.assertEqual(self.get(self.hashed_css, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_each_encoding_has_its_own_etag(self):
+        etags = {
+            encoding: self.get(self.hashed_css, HTTP_ACCEPT_ENCODING=encoding)['ETag']
+            for encoding in ('br', 'gzip', 'identity')
+        }
+        self.assertEqual(len(set(etags.values())), 3)
+        self.assertTrue(etags['br'].endswith('-br"'))
+        self.assertTrue(etags['gzip'].endswith('-gz"'))
+
+        # A cached gzip copy does not validate the identity or brotli bytes
+        for encoding, status in [('gzip', 304), ('identity', 200), ('br', 200)]:
+            response = self.get(self.hashed_css, HTTP_ACCEPT_ENCODING=encoding, HTTP_IF_NONE_MATCH=etags['gzip'])
+            self.assertEqual(response.status_code, status, encoding)
+
+    def test_unknown_paths_fall_through(self):
+        self.assertEqual(self.get('missing.css').content, b'app')
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dinosaurs = create_catalog()
+        self.user = User.objects.create_user(username='rex', password='pw')
+        self.client.force_login(self.user)
+
+    def test_catalog_fragments_follow_catalog_changes(self):
+        self.assertContains(self.client.get(reverse('gallery')), 'Jurassic herbivore')
+        # A write that skips the signals is not seen: the cards come from the cache
+        Dinosaur.objects.filter(pk=self.dinosaurs[2].pk).update(name='Sneaky rename')
+        self.assertNotContains(self.client.get(reverse('gallery')), 'Sneaky rename')
+
+        period = self.dinosaurs[2].period
+        period.description = 'Ferns everywhere.'
+        period.save()
+        self.assertContains(self.client.get(reverse('gallery')), 'Sneaky rename')
+        self.assertContains(self.client.get(reverse('library')), 'Ferns everywhere.')
+
+    def test_progress_widget_is_cached_per_user(self):
+        self.assertContains(self.client.get(reverse('home')), '0 / 6 dinosaurs discovered')
+        UserProfile.objects.filter(user=self.user).update(collected_count=5)
+        self.assertContains(self.client.get(reverse('home')), '0 / 6 dinosaurs discovered')
+
+        services.collect_dinosaur(self.user, self.dinosaurs[0])
+        self.assertContains(self.client.get(reverse('home')), '6 / 6 dinosaurs discovered')
+        self.assertContains(self.client.get(reverse('map')), '<strong>1</strong> / 2')
+
+        other = User.objects.create_user(username='trike')
+        self.client.force_login(other)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, "trike's Progress")
+        self.assertContains(response, '0 / 6 dinosaurs discovered')
+
+    def test_profile_save_invalidates_progress(self):
+        self.client.get(reverse('home'))
+        profile = UserProfile.objects.get(user=self.user)
+        profile.collected_count = 3
+        profile.save()
+        self.assertContains(self.client.get(reverse('home')), '3 / 6 dinosaurs discovered')
+
+    def test_usercache_requires_a_data_kind(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template("{% load fragments %}{% usercache 'progress' %}{% endusercache %}")
+
+
+class GenerateDataTests(TestCase):
+    def test_generated_data_is_consistent(self):
+        create_catalog()
+        call_command(
+            'generate_data', dinosaurs=50, users=5, items_per_user=5, scores_per_user=3,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Dinosaur.objects.count(), 56)
+        users = User.objects.filter(username__startswith='loadtest_')
+        self.assertEqual(users.count(), 5)
+        self.assertTrue(users.first().check_password('loadtest'))
+        for profile in UserProfile.objects.filter(user__in=users):
+            collected = sorted(AlbumItem.objects.filter(user=profile.user).values_list('dinosaur_id', flat=True))
+            self.assertEqual(profile.collected_count, len(collected))
+            self.assertEqual(UserAlbum.objects.get(user=profile.user).collected_ids, collected)
+        if GameScore.objects.exists():
+            self.assertTrue(BestScore.objects.exists())
+
+        call_command('generate_data', delete=True, stdout=StringIO())
+        self.assertFalse(User.objects.filter(username__startswith='loadtest_').exists())
+
+
+class ServiceBenchmarkTests(TestCase):
+    def test_benchmarks_record_every_metric(self):
+        create_catalog()
+        user = User.objects.create_user(username='rex')
+        context = benchmarks.BenchmarkContext(user.pk)
+        results = benchmarks.run_benchmarks(context, ['get_map_data', 'save_game_score'], repeat=2)
+        self.assertEqual(set(results['get_map_data']), {'cold', 'warm'})
+        self.assertEqual(set(results['get_map_data']['cold']), set(benchmarks.METRICS))
+        self.assertEqual(results['get_map_data']['warm']['queries'], 0)
+        self.assertGreater(results['save_game_score']['cold']['queries'], 0)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'1000': {'get_album': {'cold': {'ms': 10.0, 'queries': 3, 'alloc_kib': 100.0}}}}
+        results = {'1000': {'get_album': {'cold': {'ms': 12.0, 'queries': 4, 'alloc_kib': 200.0}}}}
+        regressions = benchmarks.compare(results, baseline, threshold=0.25)
+        self.assertEqual(
+            [(metric, old, new) for *_, metric, old, new in regressions],
+            [('queries', 3, 4), ('alloc_kib', 100.0, 200.0)],
+        )
+        self.assertEqual(benchmarks.compare(baseline, baseline), [])
+
+
+class DatabaseBackendTests(TestCase):
+    def test_tuned_sqlite_connections_use_wal(self):
+        if connection.settings_dict['ENGINE'] != 'encyclopedia.db_backends.sqlite3':
+            self.skipTest('SQLITE_TUNED is off')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_unknown_transaction_mode_is_rejected(self):
+        settings_dict = {**connection.settings_dict, 'OPTIONS': {'transaction_mode': 'eventually'}}
+        wrapper = SQLiteTunedWrapper(settings_dict)
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper.get_connection_params()
+
+
+class QueryPlanTests(QueryPlanMixin, TestCase):
+    """EXPLAIN every service query and require an index for each one."""
+
+    def setUp(self):
+        cache.clear()
+        self.dinosaurs = create_catalog()
+        self.user = User.objects.create_user(username='rex', password='pw')
+        self.other = User.objects.create_user(username='trike', password='pw')
+        services.collect_dinosaur(self.user, self.dinosaurs[0])
+        services.save_game_score(self.other, 'puzzleaurus', 80)
+
+    def assertIndexed(self, call, allow_full_scan=()):
+        cache.clear()
+        # Whole-catalog reads are cached; see the test below
+        catalog.get_album_catalog()
+        catalog.get_catalog_size()
+        with capture_queries() as stats:
+            call()
+        self.assertGreater(stats.count, 0)
+        self.assertUsesIndexes(stats, allow_full_scan)
+
+    def test_catalog_queries(self):
+        first = services.paginate_dinosaurs(services.filter_dinosaurs())['items'][0]
+        cursor = services.encode_cursor(first)
+        calls = {
+            'gallery': lambda: services.paginate_dinosaurs(services.filter_dinosaurs()),
+            'next page': lambda: services.paginate_dinosaurs(services.filter_dinosaurs(), after=cursor),
+            'previous page': lambda: services.paginate_dinosaurs(services.filter_dinosaurs(), before=cursor),
+            'by period': lambda: services.paginate_dinosaurs(services.filter_dinosaurs(period_name='jurassic')),
+            'by diet': lambda: services.paginate_dinosaurs(services.filter_dinosaurs(diet='carnivore')),
+            'period and diet': lambda: services.paginate_dinosaurs(
+                services.filter_dinosaurs(period_name='jurassic', diet='carnivore')
+            ),
+            'search': lambda: services.paginate_dinosaurs(services.filter_dinosaurs(query='jur')),
+            'ranked search': lambda: services.search_dinosaurs('jur'),
+            'suggest': lambda: services.suggest_dinosaurs('tri'),
+            'snippets': lambda: services.attach_search_snippets('jur', list(self.dinosaurs)),
+            'dinosaur': lambda: catalog.get_dinosaur(self.dinosaurs[1].pk),
+        }
+        for name, call in calls.items():
+            with self.subTest(name):
+                self.assertIndexed(call)
+
+    def test_catalog_wide_reads_are_the_only_full_scans(self):
+        # These deliberately read every dinosaur (once per catalog version)
+        for call in (catalog.get_album_catalog, catalog.get_catalog_size, services.get_map_data):
+            with self.subTest(call.__name__):
+                cache.clear()
+                with capture_queries() as stats:
+                    call()
+                self.assertUsesIndexes(stats, allow_full_scan={'encyclopedia_dinosaur', 'encyclopedia_period'})
+
+    def test_album_queries(self):
+        ids = [d.pk for d in self.dinosaurs[:3]]
+        calls = {
+            'collect': lambda: services.collect_dinosaur(self.user, self.dinosaurs[1]),
+            'collect many': lambda: services.collect_dinosaurs(self.user, ids),
+            'fill albums': lambda: services.fill_albums([self.other.pk], ids),
+            'refresh albums': lambda: services.refresh_albums([self.user.pk, self.other.pk]),
+            'collected ids': lambda: services.get_collected_ids(self.user),
+            'album': lambda: services.get_album(self.user),
+            'collected items': lambda: list(services.get_collected_items(self.user)),
+            'progress': lambda: services.get_user_progress(User.objects.get(pk=self.user.pk)),
+            'map': lambda: services.get_map_data(self.user),
+        }
+        for name, call in calls.items():
+            with self.subTest(name):
+                allow = {'encyclopedia_dinosaur', 'encyclopedia_period'} if name == 'map' else ()
+                self.assertIndexed(call, allow)
+
+    def test_score_and_token_queries(self):
+        calls = {
+            'save score': lambda: services.save_game_score(self.user, 'memodyn', 50),
+            'high scores': lambda: list(services.get_user_high_scores(self.user)),
+            'high scores by game': lambda: list(services.get_user_high_scores(self.user, 'puzzleaurus')),
+            'leaderboard': lambda: services.get_leaderboard('puzzleaurus'),
+            'weekly leaderboard': lambda: services.get_leaderboard('puzzleaurus', scope='week'),
+            'rank': lambda: services.get_user_rank(self.other, 'puzzleaurus'),
+            'personal bests': lambda: services.get_personal_bests(self.user),
+            'tokens': lambda: services.update_user_tokens(self.user, 5),
+            'bulk tokens': lambda: services.award_tokens_bulk({self.user.pk: 1, self.other.pk: 2}),
+            'bulk scores': lambda: services.save_game_scores_bulk(
+                [(self.user.pk, 'memodyn', 70, timezone.now()), (self.other.pk, 'memodyn', 90, timezone.now())]
+            ),
+            'game stats': lambda: services.get_user_game_stats(self.other),
+            'score activity': lambda: services.get_score_activity(),
+            'expired scores': lambda: list(
+                GameScore.objects.filter(completed_at__lt=timezone.now()).order_by().values_list('pk')[:100]
+            ),
+        }
+        for name, call in calls.items():
+            with self.subTest(name):
+                self.assertIndexed(call)
+
+    def test_unindexed_filter_is_reported(self):
+        with capture_queries() as stats:
+            list(Dinosaur.objects.filter(fun_fact='Had feathers'))
+        with self.assertRaisesMessage(AssertionError, 'SCAN encyclopedia_dinosaur'):
+            self.assertUsesIndexes(stats)
@@ -0,0 +1,77 @@
+"""
+Rate limiting of logins, registrations and guest logins, backed by the cache.
+
+Each (scope, identifier) pair, e.g. ('login_ip', '203.0.113.7'), has a
+counter that expires a fixed window after its first hit. The limit and
+window of a scope come from settings.THROTTLE_RATES. Views check the
+counters before calling authenticate() or create_user(), so throttled
+traffic costs no password hashing or new accounts.
+
+The counters live only in the cache and are updated with cache.add() and
+cache.incr(), which are atomic, so they hold across threads, processes
+sharing a cache backend, and async code. With the default per-process
+cache (CACHE_BACKEND=locmem) every process counts on its own, so a client
+spread over N workers gets up to N times the limit; set CACHE_BACKEND to
+a shared cache (see settings.py) wherever more than one process serves
+the site.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+THROTTLE_CACHE_KEY = 'encyclopedia:throttle:{scope}:{ident}'
+
+
+def client_ip(request):
+    """Address the request came from (set REMOTE_ADDR correctly behind a proxy)."""
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _key(scope, ident):
+    # Hashed: usernames may hold characters some cache backends reject
+    digest = hashlib.sha256(str(ident).encode()).hexdigest()[:32]
+    return THROTTLE_CACHE_KEY.format(scope=scope, ident=digest)
+
+
+def is_throttled(*checks):
+    """
+    Check counters against their limits, in one cache round trip.
+
+    Args:
+        checks: (scope, identifier) pairs
+
+    Returns:
+        True if any counter reached the limit of its scope
+    """
+    limits = {_key(scope, ident): settings.THROTTLE_RATES[scope][0] for scope, ident in checks}
+    counts = cache.get_many(limits)
+    return any(counts.get(key, 0) >= limit for key, limit in limits.items())
+
+
+def hit(*checks):
+    """
+    Count one attempt against each (scope, identifier) pair.
+
+    Args:
+        checks: (scope, identifier) pairs
+    """
+    for scope, ident in checks:
+        key = _key(scope, ident)
+        window = settings.THROTTLE_RATES[scope][1]
+        if cache.add(key, 1, window):
+            continue
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, window)  # Expired between add() and incr()
+
+
+def reset(*checks):
+    """
+    Clear the counters of (scope, identifier) pairs.
+
+    Args:
+        checks: (scope, identifier) pairs
+    """
+    cache.delete_many([_key(scope, ident) for scope, ident in checks])
@@ -3,7 +3,7 @@ URL routing for the encyclopedia app.
 Maps URLs to controllers (views).
 """
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Authentication URLs
@@ -19,8 +19,12 @@ urlpatterns = [
     
     # Gallery URLs
     path('gallery/', views.gallery_list_view, name='gallery'),
+    path('gallery/suggest/', views.gallery_suggest_view, name='gallery_suggest'),
     path('gallery/<int:dinosaur_id>/', views.dinosaur_detail_view, name='dinosaur_detail'),
     
+    # Album URL
+    path('album/', views.album_view, name='album'),
+    
     # Library URL
     path('library/', views.library_view, name='library'),
     
@@ -31,4 +35,13 @@ urlpatterns = [
     # Game URLs
     path('puzzleaurus/', views.puzzleaurus_view, name='puzzleaurus'),
     path('memodyn/', views.memodyn_view, name='memodyn'),
+    
+    # Read-only JSON API
+    path('api/dinosaurs/', api.dinosaur_list, name='api_dinosaurs'),
+    path('api/dinosaurs/<int:dinosaur_id>/', api.dinosaur_detail, name='api_dinosaur_detail'),
+    path('api/periods/', api.period_list, name='api_periods'),
+    path('api/album/', api.album, name='api_album'),
+    path('api/album/collect/', api.collect, name='api_album_collect'),
+    path('api/progress/', api.progress, name='api_progress'),
+    path('api/scores/', api.scores, name='api_scores'),
 ]
@@ -2,14 +2,39 @@
 Controllers (Django Views) for the encyclopedia app.
 Following MVC pattern: these are the Controllers that coordinate between Models and Views (templates).
 """
-from django.shortcuts import render, redirect, get_object_or_404
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.db import IntegrityError
-from .models import Dinosaur, UserProfile, Period
-from . import services
+from django.views.decorators.http import require_POST
+from . import catalog, ingestion, services, throttling
+
+
+def alogin_required(view_func):
+    """
+    login_required for async views (Django 5.0's only wraps sync ones).
+    
+    Loads the user, with the profile base.html shows, through the async
+    API and sets request.user, so rendering never queries lazily (which
+    async code may not do).
+    """
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        await services.aget_or_create_user_profile(user)
+        request.user = user
+        return await view_func(request, *args, **kwargs)
+    return wrapper
 
 
 # ============= Authentication Controllers =============
@@ -22,13 +47,21 @@ def login_view(request):
     if request.method == 'POST':
         username = request.POST.get('username')
         password = request.POST.get('password')
+        # Failed logins are counted per address and per username; past the
+        # limit the password is not even checked (no hashing work)
+        checks = [('login_ip', throttling.client_ip(request)), ('login_username', username)]
+        if throttling.is_throttled(*checks):
+            messages.error(request, 'Too many failed logins. Please try again in a few minutes.')
+            return render(request, 'auth/login.html', status=429)
         
         user = authenticate(request, username=username, password=password)
         if user is not None:
+            throttling.reset(checks[1])
             login(request, user)
             messages.success(request, f'Welcome back, {user.username}!')
             return redirect('home')
         else:
+            throttling.hit(*checks)
             messages.error(request, 'Invalid username or password.')
     
     return render(request, 'auth/login.html')
@@ -45,18 +78,26 @@ def register_view(request):
         password = request.POST.get('password')
         password_confirm = request.POST.get('password_confirm')
         
+        ip_check = ('register_ip', throttling.client_ip(request))
+        if throttling.is_throttled(ip_check):
+            messages.error(request, 'Too many registrations. Please try again later.')
+            return render(request, 'auth/register.html', status=429)
+        throttling.hit(ip_check)
+        
         if password != password_confirm:
             messages.error(request, 'Passwords do not match.')
             return render(request, 'auth/register.html')
+        if username and username.startswith(services.GUEST_USERNAME_PREFIX):
+            messages.error(request, f'Usernames starting with "{services.GUEST_USERNAME_PREFIX}" are reserved.')
+            return render(request, 'auth/register.html')
         
         try:
+            # The profile is created by the post_save signal on User
             user = User.objects.create_user(username=username, email=email, password=password)
-            # Create user profile
-            services.get_or_create_user_profile(user)
             # Give welcome tokens
-            services.update_user_tokens(user, 50)
+            services.update_user_tokens(user, 50, reason='welcome')
             
-            login(request, user)
+            login(request, user, backend='encyclopedia.backends.ProfileModelBackend')
             messages.success(request, f'Welcome to Dino Encyclopedia, {user.username}!')
             return redirect('home')
         except IntegrityError:
@@ -72,83 +113,100 @@ def logout_view(request):
     return redirect('login')
 
 
+@require_POST
 def guest_login_view(request):
-    """Handle guest login (creates temporary user)"""
-    # Create or get guest user
-    try:
-        guest_user, created = User.objects.get_or_create(
-            username='guest',
-            defaults={'email': 'guest@example.com'}
-        )
-        if created:
-            guest_user.set_password('guestpassword')
-            guest_user.save()
-            services.get_or_create_user_profile(guest_user)
-    except IntegrityError:
-        guest_user = User.objects.get(username='guest')
+    """Handle guest login (creates an ephemeral account for this visitor)"""
+    if request.user.is_authenticated:
+        return redirect('home')
     
-    login(request, guest_user)
+    # Every guest login creates a user, a profile and a session
+    ip_check = ('guest_ip', throttling.client_ip(request))
+    if throttling.is_throttled(ip_check):
+        messages.error(request, 'Too many guest logins. Please try again later.')
+        return render(request, 'auth/login.html', status=429)
+    throttling.hit(ip_check)
+    
+    guest_user = services.create_guest_user()
+    login(request, guest_user, backend='encyclopedia.backends.ProfileModelBackend')
+    # The session ends with the account, which reap_guests then deletes
+    request.session.set_expiry(services.guest_expires_at(guest_user))
     messages.info(request, 'Logged in as guest. Some features may be limited.')
     return redirect('home')
 
 
 # ============= Main Application Controllers =============
 
-@login_required
-def home_view(request):
+@alogin_required
+async def home_view(request):
     """Home/Landing page controller"""
-    profile = services.get_or_create_user_profile(request.user)
-    progress = services.get_user_progress(request.user)
+    progress = await services.aget_user_progress(request.user)
     
     context = {
-        'user_profile': profile,
+        'user_profile': request.user.profile,
         'progress': progress,
     }
     return render(request, 'home.html', context)
 
 
-@login_required
-def map_view(request):
+@alogin_required
+async def map_view(request):
     """Map view controller showing geological periods"""
-    map_data = services.get_map_data()
-    
-    # Ensure profile exists for the nav bar
-    services.get_or_create_user_profile(request.user)
+    map_data = await services.aget_map_data(request.user)
     
     context = {
         'map_data': map_data,
-        'periods': Period.objects.all()
     }
     return render(request, 'map.html', context)
 
 
 # ============= Gallery Controllers =============
 
-@login_required
-def gallery_list_view(request):
+def _page_query(request, param, cursor):
+    """Build the gallery query string for a page cursor, keeping filters."""
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    params[param] = cursor
+    return params.urlencode()
+
+
+def _search_page(period_filter, diet_filter, search_query, after, before):
+    """One gallery page of search results, with highlighted snippets."""
+    dinosaurs = services.filter_dinosaurs(
+        period_name=period_filter,
+        diet=diet_filter,
+        query=search_query,
+    )
+    page = services.paginate_dinosaurs(dinosaurs, after=after, before=before)
+    services.attach_search_snippets(search_query, page['items'])
+    return page
+
+
+@alogin_required
+async def gallery_list_view(request):
     """Gallery list controller with filtering"""
     # Get filter parameters
     period_filter = request.GET.get('period')
     diet_filter = request.GET.get('diet')
     search_query = request.GET.get('search')
+    after, before = request.GET.get('after'), request.GET.get('before')
     
     # Apply filters using services
     if search_query:
-        dinosaurs = services.search_dinosaurs(search_query)
-    elif diet_filter:
-        dinosaurs = services.get_dinosaurs_by_diet(diet_filter)
-    elif period_filter:
-        dinosaurs = services.get_dinosaurs_by_period(period_filter)
+        # Full-text search runs raw SQL (search.py), which has no async API
+        page = await sync_to_async(_search_page)(period_filter, diet_filter, search_query, after, before)
     else:
-        dinosaurs = services.get_dinosaurs_by_period()
-    
-    # Ensure profile exists for the nav bar
-    services.get_or_create_user_profile(request.user)
+        dinosaurs = services.filter_dinosaurs(period_name=period_filter, diet=diet_filter)
+        page = await services.apaginate_dinosaurs(dinosaurs, after=after, before=before)
     
-    periods = Period.objects.all()
+    periods = await catalog.aget_periods()
     
     context = {
-        'dinosaurs': dinosaurs,
+        'dinosaurs': page['items'],
+        'next_query': _page_query(request, 'after', page['next_cursor']),
+        'previous_query': _page_query(request, 'before', page['previous_cursor']),
         'periods': periods,
         'current_period': period_filter,
         'current_diet': diet_filter,
@@ -158,34 +216,56 @@ def gallery_list_view(request):
 
 
 @login_required
-def dinosaur_detail_view(request, dinosaur_id):
+def gallery_suggest_view(request):
+    """Typeahead suggestions for the gallery search box (JSON)"""
+    suggestions = services.suggest_dinosaurs(request.GET.get('q', ''))
+    return JsonResponse({'results': suggestions})
+
+
+@alogin_required
+async def dinosaur_detail_view(request, dinosaur_id):
     """Dinosaur detail controller"""
-    dinosaur = get_object_or_404(Dinosaur, id=dinosaur_id)
+    dinosaur = await catalog.aget_dinosaur(dinosaur_id)
+    if dinosaur is None:
+        raise Http404('Dinosaur not found')
     
     # Collect dinosaur if not already collected
     if request.method == 'POST' and 'collect' in request.POST:
-        services.collect_dinosaur(request.user, dinosaur)
+        await sync_to_async(services.collect_dinosaur)(request.user, dinosaur)
         messages.success(request, f'{dinosaur.name} added to your collection!')
         return redirect('dinosaur_detail', dinosaur_id=dinosaur_id)
     
-    # Ensure profile exists
-    services.get_or_create_user_profile(request.user)
-    
     context = {
         'dinosaur': dinosaur,
     }
     return render(request, 'gallery/detail.html', context)
 
 
-# ============= Library Controller =============
+# ============= Album Controller =============
 
 @login_required
-def library_view(request):
-    """Library/educational content controller"""
-    # Ensure profile exists
-    services.get_or_create_user_profile(request.user)
+def album_view(request):
+    """Album controller: one period's dinosaurs, collected or still missing"""
+    album = services.get_album(request.user)
+    period_name = request.GET.get('period')
+    current = next((page for page in album if page['period'].name == period_name), None)
+    if current is None and album:
+        current = album[0]
     
-    periods = Period.objects.all()
+    context = {
+        'album': album,
+        'current_page': current,
+        'progress': services.get_user_progress(request.user),
+    }
+    return render(request, 'album.html', context)
+
+
+# ============= Library Controller =============
+
+@alogin_required
+async def library_view(request):
+    """Library/educational content controller"""
+    periods = await catalog.aget_periods()
     
     context = {
         'periods': periods,
@@ -195,17 +275,23 @@ def library_view(request):
 
 # ============= Profile Controllers =============
 
-@login_required
-def profile_view(request):
+@alogin_required
+async def profile_view(request):
     """User profile controller"""
-    profile = services.get_or_create_user_profile(request.user)
-    progress = services.get_user_progress(request.user)
-    recent_scores = services.get_user_high_scores(request.user)
+    # Independent reads, awaited together
+    progress, recent_scores, personal_bests, game_stats = await asyncio.gather(
+        services.aget_user_progress(request.user),
+        services.aget_user_high_scores(request.user),
+        services.aget_personal_bests(request.user),
+        services.aget_user_game_stats(request.user),
+    )
     
     context = {
-        'user_profile': profile,
+        'user_profile': request.user.profile,
         'progress': progress,
         'recent_scores': recent_scores,
+        'personal_bests': personal_bests,
+        'game_stats': game_stats,
     }
     return render(request, 'profile.html', context)
 
@@ -223,7 +309,8 @@ def profile_update_view(request):
         # Update avatar if uploaded
         if 'avatar' in request.FILES:
             profile.avatar = request.FILES['avatar']
-            profile.save()
+            # Only the avatar: the counters are updated concurrently with F()
+            profile.save(update_fields=['avatar', 'updated_at'])
         
         messages.success(request, 'Profile updated successfully!')
         return redirect('profile')
@@ -237,18 +324,25 @@ def profile_update_view(request):
 def puzzleaurus_view(request):
     """Puzzleaurus game controller"""
     if request.method == 'POST':
-        score = int(request.POST.get('score', 0))
-        services.save_game_score(request.user, 'puzzleaurus', score)
-        messages.success(request, f'Score saved: {score} points! Tokens awarded.')
+        try:
+            score = int(request.POST.get('score', 0))
+            buffered = ingestion.submit_game_score(request.user, 'puzzleaurus', score)
+        except ValueError:
+            messages.error(request, 'Invalid score.')
+        else:
+            if buffered:
+                messages.success(request, f'Score received: {score} points! Tokens on their way.')
+            else:
+                messages.success(request, f'Score saved: {score} points! Tokens awarded.')
         return redirect('puzzleaurus')
     
     high_scores = services.get_user_high_scores(request.user, 'puzzleaurus')
     
-    # Ensure profile exists
-    services.get_or_create_user_profile(request.user)
-    
     context = {
         'high_scores': high_scores,
+        'leaderboard': services.get_leaderboard('puzzleaurus'),
+        'daily_leaderboard': services.get_leaderboard('puzzleaurus', scope='day', limit=5),
+        'my_rank': services.get_user_rank(request.user, 'puzzleaurus'),
     }
     return render(request, 'puzzleaurus.html', context)
 
@@ -257,17 +351,24 @@ def puzzleaurus_view(request):
 def memodyn_view(request):
     """Memodyn game controller"""
     if request.method == 'POST':
-        score = int(request.POST.get('score', 0))
-        services.save_game_score(request.user, 'memodyn', score)
-        messages.success(request, f'Score saved: {score} points! Tokens awarded.')
+        try:
+            score = int(request.POST.get('score', 0))
+            buffered = ingestion.submit_game_score(request.user, 'memodyn', score)
+        except ValueError:
+            messages.error(request, 'Invalid score.')
+        else:
+            if buffered:
+                messages.success(request, f'Score received: {score} points! Tokens on their way.')
+            else:
+                messages.success(request, f'Score saved: {score} points! Tokens awarded.')
         return redirect('home')
     
     high_scores = services.get_user_high_scores(request.user, 'memodyn')
     
-    # Ensure profile exists
-    services.get_or_create_user_profile(request.user)
-    
     context = {
         'high_scores': high_scores,
+        'leaderboard': services.get_leaderboard('memodyn'),
+        'daily_leaderboard': services.get_leaderboard('memodyn', scope='day', limit=5),
+        'my_rank': services.get_user_rank(request.user, 'memodyn'),
     }
     return render(request, 'memodyn.html', context)